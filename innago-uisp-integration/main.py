@@ -11,6 +11,7 @@ Simplified billing model:
 """
 
 import argparse
+import json
 import logging
 import signal
 import sys
@@ -18,8 +19,11 @@ import time
 
 import schedule
 
-from src.config import Config
+from src.classifier import benchmark, load_labeled_tickets
+from src.config import Config, ConfigError
 from src.sync import SyncEngine
+from src.profiling import CycleProfiler
+from src.tracing import format_report, load_spans
 
 # Configure logging
 logging.basicConfig(
@@ -40,14 +44,45 @@ def main():
     parser.add_argument("--billing", action="store_true", help="Generate billing report")
     parser.add_argument("--invoice", action="store_true", help="Generate billing + create UISP invoice")
     parser.add_argument("--status", action="store_true", help="Show current unit status")
+    parser.add_argument("--delinquency-run", action="store_true",
+                        help="Run (or resume) the bulk delinquency suspension/restoration now")
+    parser.add_argument("--release-ticket-claims", action="store_true",
+                        help="Drop ticket claims left by a crashed forward (check UISP for duplicates first)")
+    parser.add_argument("--classify-benchmark", metavar="CSV",
+                        help="Score the ticket classifier against labeled tickets")
+    parser.add_argument("--repeat", type=int, default=100,
+                        help="Passes over the labeled set for --classify-benchmark")
+    parser.add_argument("--trace-report", nargs="?", const="", metavar="TRACE_ID",
+                        help="Show slowest spans and a phase summary for a sync cycle (default: latest)")
+    parser.add_argument("--top", type=int, default=15,
+                        help="Number of slowest spans for --trace-report")
+    parser.add_argument("--profile", action="store_true",
+                        help="Write a cProfile report per sync cycle")
+    parser.add_argument("--profile-every", type=int, default=1, metavar="N",
+                        help="Only profile every Nth cycle (with --profile)")
+    parser.add_argument("--profile-memory", action="store_true",
+                        help="Also record the biggest allocation sites (slower)")
+    parser.add_argument("--profile-dir", default="profiles",
+                        help="Where profile reports are written")
     args = parser.parse_args()
 
     try:
         config = Config(args.config)
-    except FileNotFoundError as e:
+    except (FileNotFoundError, ConfigError) as e:
         logger.error(f"Config error: {e}")
         sys.exit(1)
 
+    # Classifier benchmark (no API access needed)
+    if args.classify_benchmark:
+        print_classifier_benchmark(config, args.classify_benchmark, args.repeat)
+        return
+
+    # Trace report (reads the local span file only)
+    if args.trace_report is not None:
+        spans = load_spans(config.tracing_path)
+        print(format_report(spans, trace_id=args.trace_report or None, top=args.top))
+        return
+
     engine = SyncEngine(config)
 
     # Billing report mode
@@ -60,10 +95,31 @@ def main():
         print_status(engine)
         return
 
+    # Let stuck tickets be forwarded again on the next cycle
+    if args.release_ticket_claims:
+        released = engine.db.release_stale_ticket_claims(engine.stale_claim_cutoff())
+        print(f"Released {released} stale ticket claim(s)")
+        return
+
+    # Bulk delinquency run
+    if args.delinquency_run:
+        for report in engine.check_rent_delinquency(force=True):
+            print_delinquency_report(report)
+        return
+
+    run_sync = engine.run_sync
+    if args.profile:
+        profiler = CycleProfiler(args.profile_dir, every=args.profile_every,
+                                 memory=args.profile_memory)
+
+        def run_sync():
+            with profiler.profile("sync"):
+                engine.run_sync()
+
     # Single run mode
     if args.once:
         logger.info("Running single sync...")
-        engine.run_sync()
+        run_sync()
         logger.info("Done.")
         return
 
@@ -71,14 +127,18 @@ def main():
     interval = config.polling_interval
     logger.info(f"Starting scheduler - running every {interval} minutes")
 
-    schedule.every(interval).minutes.do(engine.run_sync)
+    schedule.every(interval).minutes.do(run_sync)
+
+    # Device changes land in device_state between cycles
+    engine.start_device_events()
 
     # Run immediately on start
-    engine.run_sync()
+    run_sync()
 
     # Handle shutdown gracefully
     def signal_handler(sig, frame):
         logger.info("Shutting down...")
+        engine.shutdown()
         sys.exit(0)
 
     signal.signal(signal.SIGINT, signal_handler)
@@ -90,6 +150,48 @@ def main():
         time.sleep(30)
 
 
+def print_classifier_benchmark(config, path, repeat):
+    """Print accuracy and throughput of the ticket classifier."""
+    tickets = load_labeled_tickets(path)
+    result = benchmark(config.classifier, tickets, repeat=max(1, repeat))
+
+    print(f"""
+Ticket Classifier Benchmark
+{'=' * 40}
+Tickets:          {result['tickets']} x {repeat} passes
+Accuracy:         {result['accuracy']:.1%}""")
+    if result["package_accuracy"] is not None:
+        print(f"Package accuracy: {result['package_accuracy']:.1%}")
+    print(f"""Throughput:       {result['per_second']:,.0f} tickets/sec
+Per ticket:       {result['us_per_ticket']:.1f} us
+{'=' * 40}""")
+
+    if result["mistakes"]:
+        print("Misclassified:")
+        for subject, expected, got in result["mistakes"]:
+            print(f"  - {subject!r}: expected {expected}, got {got}")
+    print()
+
+
+def print_delinquency_report(report):
+    """Print a delinquency run's throughput and reconciliation summary."""
+    print(f"""
+Delinquency Run #{report['run_id']}
+{'=' * 40}
+Planned:          {report['planned']}
+Suspended:        {report['suspended']}
+Reactivated:      {report['reactivated']}
+Failed:           {report['failed']}
+Elapsed:          {report['elapsed']}s ({report['per_second']:.1f} actions/sec)
+Latency:          p50 {report['latency_p50_ms']:.0f}ms / p95 {report['latency_p95_ms']:.0f}ms / max {report['latency_max_ms']:.0f}ms
+{'=' * 40}""")
+    if report["failed_units"]:
+        print(f"Failed units: {', '.join(report['failed_units'])}")
+    if report["mismatched_units"]:
+        print(f"Units table out of sync: {', '.join(report['mismatched_units'])}")
+    print()
+
+
 def print_status(engine):
     """Print current unit status."""
     active = engine.db.get_active_units()
@@ -111,6 +213,44 @@ Delinquent:       {len(delinquent)}
             print(f"  - Unit {u['unit_number']}")
         print()
 
+    if engine.shards is not None:
+        leases = engine.db.get_shard_leases()
+        now = time.time()
+        print("Sync Instances:")
+        for inst in engine.db.get_live_instances(now - engine.shards.lease_seconds):
+            held = [l["shard"] for l in leases if l["owner"] == inst["instance_id"] and l["expires_at"] > now]
+            print(f"  {inst['instance_id']:<36} {len(held)} shard(s), "
+                  f"heartbeat {now - inst['heartbeat_at']:.0f}s ago")
+        unowned = engine.shards.shards - sum(1 for l in leases if l["owner"] and l["expires_at"] > now)
+        if unowned > 0:
+            print(f"  {unowned} shard(s) unowned (waiting for an instance)")
+        print()
+
+    devices = engine.db.get_device_state_summary()
+    if devices["devices"]:
+        last_event = (f"{time.time() - devices['last_event_at']:.0f}s ago"
+                      if devices["last_event_at"] else "never")
+        print(f"UISP Devices: {devices['devices']} known, {devices['offline']} offline, "
+              f"{devices['pending']} change(s) pending, last event {last_event}")
+        print()
+
+    stale = engine.db.get_stale_ticket_claims(engine.stale_claim_cutoff())
+    if stale:
+        print("Stuck Ticket Claims (forward interrupted - check UISP, then --release-ticket-claims):")
+        for claim in stale:
+            print(f"  Innago #{claim['innago_ticket_id']:<10} claimed by {claim['claimed_by']} "
+                  f"at {claim['claimed_at']}")
+        print()
+
+    rate_stats = engine.db.get_latest_event("rate_limit_stats")
+    if rate_stats:
+        print(f"Upstream Rate Limits (as of {rate_stats['created_at']}):")
+        for host, s in json.loads(rate_stats["details"]).items():
+            print(f"  {host:<22} {s['requests']} req, {s['throttled']} throttled, "
+                  f"{s['retries']} retried, {s['wait_seconds']}s waited, "
+                  f"rate {s['read_rate']}/{s['write_rate']} r/w per sec")
+        print()
+
 
 if __name__ == "__main__":
     main()
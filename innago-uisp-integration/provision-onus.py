@@ -9,6 +9,7 @@ Usage:
     ./provision-onus.py list      # Show inventory status
     ./provision-onus.py discover  # Find unauthorized ONUs in UISP
     ./provision-onus.py provision # Provision all pending ONUs
+    ./provision-onus.py provision --parallel 8  # Provision concurrently (resumable)
     ./provision-onus.py activate <onu-name>   # Manually activate
     ./provision-onus.py suspend <onu-name>    # Manually suspend
 """
@@ -21,9 +22,12 @@ import logging
 sys.path.insert(0, str(__file__).rsplit('/', 1)[0])
 
 from src.config import Config
-from src.uisp import UispNmsClient
+from src.ratelimit import configure_rate_limits
+from src.tracing import configure_tracing
+from src.profiling import CycleProfiler
+from src.uisp import UispNmsClient, is_onu_device
 from src.onu import (
-    ONUProvisioner, load_inventory, get_pending_onus,
+    ONUProvisioner, configure_inventory, load_inventory, get_pending_onus,
     get_all_onus_status, find_onu_by_name, update_onu_status
 )
 
@@ -66,30 +70,24 @@ def cmd_discover(args, config):
 
     print("\nDiscovering ONUs in UISP...")
 
-    try:
-        devices = uisp.get_devices()
-    except Exception as e:
-        print(f"Error connecting to UISP: {e}")
-        return
-
-    # Filter for ONU/ONT devices
+    # Stream the listing and keep only ONU/ONT devices
     onus = []
-    for d in devices:
-        ident = d.get('identification', {})
-        model = ident.get('model', '').lower()
-        name = ident.get('name', '')
-        authorized = ident.get('authorized', True)
-
-        if 'onu' in model or 'ont' in model or 'fiber' in model.lower():
+    try:
+        for d in uisp.iter_devices(predicate=is_onu_device,
+                                   fields=('id', 'identification', 'overview')):
+            ident = d.get('identification', {})
             onus.append({
                 'id': d.get('id'),
-                'name': name,
+                'name': ident.get('name', ''),
                 'serial': ident.get('serialNumber', ''),
                 'mac': ident.get('mac', ''),
                 'model': ident.get('model', ''),
-                'authorized': authorized,
+                'authorized': ident.get('authorized', True),
                 'status': d.get('overview', {}).get('status', 'unknown')
             })
+    except Exception as e:
+        print(f"Error connecting to UISP: {e}")
+        return
 
     if not onus:
         print("No ONU devices found in UISP.")
@@ -128,6 +126,11 @@ def cmd_provision(args, config):
     uisp = UispNmsClient(config.uisp_host, config.uisp_nms_api_key)
     provisioner = ONUProvisioner(uisp, config.uisp_parent_site_id)
 
+    if args.parallel:
+        results = provisioner.provision_pending_parallel(args.parallel)
+        print_parallel_summary(results)
+        return
+
     results = provisioner.provision_all_pending()
 
     print("\nResults:")
@@ -136,6 +139,28 @@ def cmd_provision(args, config):
     print()
 
 
+def print_parallel_summary(results):
+    """Print timing and failures from a parallel provisioning run."""
+    timings = sorted(results['timings'].values())
+
+    print("\nResults:")
+    print(f"  Success:   {results['success']}")
+    print(f"  Failed:    {results['failed']}")
+    print(f"  Not found: {results['not_found']}")
+    print(f"  Resumed:   {results['resumed']} (from checkpoint)")
+    print(f"\nTotal time:  {results['elapsed']:.1f}s")
+    if timings:
+        print(f"Per ONU:     avg {sum(timings) / len(timings):.2f}s, "
+              f"max {timings[-1]:.2f}s")
+
+    if results['failures']:
+        print("\nFailures:")
+        for name, error in results['failures']:
+            print(f"  {name}: {error}")
+        print("\nRe-run the same command to retry - completed steps are skipped.")
+    print()
+
+
 def cmd_activate(args, config):
     """Manually activate an ONU."""
     onu = find_onu_by_name(args.onu_name)
@@ -182,6 +207,12 @@ def cmd_suspend(args, config):
 
 def main():
     parser = argparse.ArgumentParser(description='ERE Fiber ONU Provisioning')
+    parser.add_argument('--profile', action='store_true',
+                        help='Write a cProfile report for the command')
+    parser.add_argument('--profile-memory', action='store_true',
+                        help='Also record the biggest allocation sites (slower)')
+    parser.add_argument('--profile-dir', default='profiles',
+                        help='Where profile reports are written')
     subparsers = parser.add_subparsers(dest='command', help='Commands')
 
     # List
@@ -191,7 +222,9 @@ def main():
     subparsers.add_parser('discover', help='Discover unauthorized ONUs in UISP')
 
     # Provision
-    subparsers.add_parser('provision', help='Provision pending ONUs to UISP')
+    p_provision = subparsers.add_parser('provision', help='Provision pending ONUs to UISP')
+    p_provision.add_argument('--parallel', type=int, metavar='N', default=0,
+                             help='Provision N ONUs at a time (resumable)')
 
     # Activate
     p_activate = subparsers.add_parser('activate', help='Activate an ONU')
@@ -216,17 +249,25 @@ def main():
         print("Make sure config.yaml exists with UISP settings.")
         return
 
+    configure_rate_limits(config.rate_limits)
+    configure_tracing(config.tracing)
+    configure_inventory(config.inventory_path)
+
+    commands = {
+        'list': cmd_list,
+        'discover': cmd_discover,
+        'provision': cmd_provision,
+        'activate': cmd_activate,
+        'suspend': cmd_suspend,
+    }
+
     # Run command
-    if args.command == 'list':
-        cmd_list(args, config)
-    elif args.command == 'discover':
-        cmd_discover(args, config)
-    elif args.command == 'provision':
-        cmd_provision(args, config)
-    elif args.command == 'activate':
-        cmd_activate(args, config)
-    elif args.command == 'suspend':
-        cmd_suspend(args, config)
+    if args.profile:
+        profiler = CycleProfiler(args.profile_dir, memory=args.profile_memory)
+        with profiler.profile(f"provision-onus-{args.command}"):
+            commands[args.command](args, config)
+    else:
+        commands[args.command](args, config)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Scale Testing Against a Synthetic Portfolio
+
+Usage:
+    python scale-test.py generate --units 5000 --out synthetic/
+    python scale-test.py serve --data synthetic/
+    python scale-test.py run --data synthetic/ --cycles 3 --new-month
+
+`generate` writes the portfolio, an ONU inventory CSV and a config.yaml that
+points the integration at the local stand-in APIs (and at its own database,
+inventory and trace file inside the output directory). `run` starts the
+stand-in in-process and times full SyncEngine cycles, churning the portfolio
+between them; device churn reaches the engine over the stand-in's event feed.
+"""
+
+import sys
+import argparse
+import logging
+import time
+from pathlib import Path
+
+import yaml
+
+# Setup path for imports
+sys.path.insert(0, str(__file__).rsplit('/', 1)[0])
+
+from src.config import Config
+from src.standin import StandInServer
+from src.synthetic import SyntheticPortfolio
+from src.sync import SyncEngine
+
+
+def parse_mix(value: str) -> dict:
+    """'internet=0.5,upgrade=0.1,other=0.4' -> dict"""
+    mix = {}
+    for part in value.split(','):
+        kind, _, weight = part.partition('=')
+        mix[kind.strip()] = float(weight)
+    return mix
+
+
+def write_config(base_path: str, out: Path, port: int, portfolio: SyntheticPortfolio):
+    """Derive a config from the real one, pointed at the stand-in APIs."""
+    with open(base_path) as f:
+        config = yaml.safe_load(f)
+
+    host = f"127.0.0.1:{port}"
+    config['innago'] = {
+        'api_url': f"http://{host}/innago",
+        'api_key': 'synthetic',
+        'property_id': portfolio.params['property_id'],
+    }
+    config['uisp'] = {
+        'host': host,
+        'crm_api_key': 'synthetic',
+        'nms_api_key': 'synthetic',
+        'parent_site_id': portfolio.params['site_id'],
+    }
+    # Delinquency runs every cycle regardless of the calendar
+    config.setdefault('billing', {})['grace_period_day'] = 1
+    config['storage'] = {
+        'database': str(out / 'sync.db'),
+        'inventory': str(out / 'onu-inventory.csv'),
+    }
+    config['tracing'] = {**(config.get('tracing') or {}), 'enabled': True, 'path': str(out / 'traces.jsonl')}
+    config['events'] = {**(config.get('events') or {}), 'enabled': True}
+    # Measure the integration, not the production throttle
+    limits = config.setdefault('rate_limits', {})
+    limits.setdefault('hosts', {})[host] = {'read_per_sec': 5000, 'write_per_sec': 5000, 'burst': 5000}
+
+    with open(out / 'config.yaml', 'w') as f:
+        yaml.safe_dump(config, f, sort_keys=False)
+
+
+def cmd_generate(args):
+    out = Path(args.out)
+    started = time.monotonic()
+    portfolio = SyntheticPortfolio.generate(
+        units=args.units,
+        units_per_building=args.units_per_building,
+        occupancy=args.occupancy,
+        churn_rate=args.churn_rate,
+        delinquency_rate=args.delinquency_rate,
+        ticket_rate=args.ticket_rate,
+        ticket_mix=parse_mix(args.ticket_mix),
+        device_flap_rate=args.device_flap_rate,
+        tamper_rate=args.tamper_rate,
+        seed=args.seed,
+    )
+    # Start with some open tickets so the first cycle has forwarding work
+    portfolio.open_tickets()
+    portfolio.save(out)
+    write_config(args.config, out, args.port, portfolio)
+
+    print(f"Generated in {time.monotonic() - started:.1f}s -> {out}/")
+    for key, value in portfolio.summary().items():
+        print(f"  {key:<18} {value}")
+    print(f"\nConfig: {out / 'config.yaml'} (stand-in on 127.0.0.1:{args.port})")
+
+
+def _load(args) -> tuple:
+    data = Path(args.data)
+    portfolio = SyntheticPortfolio.load(data)
+    config = Config(str(data / 'config.yaml'))
+    port = int(config.uisp_host.rsplit(':', 1)[1])
+    return data, portfolio, config, port
+
+
+def cmd_serve(args):
+    data, portfolio, config, port = _load(args)
+    server = StandInServer(portfolio, port=port)
+    print(f"Stand-in APIs on http://{server.address} ({len(portfolio.inventory)} units) - Ctrl+C to stop")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.save:
+            portfolio.save(data)
+
+
+def cmd_run(args):
+    data, portfolio, config, port = _load(args)
+    if args.fresh:
+        Path(config.database_path).unlink(missing_ok=True)
+
+    server = StandInServer(portfolio, port=port)
+    server.start()
+    engine = SyncEngine(config)
+    if engine.start_device_events() and not engine.events.wait_connected(5):
+        print("Device event feed did not connect - reconciling by polling")
+
+    print(f"Portfolio: {portfolio.summary()}")
+    try:
+        for cycle in range(1, args.cycles + 1):
+            if cycle > 1 or args.new_month:
+                changes = portfolio.advance(new_month=args.new_month and (cycle == 1 or args.every_month))
+                print(f"\nChurn before cycle {cycle}: {changes}")
+
+            server.reset_stats()
+            started = time.monotonic()
+            engine.run_sync()
+            elapsed = time.monotonic() - started
+
+            counts = server.stats()
+            total = sum(counts.values())
+            print(f"Cycle {cycle}: {elapsed:.2f}s, {total} upstream request(s)")
+            if engine.events is not None:
+                print(f"  {engine.events.received:>7}  device events received so far")
+            for route, count in sorted(counts.items(), key=lambda kv: kv[1], reverse=True)[:args.top]:
+                print(f"  {count:>7}  {route}")
+    finally:
+        engine.shutdown()
+        server.shutdown()
+        server.server_close()
+        if args.save:
+            portfolio.save(data)
+
+    print(f"\nPer-span timings: python main.py -c {data / 'config.yaml'} --trace-report")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Scale test the integration on synthetic data')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Show integration INFO logs')
+    subparsers = parser.add_subparsers(dest='command', help='Commands')
+
+    p_generate = subparsers.add_parser('generate', help='Generate a synthetic portfolio')
+    p_generate.add_argument('--out', default='synthetic', help='Output directory')
+    p_generate.add_argument('--units', type=int, default=1000)
+    p_generate.add_argument('--units-per-building', type=int, default=24)
+    p_generate.add_argument('--occupancy', type=float, default=0.92)
+    p_generate.add_argument('--churn-rate', type=float, default=0.02,
+                            help='Share of occupied units moving out per cycle')
+    p_generate.add_argument('--delinquency-rate', type=float, default=0.08,
+                            help='Share of rent invoices left unpaid each month')
+    p_generate.add_argument('--ticket-rate', type=float, default=0.01,
+                            help='New tickets per occupied unit per cycle')
+    p_generate.add_argument('--ticket-mix', default='internet=0.45,upgrade=0.1,other=0.45')
+    p_generate.add_argument('--device-flap-rate', type=float, default=0.01,
+                            help='Share of ONUs going offline/online per cycle')
+    p_generate.add_argument('--tamper-rate', type=float, default=0.002,
+                            help='Share of ONUs re-enabled by hand in UISP per cycle')
+    p_generate.add_argument('--seed', type=int, default=0)
+    p_generate.add_argument('--port', type=int, default=8765, help='Stand-in API port')
+    p_generate.add_argument('-c', '--config', default='config.yaml',
+                            help='Config to copy packages/keywords/limits from')
+
+    p_serve = subparsers.add_parser('serve', help='Serve a portfolio on the stand-in APIs')
+    p_serve.add_argument('--data', default='synthetic')
+    p_serve.add_argument('--save', action='store_true', help='Write churned state back on exit')
+
+    p_run = subparsers.add_parser('run', help='Time sync cycles against the stand-in APIs')
+    p_run.add_argument('--data', default='synthetic')
+    p_run.add_argument('--cycles', type=int, default=3)
+    p_run.add_argument('--new-month', action='store_true',
+                       help='Bill a new rent month before the first cycle (delinquency spike)')
+    p_run.add_argument('--every-month', action='store_true',
+                       help='With --new-month, bill a new month before every cycle')
+    p_run.add_argument('--fresh', action='store_true', help='Start from an empty sync database')
+    p_run.add_argument('--save', action='store_true', help='Write churned state back when done')
+    p_run.add_argument('--top', type=int, default=8, help='Routes to list per cycle')
+
+    args = parser.parse_args()
+
+    if not args.command:
+        parser.print_help()
+        return
+
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+    )
+
+    if args.command == 'generate':
+        cmd_generate(args)
+    elif args.command == 'serve':
+        cmd_serve(args)
+    elif args.command == 'run':
+        cmd_run(args)
+
+
+if __name__ == '__main__':
+    main()
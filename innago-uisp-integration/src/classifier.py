@@ -0,0 +1,208 @@
+"""
+Maintenance Ticket Classifier
+
+Compiles the keyword lists and packages from config into a single regex with
+word boundaries, then scores each ticket in one pass:
+
+  - internet_issues terms add to the internet score
+  - upgrade_requests terms add to the upgrade score
+  - exclude terms (plumbing etc.) subtract from both
+  - package mentions ("2g", "1 gig", "gigabit") add to the upgrade score and
+    pick the requested package
+
+Keywords can be plain strings (weight 1.0) or {term: weight} mappings.
+"""
+
+import csv
+import re
+import time
+from typing import NamedTuple
+
+INTERNET = "internet"
+UPGRADE = "upgrade"
+OTHER = "other"
+
+PACKAGE_MENTION_WEIGHT = 1.0
+
+
+class Classification(NamedTuple):
+    kind: str               # INTERNET, UPGRADE or OTHER
+    score: float            # score of the winning kind
+    package: str | None     # requested package name, if one was mentioned
+    matches: tuple          # matched terms, in order
+
+
+def _normalize(term: str) -> str:
+    return " ".join(term.lower().split())
+
+
+def _weighted_terms(entries) -> dict:
+    """Turn ['wifi', {'slow': 0.5}] into {'wifi': 1.0, 'slow': 0.5}."""
+    terms = {}
+    for entry in entries or []:
+        if isinstance(entry, str):
+            terms[_normalize(entry)] = 1.0
+        else:
+            for term, weight in dict(entry).items():
+                terms[_normalize(str(term))] = float(weight)
+    return terms
+
+
+def _package_speed(pkg) -> int:
+    return int(pkg.get("download") or pkg.get("speed_down") or 0)
+
+
+def _package_aliases(pkg) -> set:
+    """Ways a tenant might refer to a package: '2g', '2 gig', '2000', 'gigabit'..."""
+    aliases = {_normalize(pkg["name"])}
+    aliases.update(_normalize(a) for a in pkg.get("aliases") or [])
+
+    speed = _package_speed(pkg)
+    if speed >= 1000 and speed % 1000 == 0:
+        g = speed // 1000
+        aliases.update({f"{g}g", f"{g} g", f"{g}gig", f"{g} gig", f"{g} gigs",
+                        f"{g}gb", f"{g}gbps", f"{g} gbps", f"{speed}", f"{speed}mbps"})
+        if g == 1:
+            aliases.update({"gigabit", "gig"})
+    elif speed:
+        aliases.update({f"{speed}", f"{speed}mbps", f"{speed} mbps", f"{speed}m"})
+    return aliases
+
+
+def _term_pattern(term: str) -> str:
+    # Any run of whitespace in the term matches any run in the text
+    return r"\s+".join(re.escape(part) for part in term.split())
+
+
+class TicketClassifier:
+    """Single-pass weighted classifier compiled from the keyword config."""
+
+    def __init__(self, internet_keywords=(), upgrade_keywords=(), packages=(),
+                 exclude_keywords=(), threshold: float = 1.0):
+        self.threshold = threshold
+
+        # term -> list of (category, weight)
+        self._terms = {}
+        for category, terms in ((INTERNET, _weighted_terms(internet_keywords)),
+                                (UPGRADE, _weighted_terms(upgrade_keywords))):
+            for term, weight in terms.items():
+                self._terms.setdefault(term, []).append((category, weight))
+        for term, weight in _weighted_terms(exclude_keywords).items():
+            # Excludes count against both scores
+            self._terms.setdefault(term, []).extend(
+                [(INTERNET, -abs(weight)), (UPGRADE, -abs(weight))]
+            )
+
+        # Only non-default packages are upgrade targets
+        self._package_terms = {}
+        self._package_speeds = {}
+        for pkg in packages or []:
+            if pkg.get("default"):
+                continue
+            self._package_speeds[pkg["name"]] = _package_speed(pkg)
+            for alias in _package_aliases(pkg):
+                self._package_terms[alias] = pkg["name"]
+
+        all_terms = set(self._terms) | set(self._package_terms)
+        if all_terms:
+            # Longest first so "1 gig" wins over "1g"-style prefixes
+            alternation = "|".join(_term_pattern(t) for t in sorted(all_terms, key=len, reverse=True))
+            self._pattern = re.compile(rf"(?<![\w-])(?:{alternation})(?![\w-])", re.IGNORECASE)
+        else:
+            self._pattern = None
+
+    @classmethod
+    def from_config(cls, keywords: dict, packages) -> "TicketClassifier":
+        keywords = keywords or {}
+        return cls(
+            internet_keywords=keywords.get("internet_issues") or (),
+            upgrade_keywords=keywords.get("upgrade_requests") or (),
+            exclude_keywords=keywords.get("exclude") or (),
+            packages=packages,
+            threshold=float(keywords.get("threshold", 1.0)),
+        )
+
+    def classify(self, text: str) -> Classification:
+        """Score a ticket's subject + description."""
+        scores = {INTERNET: 0.0, UPGRADE: 0.0}
+        package = None
+        matches = []
+
+        if self._pattern is not None:
+            for match in self._pattern.finditer(text):
+                term = _normalize(match.group(0))
+                matches.append(term)
+                for category, weight in self._terms.get(term, ()):
+                    scores[category] += weight
+                pkg_name = self._package_terms.get(term)
+                if pkg_name:
+                    scores[UPGRADE] += PACKAGE_MENTION_WEIGHT
+                    # "from 1g to 2g" - the fastest package mentioned is the ask
+                    if package is None or self._package_speeds[pkg_name] > self._package_speeds[package]:
+                        package = pkg_name
+
+        # Ties go to internet - forwarding to a tech is the safe fallback
+        internet, upgrade = scores[INTERNET], scores[UPGRADE]
+        if upgrade >= self.threshold and upgrade > internet:
+            return Classification(UPGRADE, upgrade, package, tuple(matches))
+        if internet >= self.threshold:
+            return Classification(INTERNET, internet, package, tuple(matches))
+        return Classification(OTHER, max(internet, upgrade), package, tuple(matches))
+
+    def extract_package(self, text: str) -> str | None:
+        """Just the requested package, if any."""
+        return self.classify(text).package
+
+
+# -----------------------------------------------------------------------------
+# Benchmark
+# -----------------------------------------------------------------------------
+
+def load_labeled_tickets(path: str) -> list:
+    """
+    Load labeled tickets from CSV.
+
+    Columns: subject, description, label (internet/upgrade/other), package (optional)
+    """
+    with open(path, newline="") as f:
+        return [row for row in csv.DictReader(f)]
+
+
+def benchmark(classifier: TicketClassifier, tickets: list, repeat: int = 1) -> dict:
+    """Classify labeled tickets and report accuracy and throughput."""
+    texts = [f"{t.get('subject', '')} {t.get('description', '')}" for t in tickets]
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        results = [classifier.classify(text) for text in texts]
+    elapsed = time.perf_counter() - started
+
+    correct = 0
+    package_total = package_correct = 0
+    confusion = {}
+    mistakes = []
+    for ticket, result in zip(tickets, results):
+        label = (ticket.get("label") or OTHER).strip().lower()
+        confusion[(label, result.kind)] = confusion.get((label, result.kind), 0) + 1
+        if label == result.kind:
+            correct += 1
+        else:
+            mistakes.append((ticket.get("subject", ""), label, result.kind))
+
+        expected_pkg = (ticket.get("package") or "").strip()
+        if label == UPGRADE and expected_pkg:
+            package_total += 1
+            if result.package == expected_pkg:
+                package_correct += 1
+
+    classified = len(texts) * repeat
+    return {
+        "tickets": len(tickets),
+        "accuracy": correct / len(tickets) if tickets else 0.0,
+        "package_accuracy": package_correct / package_total if package_total else None,
+        "confusion": confusion,
+        "mistakes": mistakes,
+        "elapsed": elapsed,
+        "per_second": classified / elapsed if elapsed else 0.0,
+        "us_per_ticket": 1_000_000 * elapsed / classified if classified else 0.0,
+    }
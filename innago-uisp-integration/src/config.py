@@ -1,91 +1,439 @@
 """
 Configuration loader for Victorian Village integration.
+
+The YAML file is compiled once at load time into immutable lookup tables
+(packages keyed by name, the compiled ticket classifier, typed billing params,
+and every numeric or true/false setting coerced and range-checked).
+reload_if_changed() re-reads the file between cycles; a file that fails
+validation is ignored and the last good config stays in effect.
 """
 
+import logging
 import yaml
 from pathlib import Path
+from types import MappingProxyType
+from typing import NamedTuple
+
+from .classifier import TicketClassifier
+from .ratelimit import validate_rate_limits
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_KEYS = {
+    "innago": ("api_url", "api_key", "property_id"),
+    "uisp": ("host", "crm_api_key", "nms_api_key", "parent_site_id"),
+}
+
+# Changing these needs new API clients, so a reload only warns about them
+RESTART_SECTIONS = ("innago", "uisp")
+
+
+class ConfigError(ValueError):
+    """Config file is present but invalid."""
+
+
+class BillingParams(NamedTuple):
+    base_rate: float
+    total_units: int
+    grace_period_day: int
+    complex_email: str
+
+
+class CompiledConfig(NamedTuple):
+    raw: MappingProxyType
+    billing: BillingParams
+    settings: MappingProxyType   # "section.key" -> coerced, range-checked value
+    packages: tuple
+    packages_by_name: MappingProxyType
+    default_package: MappingProxyType
+    internet_keywords: tuple
+    classifier: TicketClassifier
+
+
+def _freeze(value):
+    """Recursively turn dicts/lists into read-only mappings/tuples."""
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _setting(raw: dict, section: str, key: str, default, kind=float,
+             minimum=None, maximum=None):
+    """Read one numeric setting, coerced to `kind` and range-checked."""
+    values = raw.get(section) or {}
+    if not isinstance(values, dict):
+        raise ConfigError(f"'{section}' must be a mapping")
+    value = values.get(key, default)
+    if isinstance(value, bool):
+        raise ConfigError(f"{section}.{key} must be a number, got {value!r}")
+    try:
+        value = kind(value)
+    except (TypeError, ValueError):
+        raise ConfigError(f"{section}.{key} must be a number, got {value!r}")
+    if minimum is not None and value < minimum:
+        raise ConfigError(f"{section}.{key} must be at least {minimum}")
+    if maximum is not None and value > maximum:
+        raise ConfigError(f"{section}.{key} must be at most {maximum}")
+    return value
+
+
+def _flag(raw: dict, section: str, key: str, default: bool) -> bool:
+    """Read one true/false setting (a quoted "false" would otherwise be truthy)."""
+    values = raw.get(section) or {}
+    if not isinstance(values, dict):
+        raise ConfigError(f"'{section}' must be a mapping")
+    value = values.get(key, default)
+    if not isinstance(value, bool):
+        raise ConfigError(f"{section}.{key} must be true or false, got {value!r}")
+    return value
+
+
+def _compile_settings(raw: dict) -> dict:
+    """
+    Every per-section setting the engine reads, validated up front, so a bad
+    edit is rejected at reload instead of raising inside every cycle.
+    """
+    return {
+        "email.smtp_port": _setting(raw, "email", "smtp_port", 587, int, 1, 65535),
+        "delinquency.workers": _setting(raw, "delinquency", "workers", 8, int, 1),
+        "tickets.workers": _setting(raw, "tickets", "workers", 4, int, 1),
+        "tickets.group_incidents": _flag(raw, "tickets", "group_incidents", False),
+        "tickets.incident_min_tickets": _setting(raw, "tickets", "incident_min_tickets", 3, int, 2),
+        "tickets.claim_timeout_minutes": _setting(raw, "tickets", "claim_timeout_minutes", 30, float, 1),
+        "health.bucket_minutes": _setting(raw, "health", "bucket_minutes", 15, int, 1, 60),
+        "health.retention_days": _setting(raw, "health", "retention_days", 30, int, 1),
+        "health.rx_power_min_dbm": _setting(raw, "health", "rx_power_min_dbm", -27.0),
+        "events.enabled": _flag(raw, "events", "enabled", False),
+        "events.full_poll_minutes": _setting(raw, "events", "full_poll_minutes", 60, float, 1),
+        "events.enforce": _flag(raw, "events", "enforce", False),
+        "sharding.enabled": _flag(raw, "sharding", "enabled", False),
+        "sharding.shards": _setting(raw, "sharding", "shards", 16, int, 1),
+        "sharding.lease_seconds": _setting(raw, "sharding", "lease_seconds", 900, float, 30),
+        "tracing.enabled": _flag(raw, "tracing", "enabled", False),
+        "tracing.max_bytes": _setting(raw, "tracing", "max_bytes", 10_000_000, int, 1),
+        "tracing.backup_count": _setting(raw, "tracing", "backup_count", 5, int, 0),
+        "polling.interval_minutes": _setting(raw, "polling", "interval_minutes", 5, int, 1),
+    }
+
+
+def compile_config(raw: dict) -> CompiledConfig:
+    """Validate a parsed YAML document and build the lookup tables."""
+    if not isinstance(raw, dict):
+        raise ConfigError("Config file is empty or not a mapping")
+
+    for section, keys in REQUIRED_KEYS.items():
+        values = raw.get(section)
+        if not isinstance(values, dict):
+            raise ConfigError(f"Missing '{section}' section")
+        missing = [k for k in keys if values.get(k) in (None, "")]
+        if missing:
+            raise ConfigError(f"Missing {section}.{', '.join(missing)}")
+
+    billing = raw.get("billing") or {}
+    try:
+        billing_params = BillingParams(
+            base_rate=float(billing.get("base_rate", 45)),
+            total_units=int(billing.get("total_units", 118)),
+            grace_period_day=int(billing.get("grace_period_day", 5)),
+            complex_email=str(billing.get("complex_email", "") or ""),
+        )
+    except (TypeError, ValueError) as e:
+        raise ConfigError(f"Invalid billing value: {e}")
+
+    if not 1 <= billing_params.grace_period_day <= 28:
+        raise ConfigError("billing.grace_period_day must be between 1 and 28")
+
+    packages = _freeze(raw.get("packages") or [])
+    by_name = {}
+    for pkg in packages:
+        if "name" not in pkg:
+            raise ConfigError("Every package needs a name")
+        if pkg["name"] in by_name:
+            raise ConfigError(f"Duplicate package name: {pkg['name']}")
+        by_name[pkg["name"]] = pkg
+
+    default_package = next((p for p in packages if p.get("default")), None)
+    if default_package is None:
+        default_package = packages[0] if packages else MappingProxyType({})
+
+    keywords = raw.get("keywords") or {}
+    try:
+        classifier = TicketClassifier.from_config(keywords, packages)
+    except (TypeError, ValueError, AttributeError) as e:
+        raise ConfigError(f"Invalid keywords section: {e}")
+
+    settings = _compile_settings(raw)
+    try:
+        validate_rate_limits(raw.get("rate_limits"))
+    except ValueError as e:
+        raise ConfigError(str(e))
+
+    return CompiledConfig(
+        raw=_freeze(raw),
+        billing=billing_params,
+        settings=MappingProxyType(settings),
+        packages=packages,
+        packages_by_name=MappingProxyType(by_name),
+        default_package=default_package,
+        internet_keywords=_freeze(keywords.get("internet_issues") or []),
+        classifier=classifier,
+    )
 
 
 class Config:
     def __init__(self, config_path: str = "config.yaml"):
-        path = Path(config_path)
-        if not path.exists():
+        self.path = Path(config_path)
+        if not self.path.exists():
             raise FileNotFoundError(f"Config file not found: {config_path}")
 
-        with open(path) as f:
-            self._config = yaml.safe_load(f)
+        self._stamp = self._file_stamp()
+        self._compiled = self._load()
+
+    def _file_stamp(self) -> tuple:
+        stat = self.path.stat()
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _load(self) -> CompiledConfig:
+        with open(self.path) as f:
+            return compile_config(yaml.safe_load(f))
+
+    def reload_if_changed(self) -> bool:
+        """
+        Re-read the file if it changed since the last load.
+
+        Returns True when a new config was applied. Invalid files are logged
+        and skipped - the last good config stays active.
+        """
+        try:
+            stamp = self._file_stamp()
+        except FileNotFoundError:
+            logger.error(f"Config file disappeared: {self.path} - keeping last good config")
+            return False
+
+        if stamp == self._stamp:
+            return False
+        # Remember the stamp even on failure so a bad file is only reported once
+        self._stamp = stamp
+
+        try:
+            compiled = self._load()
+        except (ConfigError, yaml.YAMLError, OSError) as e:
+            logger.error(f"Config reload failed, keeping last good config: {e}")
+            return False
+
+        for section in RESTART_SECTIONS:
+            if compiled.raw.get(section) != self._compiled.raw.get(section):
+                logger.warning(f"Config section '{section}' changed - restart to apply it")
+
+        self._compiled = compiled
+        logger.info(f"Reloaded config from {self.path}")
+        return True
+
+    def _section(self, name: str):
+        return self._compiled.raw.get(name) or MappingProxyType({})
 
     # Innago
     @property
     def innago_api_url(self) -> str:
-        return self._config["innago"]["api_url"]
+        return self._compiled.raw["innago"]["api_url"]
 
     @property
     def innago_api_key(self) -> str:
-        return self._config["innago"]["api_key"]
+        return self._compiled.raw["innago"]["api_key"]
 
     @property
     def innago_property_id(self) -> str:
-        return self._config["innago"]["property_id"]
+        return self._compiled.raw["innago"]["property_id"]
 
     # UISP
     @property
     def uisp_host(self) -> str:
-        return self._config["uisp"]["host"]
+        return self._compiled.raw["uisp"]["host"]
 
     @property
     def uisp_crm_api_key(self) -> str:
-        return self._config["uisp"]["crm_api_key"]
+        return self._compiled.raw["uisp"]["crm_api_key"]
 
     @property
     def uisp_nms_api_key(self) -> str:
-        return self._config["uisp"]["nms_api_key"]
+        return self._compiled.raw["uisp"]["nms_api_key"]
 
     @property
     def uisp_parent_site_id(self) -> str:
-        return self._config["uisp"]["parent_site_id"]
+        return self._compiled.raw["uisp"]["parent_site_id"]
+
+    # Email
+    @property
+    def email_from(self) -> str:
+        return self._section("email").get("from", "")
+
+    @property
+    def email_smtp_host(self) -> str:
+        return self._section("email").get("smtp_host", "")
+
+    @property
+    def email_smtp_port(self) -> int:
+        return self._compiled.settings["email.smtp_port"]
+
+    @property
+    def email_smtp_user(self) -> str:
+        return self._section("email").get("smtp_user", "")
+
+    @property
+    def email_smtp_pass(self) -> str:
+        return self._section("email").get("smtp_pass", "")
 
     # Billing
+    @property
+    def billing(self) -> BillingParams:
+        return self._compiled.billing
+
     @property
     def base_rate(self) -> float:
-        return self._config.get("billing", {}).get("base_rate", 45)
+        return self._compiled.billing.base_rate
 
     @property
     def total_units(self) -> int:
-        return self._config.get("billing", {}).get("total_units", 118)
+        return self._compiled.billing.total_units
 
     @property
     def grace_period_day(self) -> int:
-        return self._config.get("billing", {}).get("grace_period_day", 5)
+        return self._compiled.billing.grace_period_day
 
     @property
     def complex_billing_email(self) -> str:
-        return self._config.get("billing", {}).get("complex_email", "")
+        return self._compiled.billing.complex_email
 
     # Packages / Service Plans
     @property
-    def packages(self) -> list:
-        return self._config.get("packages", [])
+    def packages(self) -> tuple:
+        return self._compiled.packages
 
     @property
-    def default_package(self) -> dict:
-        for pkg in self.packages:
-            if pkg.get("default"):
-                return pkg
-        return self.packages[0] if self.packages else {}
+    def default_package(self) -> MappingProxyType:
+        return self._compiled.default_package
 
-    def get_package_by_name(self, name: str) -> dict | None:
-        for pkg in self.packages:
-            if pkg["name"] == name:
-                return pkg
-        return None
+    def get_package_by_name(self, name: str) -> MappingProxyType | None:
+        return self._compiled.packages_by_name.get(name)
 
     # Keywords for ticket forwarding
     @property
-    def internet_keywords(self) -> list:
-        return self._config.get("keywords", {}).get("internet_issues", [])
+    def internet_keywords(self) -> tuple:
+        return self._compiled.internet_keywords
+
+    @property
+    def classifier(self) -> TicketClassifier:
+        return self._compiled.classifier
+
+    # Bulk delinquency runs
+    @property
+    def delinquency_workers(self) -> int:
+        return self._compiled.settings["delinquency.workers"]
+
+    # Ticket forwarding
+    @property
+    def ticket_workers(self) -> int:
+        return self._compiled.settings["tickets.workers"]
+
+    @property
+    def ticket_group_incidents(self) -> bool:
+        return self._compiled.settings["tickets.group_incidents"]
+
+    @property
+    def ticket_incident_min_tickets(self) -> int:
+        return self._compiled.settings["tickets.incident_min_tickets"]
+
+    @property
+    def ticket_claim_timeout_minutes(self) -> float:
+        return self._compiled.settings["tickets.claim_timeout_minutes"]
+
+    # ONU health collection
+    @property
+    def health_bucket_minutes(self) -> int:
+        return self._compiled.settings["health.bucket_minutes"]
+
+    @property
+    def health_retention_days(self) -> int:
+        return self._compiled.settings["health.retention_days"]
+
+    @property
+    def health_rx_power_min(self) -> float:
+        return self._compiled.settings["health.rx_power_min_dbm"]
+
+    # Upstream rate limits (per host, see ratelimit.py)
+    @property
+    def rate_limits(self) -> MappingProxyType:
+        return self._section("rate_limits")
+
+    # NMS device event feed (see events.py; the subscriber starts with the daemon)
+    @property
+    def events(self) -> MappingProxyType:
+        return self._section("events")
+
+    @property
+    def events_enabled(self) -> bool:
+        return self._compiled.settings["events.enabled"]
+
+    @property
+    def events_url(self) -> str:
+        return self.events.get("url") or f"ws://{self.uisp_host}/nms/ws"
+
+    @property
+    def events_full_poll_minutes(self) -> float:
+        return self._compiled.settings["events.full_poll_minutes"]
+
+    @property
+    def events_enforce(self) -> bool:
+        return self._compiled.settings["events.enforce"]
+
+    # Multiple daemons sharing the database (read at startup only)
+    @property
+    def sharding(self) -> MappingProxyType:
+        return self._section("sharding")
+
+    @property
+    def sharding_enabled(self) -> bool:
+        return self._compiled.settings["sharding.enabled"]
+
+    @property
+    def sharding_shards(self) -> int:
+        return self._compiled.settings["sharding.shards"]
+
+    @property
+    def sharding_lease_seconds(self) -> float:
+        return self._compiled.settings["sharding.lease_seconds"]
+
+    # Local storage
+    @property
+    def database_path(self) -> str:
+        return self._section("storage").get("database", "vic_vil_sync.db")
+
+    @property
+    def inventory_path(self) -> str | None:
+        """ONU inventory CSV; None means the onu-inventory.csv next to the code."""
+        return self._section("storage").get("inventory")
+
+    # Span tracing (see tracing.py)
+    @property
+    def tracing(self) -> dict:
+        """Settings for configure_tracing(), with defaults filled in."""
+        settings = self._compiled.settings
+        return {
+            "enabled": settings["tracing.enabled"],
+            "path": self.tracing_path,
+            "max_bytes": settings["tracing.max_bytes"],
+            "backup_count": settings["tracing.backup_count"],
+        }
+
+    @property
+    def tracing_path(self) -> str:
+        """Trace file; defaults to traces.jsonl next to the database."""
+        path = self._section("tracing").get("path")
+        return path or str(Path(self.database_path).parent / "traces.jsonl")
 
     # Polling
     @property
     def polling_interval(self) -> int:
-        return self._config.get("polling", {}).get("interval_minutes", 5)
+        return self._compiled.settings["polling.interval_minutes"]
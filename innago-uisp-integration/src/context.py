@@ -0,0 +1,210 @@
+"""
+Cycle Context
+
+Upstream data shared by every phase of one sync cycle. Each listing (leases,
+tenants, invoices, open tickets, the NMS device snapshot, the ONU inventory
+CSV) is fetched at most once per cycle - lazily, so a cycle that never needs
+invoices never downloads them - and then served from in-memory indexes by
+unit and lease ID. SyncEngine invalidates it when the cycle ends.
+"""
+
+import logging
+import threading
+from collections import Counter
+
+from .onu import inventory_version, load_inventory
+
+logger = logging.getLogger(__name__)
+
+UNPAID_INVOICE_STATUSES = ("unpaid", "partially_paid", "overdue")
+
+
+def _property_key(property_name: str) -> str:
+    # Same normalization as onu.find_onu_by_unit: "350 S Harper" -> "350-s-harper"
+    return property_name.lower().replace(" ", "-")
+
+
+class _FailedFetch:
+    def __init__(self, error: Exception):
+        self.error = error
+
+
+class CycleContext:
+    """Per-cycle snapshot of leases, tenants, invoices, tickets, devices and inventory."""
+
+    def __init__(self, innago, uisp_nms, db, property_id: str, site_id: str):
+        self.innago = innago
+        self.uisp = uisp_nms
+        self.db = db
+        self.property_id = property_id
+        self.site_id = site_id
+        self.fetches = Counter()
+        self._cache = {}
+        # Delinquency and provisioning workers share the context
+        self._lock = threading.RLock()
+
+    def invalidate(self):
+        """Drop everything; the next access refetches."""
+        with self._lock:
+            if self.fetches:
+                logger.info(f"Cycle context fetches: {dict(self.fetches)}")
+            self._cache.clear()
+            self.fetches.clear()
+
+    def units_changed(self):
+        """Forget cached unit rows after a write to the units table."""
+        with self._lock:
+            self._cache.pop("units", None)
+
+    def _get(self, key: str, loader):
+        with self._lock:
+            if key not in self._cache:
+                self.fetches[key] += 1
+                try:
+                    self._cache[key] = loader()
+                except Exception as e:
+                    # Remember the failure so 500 units don't retry the same listing
+                    self._cache[key] = _FailedFetch(e)
+            value = self._cache[key]
+        if isinstance(value, _FailedFetch):
+            raise value.error
+        return value
+
+    # -------------------------------------------------------------------------
+    # Sources (one fetch each per cycle)
+    # -------------------------------------------------------------------------
+
+    @property
+    def leases(self) -> list:
+        """Active leases for the property."""
+        return self._get("leases", lambda: self.innago.get_leases(self.property_id, status="active"))
+
+    @property
+    def tenants(self) -> list:
+        return self._get("tenants", lambda: self.innago.get_tenants(self.property_id))
+
+    @property
+    def invoices(self) -> list:
+        return self._get("invoices", lambda: self.innago.get_property_invoices(self.property_id))
+
+    @property
+    def tickets(self) -> list:
+        """Open maintenance tickets."""
+        return self._get("tickets", lambda: self.innago.get_maintenance_tickets(
+            property_id=self.property_id, status="open"))
+
+    @property
+    def devices(self) -> list:
+        """NMS device snapshot (with interface stats, so health can reuse it)."""
+        return self._get("devices", lambda: self.uisp.get_devices(site_id=self.site_id,
+                                                                   with_interfaces=True))
+
+    @property
+    def inventory(self) -> list:
+        self._check_inventory()
+        return self._get("inventory", load_inventory)
+
+    def _check_inventory(self):
+        """Other sync instances rewrite the CSV mid-cycle - drop the snapshot when it changes."""
+        version = inventory_version()
+        with self._lock:
+            if self._cache.get("inventory_version") != version:
+                for key in ("inventory", "index:onu_by_unit", "index:onu_by_device"):
+                    self._cache.pop(key, None)
+                self._cache["inventory_version"] = version
+
+    @property
+    def units(self) -> dict:
+        """unit_number -> units table row."""
+        return self._get("units", lambda: {u["unit_number"]: u for u in self.db.get_all_tracked_units()})
+
+    # -------------------------------------------------------------------------
+    # Indexes
+    # -------------------------------------------------------------------------
+
+    def _index(self, key: str, build):
+        index_key = f"index:{key}"
+        with self._lock:
+            if index_key not in self._cache:
+                self._cache[index_key] = build()
+            return self._cache[index_key]
+
+    @property
+    def lease_by_id(self) -> dict:
+        return self._index("lease_by_id", lambda: {str(l.get("id")): l for l in self.leases})
+
+    @property
+    def owed_by_lease(self) -> dict:
+        def build():
+            owed = {}
+            for inv in self.invoices:
+                if inv.get("status") in UNPAID_INVOICE_STATUSES:
+                    lease_id = str(inv.get("leaseId"))
+                    owed[lease_id] = owed.get(lease_id, 0.0) + \
+                        float(inv.get("amount", 0)) - float(inv.get("amountPaid", 0))
+            return owed
+        return self._index("owed_by_lease", build)
+
+    @property
+    def onu_by_unit(self) -> dict:
+        """(normalized property, unit) and onu_name -> inventory row."""
+        def build():
+            index = {}
+            for row in self.inventory:
+                index.setdefault((_property_key(row["property"]), row["unit"]), row)
+                index.setdefault(row["onu_name"], row)
+            return index
+        self._check_inventory()
+        return self._index("onu_by_unit", build)
+
+    @property
+    def onu_by_device(self) -> dict:
+        """UISP device ID -> inventory row."""
+        self._check_inventory()
+        return self._index("onu_by_device", lambda: {r["uisp_id"]: r for r in self.inventory if r.get("uisp_id")})
+
+    # -------------------------------------------------------------------------
+    # Lookups
+    # -------------------------------------------------------------------------
+
+    def lease_balance(self, lease_id: str) -> float:
+        """
+        Outstanding balance from the lease listing, or from the invoice listing
+        when the lease payload doesn't carry one. Never a per-lease request.
+        """
+        lease = self.lease_by_id.get(str(lease_id))
+        if lease is not None:
+            balance = lease.get("balance")
+            if balance is None:
+                balance = lease.get("outstandingBalance")
+            if balance is not None:
+                return float(balance)
+            self._warn_no_balance(lease_id)
+        return self.owed_by_lease.get(str(lease_id), 0.0)
+
+    def _warn_no_balance(self, lease_id: str):
+        # Once per cycle - every lease in the listing will be missing it
+        with self._lock:
+            if "warned:no_balance" in self._cache:
+                return
+            self._cache["warned:no_balance"] = True
+        logger.warning(f"Lease {lease_id} has no balance/outstandingBalance field; "
+                       f"falling back to unpaid invoices for lease balances this cycle")
+
+    def tenants_by_lease(self, tenant_lease_ids) -> dict:
+        """lease_id -> tenants, using `tenant_lease_ids(tenant)` to read each record."""
+        def build():
+            index = {}
+            for tenant in self.tenants:
+                for lease_id in tenant_lease_ids(tenant):
+                    index.setdefault(lease_id, []).append(tenant)
+            return index
+        return self._index("tenants_by_lease", build)
+
+    def find_onu(self, property_name: str, unit: str) -> dict | None:
+        """Inventory row for a unit (same matching as onu.find_onu_by_unit)."""
+        prop = _property_key(property_name)
+        return self.onu_by_unit.get((prop, str(unit))) or self.onu_by_unit.get(f"{prop}-{unit}")
+
+    def unit_record(self, unit: str) -> dict | None:
+        return self.units.get(str(unit))
@@ -5,10 +5,22 @@ Simplified schema - tracks units, not complex tenant relationships.
 """
 
 import sqlite3
+import time
 from pathlib import Path
 from datetime import datetime
 
+from .tracing import trace_methods
 
+
+# Looked up or written once per lease/ticket/action, so they stay untraced
+PER_ROW_METHODS = (
+    "is_unit_tracked", "is_lease_active", "get_unit", "update_unit_status",
+    "update_rent_status", "is_ticket_synced", "update_delinquency_action",
+    "get_onu_health", "log_event",
+)
+
+
+@trace_methods("db", skip=PER_ROW_METHODS)
 class Database:
     def __init__(self, db_path: str = "vic_vil_sync.db"):
         self.db_path = db_path
@@ -62,6 +74,113 @@ class Database:
                 )
             """)
 
+            # ONU health - downsampled buckets, one row per device per bucket
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS onu_health (
+                    device_id TEXT NOT NULL,
+                    bucket_start TEXT NOT NULL,
+                    samples INTEGER DEFAULT 0,
+                    online_samples INTEGER DEFAULT 0,
+                    status TEXT,
+                    rx_power_avg REAL,
+                    rx_power_min REAL,
+                    uptime INTEGER,
+                    rx_rate_avg REAL,
+                    tx_rate_avg REAL,
+                    PRIMARY KEY (device_id, bucket_start)
+                ) WITHOUT ROWID
+            """)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_onu_health_bucket ON onu_health (bucket_start)"
+            )
+
+            # Delinquency runs - planned up front, checkpointed per action
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS delinquency_runs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    status TEXT DEFAULT 'running',
+                    planned INTEGER DEFAULT 0,
+                    started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    finished_at TIMESTAMP,
+                    summary TEXT
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS delinquency_actions (
+                    run_id INTEGER NOT NULL,
+                    unit_number TEXT NOT NULL,
+                    action TEXT NOT NULL,
+                    balance REAL,
+                    state TEXT DEFAULT 'planned',
+                    error TEXT,
+                    latency_ms REAL,
+                    updated_at TIMESTAMP,
+                    PRIMARY KEY (run_id, unit_number)
+                )
+            """)
+
+            # ONUs currently flagged as chronic outliers
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS onu_health_flags (
+                    device_id TEXT PRIMARY KEY,
+                    reason TEXT,
+                    flagged_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+
+            # Daemon instances sharing this database, and who holds which shard
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sync_instances (
+                    instance_id TEXT PRIMARY KEY,
+                    hostname TEXT,
+                    pid INTEGER,
+                    started_at REAL,
+                    heartbeat_at REAL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS shard_leases (
+                    shard INTEGER PRIMARY KEY,
+                    owner TEXT,
+                    acquired_at REAL,
+                    expires_at REAL
+                )
+            """)
+
+            # Last known state of every NMS device, fed by the event feed and full polls.
+            # `changes` lists what changed since the reconciler last looked (NULL = nothing)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS device_state (
+                    device_id TEXT PRIMARY KEY,
+                    name TEXT,
+                    serial TEXT,
+                    mac TEXT,
+                    enabled INTEGER,
+                    status TEXT,
+                    online INTEGER,
+                    previous_serial TEXT,
+                    source TEXT,
+                    updated_at REAL,
+                    changes TEXT,
+                    version INTEGER DEFAULT 0
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_device_state_changes ON device_state(changes)")
+
+            # Ticket claims: a row is written before the UISP POST so parallel
+            # workers and restarts never forward the same ticket twice
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(synced_tickets)")}
+            for column, ddl in (("status", "TEXT DEFAULT 'forwarded'"),
+                                ("claimed_by", "TEXT"),
+                                ("claimed_at", "TIMESTAMP")):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE synced_tickets ADD COLUMN {column} {ddl}")
+
+            # Instance executing a delinquency run, so only a dead owner's run is resumed
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(delinquency_runs)")}
+            if "owner" not in columns:
+                conn.execute("ALTER TABLE delinquency_runs ADD COLUMN owner TEXT")
+
             conn.commit()
 
     # -------------------------------------------------------------------------
@@ -185,11 +304,64 @@ class Database:
         with sqlite3.connect(self.db_path) as conn:
             conn.execute("""
                 INSERT OR REPLACE INTO synced_tickets
-                (innago_ticket_id, uisp_ticket_id, ticket_type)
-                VALUES (?, ?, ?)
+                (innago_ticket_id, uisp_ticket_id, ticket_type, status)
+                VALUES (?, ?, ?, 'forwarded')
             """, (innago_ticket_id, uisp_ticket_id, ticket_type))
             conn.commit()
 
+    def claim_ticket(self, innago_ticket_id: str, ticket_type: str, claimed_by: str) -> bool:
+        """
+        Atomically claim a ticket for forwarding. Returns False if it was already
+        claimed or forwarded (by this or any other worker/instance).
+        """
+        with sqlite3.connect(self.db_path) as conn:
+            cur = conn.execute("""
+                INSERT OR IGNORE INTO synced_tickets
+                (innago_ticket_id, ticket_type, status, claimed_by, claimed_at)
+                VALUES (?, ?, 'claimed', ?, ?)
+            """, (innago_ticket_id, ticket_type, claimed_by, datetime.now()))
+            conn.commit()
+            return cur.rowcount == 1
+
+    def complete_ticket_claim(self, innago_ticket_id: str, uisp_ticket_id: str, ticket_type: str):
+        """Mark a claimed ticket as forwarded."""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("""
+                UPDATE synced_tickets
+                SET status = 'forwarded', uisp_ticket_id = ?, ticket_type = ?, synced_at = ?
+                WHERE innago_ticket_id = ?
+            """, (uisp_ticket_id, ticket_type, datetime.now(), innago_ticket_id))
+            conn.commit()
+
+    def release_ticket_claim(self, innago_ticket_id: str, claimed_by: str):
+        """Drop a claim whose POST definitely failed, so the next cycle retries it."""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                "DELETE FROM synced_tickets WHERE innago_ticket_id = ? AND status = 'claimed' AND claimed_by = ?",
+                (innago_ticket_id, claimed_by)
+            )
+            conn.commit()
+
+    def get_stale_ticket_claims(self, before: datetime) -> list:
+        """Claims left behind by a crash mid-forward (the UISP ticket may or may not exist)."""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            cur = conn.execute(
+                "SELECT * FROM synced_tickets WHERE status = 'claimed' AND claimed_at < ? ORDER BY claimed_at",
+                (before,)
+            )
+            return [dict(row) for row in cur.fetchall()]
+
+    def release_stale_ticket_claims(self, before: datetime) -> int:
+        """Release crash-leftover claims after checking UISP by hand. Returns how many."""
+        with sqlite3.connect(self.db_path) as conn:
+            cur = conn.execute(
+                "DELETE FROM synced_tickets WHERE status = 'claimed' AND claimed_at < ?",
+                (before,)
+            )
+            conn.commit()
+            return cur.rowcount
+
     # -------------------------------------------------------------------------
     # Billing History
     # -------------------------------------------------------------------------
@@ -213,6 +385,359 @@ class Database:
             )
             return [dict(row) for row in cur.fetchall()]
 
+    # -------------------------------------------------------------------------
+    # Delinquency Runs
+    # -------------------------------------------------------------------------
+
+    def create_delinquency_run(self, actions: list, owner: str) -> int:
+        """Persist a planned run and all its actions in one transaction."""
+        with sqlite3.connect(self.db_path) as conn:
+            cur = conn.execute(
+                "INSERT INTO delinquency_runs (planned, owner) VALUES (?, ?)",
+                (len(actions), owner)
+            )
+            run_id = cur.lastrowid
+            conn.executemany("""
+                INSERT INTO delinquency_actions (run_id, unit_number, action, balance, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, [(run_id, a["unit_number"], a["action"], a["balance"], datetime.now())
+                  for a in actions])
+            conn.commit()
+            return run_id
+
+    def get_unfinished_delinquency_runs(self, live_owners: list) -> list:
+        """Runs that never finished and whose owner isn't in `live_owners` (it died mid-run)."""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            cur = conn.execute(
+                f"""
+                SELECT * FROM delinquency_runs
+                WHERE status = 'running'
+                  AND (owner IS NULL OR owner NOT IN ({', '.join('?' * len(live_owners))}))
+                ORDER BY id
+                """,
+                tuple(live_owners)
+            )
+            return [dict(row) for row in cur.fetchall()]
+
+    def take_over_delinquency_run(self, run_id: int, dead_owner: str | None, owner: str) -> bool:
+        """Claim a dead instance's run. False if another instance got to it first."""
+        with sqlite3.connect(self.db_path) as conn:
+            cur = conn.execute(
+                "UPDATE delinquency_runs SET owner = ? WHERE id = ? AND status = 'running' AND owner IS ?",
+                (owner, run_id, dead_owner)
+            )
+            conn.commit()
+            return cur.rowcount == 1
+
+    def get_pending_delinquency_actions(self, run_id: int) -> list:
+        """Actions not yet finished (planned, or running when the process died)."""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            cur = conn.execute(
+                "SELECT * FROM delinquency_actions WHERE run_id = ? AND state IN ('planned', 'running')",
+                (run_id,)
+            )
+            return [dict(row) for row in cur.fetchall()]
+
+    def get_delinquency_actions(self, run_id: int) -> list:
+        """All actions of a run."""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            cur = conn.execute(
+                "SELECT * FROM delinquency_actions WHERE run_id = ? ORDER BY unit_number",
+                (run_id,)
+            )
+            return [dict(row) for row in cur.fetchall()]
+
+    def update_delinquency_action(self, run_id: int, unit_number: str, state: str,
+                                  error: str = None, latency_ms: float = None):
+        """Checkpoint one action's progress."""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("""
+                UPDATE delinquency_actions
+                SET state = ?, error = ?, latency_ms = COALESCE(?, latency_ms), updated_at = ?
+                WHERE run_id = ? AND unit_number = ?
+            """, (state, error, latency_ms, datetime.now(), run_id, unit_number))
+            conn.commit()
+
+    def finish_delinquency_run(self, run_id: int, status: str, summary: str):
+        """Close out a run with its report."""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                "UPDATE delinquency_runs SET status = ?, summary = ?, finished_at = ? WHERE id = ?",
+                (status, summary, datetime.now(), run_id)
+            )
+            conn.commit()
+
+    # -------------------------------------------------------------------------
+    # ONU Health
+    # -------------------------------------------------------------------------
+
+    def save_onu_health_samples(self, bucket_start: str, readings: list):
+        """Fold one bulk reading into the current bucket (running averages)."""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.executemany("""
+                INSERT INTO onu_health (device_id, bucket_start, samples, online_samples, status,
+                                        rx_power_avg, rx_power_min, uptime, rx_rate_avg, tx_rate_avg)
+                VALUES (?, ?, 1, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(device_id, bucket_start) DO UPDATE SET
+                    samples = samples + 1,
+                    online_samples = online_samples + excluded.online_samples,
+                    status = excluded.status,
+                    rx_power_avg = CASE
+                        WHEN excluded.rx_power_avg IS NULL THEN rx_power_avg
+                        WHEN rx_power_avg IS NULL THEN excluded.rx_power_avg
+                        ELSE (rx_power_avg * samples + excluded.rx_power_avg) / (samples + 1)
+                    END,
+                    rx_power_min = MIN(COALESCE(rx_power_min, excluded.rx_power_min),
+                                       COALESCE(excluded.rx_power_min, rx_power_min)),
+                    uptime = COALESCE(excluded.uptime, uptime),
+                    rx_rate_avg = CASE
+                        WHEN excluded.rx_rate_avg IS NULL THEN rx_rate_avg
+                        WHEN rx_rate_avg IS NULL THEN excluded.rx_rate_avg
+                        ELSE (rx_rate_avg * samples + excluded.rx_rate_avg) / (samples + 1)
+                    END,
+                    tx_rate_avg = CASE
+                        WHEN excluded.tx_rate_avg IS NULL THEN tx_rate_avg
+                        WHEN tx_rate_avg IS NULL THEN excluded.tx_rate_avg
+                        ELSE (tx_rate_avg * samples + excluded.tx_rate_avg) / (samples + 1)
+                    END
+            """, [
+                (r["device_id"], bucket_start, r["online"], r["status"], r["rx_power"],
+                 r["rx_power"], r["uptime"], r["rx_rate"], r["tx_rate"])
+                for r in readings
+            ])
+            conn.commit()
+
+    def prune_onu_health(self, before: str):
+        """Drop health buckets older than the retention window."""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("DELETE FROM onu_health WHERE bucket_start < ?", (before,))
+            conn.commit()
+
+    def get_onu_health(self, device_id: str, since: str) -> list:
+        """Get health buckets for one device, oldest first."""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            cur = conn.execute(
+                "SELECT * FROM onu_health WHERE device_id = ? AND bucket_start >= ? ORDER BY bucket_start",
+                (device_id, since)
+            )
+            return [dict(row) for row in cur.fetchall()]
+
+    def get_onu_health_since(self, since: str) -> list:
+        """Get health buckets for all devices since a timestamp."""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            cur = conn.execute(
+                "SELECT * FROM onu_health WHERE bucket_start >= ? ORDER BY device_id, bucket_start",
+                (since,)
+            )
+            return [dict(row) for row in cur.fetchall()]
+
+    def get_onu_health_flags(self) -> list:
+        """Get ONUs currently flagged as chronic outliers."""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            cur = conn.execute("SELECT * FROM onu_health_flags ORDER BY flagged_at")
+            return [dict(row) for row in cur.fetchall()]
+
+    def set_onu_health_flag(self, device_id: str, reason: str):
+        """Flag an ONU (keeps the original flagged_at if already flagged)."""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("""
+                INSERT INTO onu_health_flags (device_id, reason) VALUES (?, ?)
+                ON CONFLICT(device_id) DO UPDATE SET reason = excluded.reason
+            """, (device_id, reason))
+            conn.commit()
+
+    def clear_onu_health_flag(self, device_id: str):
+        """Clear an ONU's outlier flag."""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("DELETE FROM onu_health_flags WHERE device_id = ?", (device_id,))
+            conn.commit()
+
+    # -------------------------------------------------------------------------
+    # Sync Instances & Shard Leases
+    # -------------------------------------------------------------------------
+
+    def heartbeat_instance(self, instance_id: str, hostname: str, pid: int, now: float):
+        """Register an instance or refresh its heartbeat."""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("""
+                INSERT INTO sync_instances (instance_id, hostname, pid, started_at, heartbeat_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(instance_id) DO UPDATE SET heartbeat_at = excluded.heartbeat_at
+            """, (instance_id, hostname, pid, now, now))
+            conn.commit()
+
+    def get_live_instances(self, since: float) -> list:
+        """Instances that sent a heartbeat after `since`."""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            cur = conn.execute(
+                "SELECT * FROM sync_instances WHERE heartbeat_at >= ? ORDER BY instance_id",
+                (since,)
+            )
+            return [dict(row) for row in cur.fetchall()]
+
+    def remove_instance(self, instance_id: str):
+        """Deregister an instance and free its shards right away."""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("DELETE FROM sync_instances WHERE instance_id = ?", (instance_id,))
+            conn.execute(
+                "UPDATE shard_leases SET owner = NULL, expires_at = 0 WHERE owner = ?",
+                (instance_id,)
+            )
+            conn.commit()
+
+    def acquire_shard_leases(self, instance_id: str, shards: list, now: float,
+                             expires_at: float) -> list:
+        """
+        Take or renew leases on `shards`. A shard is only taken if it is free,
+        already ours, or its lease has expired. Returns the shards now held.
+        """
+        held = []
+        with sqlite3.connect(self.db_path, isolation_level=None) as conn:
+            # IMMEDIATE takes the write lock up front so two instances can't both win
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for shard in shards:
+                    conn.execute(
+                        "INSERT OR IGNORE INTO shard_leases (shard, expires_at) VALUES (?, 0)",
+                        (shard,)
+                    )
+                    cur = conn.execute("""
+                        UPDATE shard_leases
+                        SET owner = ?, expires_at = ?,
+                            acquired_at = CASE WHEN owner = ? THEN acquired_at ELSE ? END
+                        WHERE shard = ? AND (owner IS NULL OR owner = ? OR expires_at < ?)
+                    """, (instance_id, expires_at, instance_id, now, shard, instance_id, now))
+                    if cur.rowcount:
+                        held.append(shard)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return held
+
+    def release_shard_leases(self, instance_id: str, shards: list):
+        """Give up shards (e.g. after a rebalance moved them elsewhere)."""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.executemany(
+                "UPDATE shard_leases SET owner = NULL, expires_at = 0 WHERE shard = ? AND owner = ?",
+                [(shard, instance_id) for shard in shards]
+            )
+            conn.commit()
+
+    def get_shard_leases(self) -> list:
+        """Every shard lease row."""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            cur = conn.execute("SELECT * FROM shard_leases ORDER BY shard")
+            return [dict(row) for row in cur.fetchall()]
+
+    # -------------------------------------------------------------------------
+    # Device State
+    # -------------------------------------------------------------------------
+
+    def record_device_states(self, states: list, source: str) -> int:
+        """
+        Store the latest state of each device (see events.device_state).
+
+        Fields that are None keep their stored value, so partial event payloads
+        are fine. A device seen for the first time, enabled/disabled, going
+        on/offline or reporting a new serial (replaced) gets that added to its
+        pending `changes` and its version bumped. Returns how many were flagged.
+        """
+        if not states:
+            return 0
+        now = time.time()
+        flagged = 0
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            # The event thread and a full poll can write at once - read and write under one lock
+            conn.execute("BEGIN IMMEDIATE")
+            known = {}
+            ids = [s["device_id"] for s in states]
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                cur = conn.execute(
+                    f"SELECT * FROM device_state WHERE device_id IN ({','.join('?' * len(chunk))})", chunk
+                )
+                known.update((row["device_id"], dict(row)) for row in cur)
+
+            rows = []
+            for state in states:
+                old = known.get(state["device_id"])
+                merged = dict(old or {})
+                merged.update({k: v for k, v in state.items() if v is not None})
+
+                changes = []
+                if old is None:
+                    changes.append("new")
+                else:
+                    if old["enabled"] != merged.get("enabled"):
+                        changes.append("enabled")
+                    if old["online"] != merged.get("online"):
+                        changes.append("online")
+                    if old["serial"] and merged.get("serial") != old["serial"]:
+                        changes.append("replaced")
+                        merged["previous_serial"] = old["serial"]
+
+                pending = old["changes"].split(",") if old and old["changes"] else []
+                pending += [c for c in changes if c not in pending]
+                if changes:
+                    flagged += 1
+                rows.append((
+                    merged["device_id"], merged.get("name"), merged.get("serial"), merged.get("mac"),
+                    merged.get("enabled"), merged.get("status"), merged.get("online"),
+                    merged.get("previous_serial"), source, now, ",".join(pending) or None,
+                    (old["version"] if old else 0) + (1 if changes else 0),
+                ))
+
+            conn.executemany("""
+                INSERT OR REPLACE INTO device_state
+                (device_id, name, serial, mac, enabled, status, online, previous_serial,
+                 source, updated_at, changes, version)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+            conn.commit()
+        return flagged
+
+    def get_changed_devices(self) -> list:
+        """Devices with changes the reconciler hasn't handled yet."""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            cur = conn.execute("SELECT * FROM device_state WHERE changes IS NOT NULL ORDER BY updated_at")
+            return [dict(row) for row in cur.fetchall()]
+
+    def clear_device_changes(self, versions: dict):
+        """
+        Mark changes handled. versions: {device_id: version as read}; a device
+        that changed again in the meantime keeps its flag.
+        """
+        with sqlite3.connect(self.db_path) as conn:
+            conn.executemany(
+                "UPDATE device_state SET changes = NULL WHERE device_id = ? AND version = ?",
+                list(versions.items())
+            )
+            conn.commit()
+
+    def get_device_state_summary(self) -> dict:
+        """Counts for --status."""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute("""
+                SELECT COUNT(*) AS devices,
+                       SUM(CASE WHEN online = 0 THEN 1 ELSE 0 END) AS offline,
+                       SUM(CASE WHEN changes IS NOT NULL THEN 1 ELSE 0 END) AS pending,
+                       MAX(CASE WHEN source = 'event' THEN updated_at END) AS last_event_at
+                FROM device_state
+            """).fetchone()
+            return dict(row)
+
     # -------------------------------------------------------------------------
     # Event Logging
     # -------------------------------------------------------------------------
@@ -226,6 +751,17 @@ class Database:
             )
             conn.commit()
 
+    def get_latest_event(self, event_type: str) -> dict | None:
+        """Get the most recent event of a given type."""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            cur = conn.execute(
+                "SELECT * FROM sync_log WHERE event_type = ? ORDER BY id DESC LIMIT 1",
+                (event_type,)
+            )
+            row = cur.fetchone()
+            return dict(row) if row else None
+
     def get_recent_events(self, limit: int = 50) -> list:
         """Get recent events."""
         with sqlite3.connect(self.db_path) as conn:
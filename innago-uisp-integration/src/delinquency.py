@@ -0,0 +1,221 @@
+"""
+Bulk Delinquency Run
+
+On the grace day a large share of units can need suspending at once. A run:
+
+1. Plans - fetches every active unit's balance (in parallel) and decides which
+   units to suspend or reactivate
+2. Persists the plan to SQLite before touching anything
+3. Executes the actions with bounded parallelism, checkpointing each one
+4. Reports throughput, per-action latency and a reconciliation summary
+
+A run whose instance died part way is taken over and resumed (only its
+unfinished actions) the next time a run starts. Each resumed action is checked
+against the current balance first - a tenant may have paid since it was planned.
+"""
+
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .tracing import bind, traced
+
+logger = logging.getLogger(__name__)
+
+SUSPEND = "suspend"
+REACTIVATE = "reactivate"
+
+
+def _percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _needed_action(unit_record: dict, balance: float) -> str | None:
+    """SUSPEND, REACTIVATE or None for a unit with this balance."""
+    delinquent = unit_record.get("rent_status") == "delinquent"
+    if balance > 0 and not delinquent:
+        return SUSPEND
+    if balance <= 0 and delinquent:
+        return REACTIVATE
+    return None
+
+
+class DelinquencyRun:
+    """Plan, checkpoint and execute delinquency suspensions/restorations."""
+
+    def __init__(self, engine, workers: int = 8):
+        self.engine = engine
+        self.db = engine.db
+        self.workers = max(1, workers)
+
+    def run(self) -> list:
+        """Resume any crashed run, then plan and execute a fresh one. Returns reports."""
+        reports = []
+        owner = self.engine.instance_id
+
+        # A live instance's run is its own business; only a dead owner's is taken over
+        for unfinished in self.db.get_unfinished_delinquency_runs(self.engine.live_instances()):
+            if not self.db.take_over_delinquency_run(unfinished["id"], unfinished["owner"], owner):
+                continue
+            logger.warning(f"Resuming delinquency run #{unfinished['id']} "
+                           f"(left by {unfinished['owner'] or 'an earlier process'})")
+            reports.append(self._execute(unfinished["id"], resumed=True))
+
+        actions = self.plan()
+        if actions:
+            run_id = self.db.create_delinquency_run(actions, owner)
+            logger.info(f"Delinquency run #{run_id}: {len(actions)} action(s) planned")
+            reports.append(self._execute(run_id))
+        else:
+            logger.info("No delinquency changes needed")
+
+        return reports
+
+    @traced("delinquency.plan")
+    def plan(self) -> list:
+        """Decide which units to suspend or reactivate. Nothing is changed yet."""
+        # With several instances, each plans only the units whose shard it holds
+        units = [u for u in self.db.get_active_units() if self.engine.owns(u["unit_number"])]
+
+        def fetch(unit_record):
+            try:
+                return unit_record, self.engine.get_lease_balance(unit_record["lease_id"]), None
+            except Exception as e:
+                return unit_record, None, e
+
+        actions = []
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for unit_record, balance, error in pool.map(bind(fetch), units):
+                unit = unit_record["unit_number"]
+                if error is not None:
+                    logger.error(f"Error checking balance for unit {unit}: {error}")
+                    continue
+
+                action = _needed_action(unit_record, balance)
+                if action == SUSPEND:
+                    logger.info(f"Unit {unit} delinquent (balance: ${balance})")
+                elif action == REACTIVATE:
+                    logger.info(f"Unit {unit} paid up - reactivating")
+                if action:
+                    actions.append({"unit_number": unit, "action": action, "balance": balance})
+
+        return actions
+
+    def _still_needed(self, run_id: int, action: dict) -> bool:
+        """
+        Re-check a resumed action against the unit's current balance and status.
+        One that no longer applies (the tenant paid since the crash) is skipped.
+        """
+        unit = action["unit_number"]
+        unit_record = self.db.get_unit(unit)
+        try:
+            balance = self.engine.get_lease_balance(unit_record["lease_id"]) if unit_record else None
+        except Exception as e:
+            logger.error(f"Error re-checking balance for unit {unit}: {e}")
+            balance = None
+        if unit_record is None or balance is None or _needed_action(unit_record, balance) != action["action"]:
+            logger.info(f"Unit {unit}: resumed {action['action']} no longer applies - skipping")
+            self.db.update_delinquency_action(run_id, unit, "skipped", error="No longer applies")
+            return False
+        action["balance"] = balance
+        return True
+
+    @traced("delinquency.execute", record=("run_id",))
+    def _execute(self, run_id: int, resumed: bool = False) -> dict:
+        """Run every unfinished action of a run that this instance owns and close it out."""
+        pending = []
+        for a in self.db.get_pending_delinquency_actions(run_id):
+            if not self.engine.owns(a["unit_number"]):
+                if resumed:
+                    # The unit's shard moved; its owner plans it afresh from rent_status
+                    self.db.update_delinquency_action(run_id, a["unit_number"], "skipped",
+                                                      error="Unit owned by another instance")
+                continue
+            if resumed and not self._still_needed(run_id, a):
+                continue
+            pending.append(a)
+        started = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            list(pool.map(bind(lambda a: self._execute_action(run_id, a)), pending))
+
+        elapsed = time.monotonic() - started
+        report = self._report(run_id, len(pending), elapsed)
+
+        # Another instance still has actions in flight on this run - let it close it
+        remaining = len(self.db.get_pending_delinquency_actions(run_id))
+        if remaining:
+            logger.info(f"Delinquency run #{run_id}: {remaining} action(s) left for other instances")
+            return report
+
+        status = "completed" if report["failed"] == 0 else "completed_with_errors"
+        self.db.finish_delinquency_run(run_id, status, json.dumps(report))
+        self.db.log_event("delinquency_run", f"Run #{run_id}: {report['done']} done, "
+                                             f"{report['failed']} failed in {elapsed:.1f}s")
+        logger.info(
+            f"Delinquency run #{run_id}: {report['done']}/{report['planned']} done, "
+            f"{report['failed']} failed, {report['per_second']:.1f} actions/s, "
+            f"p50 {report['latency_p50_ms']:.0f}ms p95 {report['latency_p95_ms']:.0f}ms"
+        )
+        return report
+
+    def _execute_action(self, run_id: int, action: dict):
+        unit = action["unit_number"]
+        self.db.update_delinquency_action(run_id, unit, "running")
+        started = time.monotonic()
+
+        try:
+            if action["action"] == SUSPEND:
+                onu_ok = self.engine._suspend_for_delinquency(unit, action["balance"])
+            else:
+                onu_ok = self.engine._reactivate_after_payment(unit)
+            latency = 1000 * (time.monotonic() - started)
+
+            if onu_ok:
+                self.db.update_delinquency_action(run_id, unit, "done", latency_ms=latency)
+            else:
+                self.db.update_delinquency_action(run_id, unit, "failed", latency_ms=latency,
+                                                  error="ONU not updated")
+        except Exception as e:
+            latency = 1000 * (time.monotonic() - started)
+            logger.error(f"Delinquency {action['action']} failed for unit {unit}: {e}")
+            self.db.update_delinquency_action(run_id, unit, "failed", latency_ms=latency,
+                                              error=str(e))
+
+    def _report(self, run_id: int, executed: int, elapsed: float) -> dict:
+        """Summarize a run and reconcile it against the units table."""
+        actions = self.db.get_delinquency_actions(run_id)
+        latencies = [a["latency_ms"] for a in actions if a["latency_ms"] is not None]
+
+        # Reconcile: does the units table reflect every action we think we did?
+        mismatched = []
+        for a in actions:
+            if a["state"] != "done":
+                continue
+            unit_record = self.db.get_unit(a["unit_number"]) or {}
+            expected = "delinquent" if a["action"] == SUSPEND else "current"
+            if unit_record.get("rent_status") != expected:
+                mismatched.append(a["unit_number"])
+
+        return {
+            "run_id": run_id,
+            "planned": len(actions),
+            "executed": executed,
+            "suspended": sum(1 for a in actions if a["action"] == SUSPEND and a["state"] == "done"),
+            "reactivated": sum(1 for a in actions if a["action"] == REACTIVATE and a["state"] == "done"),
+            "done": sum(1 for a in actions if a["state"] == "done"),
+            "failed": sum(1 for a in actions if a["state"] == "failed"),
+            "skipped": sum(1 for a in actions if a["state"] == "skipped"),
+            "failed_units": [a["unit_number"] for a in actions if a["state"] == "failed"],
+            "mismatched_units": mismatched,
+            "elapsed": round(elapsed, 2),
+            "per_second": executed / elapsed if elapsed else 0.0,
+            "latency_p50_ms": _percentile(latencies, 50),
+            "latency_p95_ms": _percentile(latencies, 95),
+            "latency_max_ms": max(latencies) if latencies else 0.0,
+        }
@@ -0,0 +1,156 @@
+"""
+UISP Device Event Feed
+
+Subscribes to the NMS websocket and writes every device update into the local
+`device_state` table as it happens, so the reconciler (SyncEngine.reconcile_devices)
+only has to look at devices that actually changed: an ONU dropping offline, a
+tech re-enabling a suspended unit by hand, a replaced device reporting a new
+serial.
+
+The feed is best-effort. While it is down (or websocket-client isn't
+installed) the reconciler falls back to a full device poll every cycle, and it
+does a full poll on a slow timer even while the feed is up, to catch anything
+missed across a reconnect.
+
+Messages are JSON: a device record, a {"type": "device", "data": {...}}
+envelope, or a list of either.
+"""
+
+import json
+import logging
+import threading
+import time
+
+from .health import ONLINE_STATUSES
+
+try:
+    import websocket  # websocket-client
+except ImportError:  # optional - polling still works without it
+    websocket = None
+
+logger = logging.getLogger(__name__)
+
+
+def device_state(device: dict) -> dict | None:
+    """The fields device_state tracks, from an NMS device record (None = not in payload)."""
+    ident = device.get("identification") or {}
+    device_id = device.get("id") or ident.get("id")
+    if not device_id:
+        return None
+
+    status = ((device.get("overview") or {}).get("status") or "").lower() or None
+
+    enabled = device.get("enabled")
+    if enabled is None and "suspended" in (device.get("attributes") or {}):
+        enabled = not device["attributes"]["suspended"]
+
+    return {
+        "device_id": str(device_id),
+        "name": ident.get("name"),
+        "serial": ident.get("serialNumber"),
+        "mac": ident.get("mac"),
+        "enabled": None if enabled is None else int(bool(enabled)),
+        "status": status,
+        "online": None if status is None else int(status in ONLINE_STATUSES),
+    }
+
+
+def parse_device_events(message: str) -> list:
+    """Device records carried by one websocket message."""
+    payload = json.loads(message)
+    items = payload if isinstance(payload, list) else [payload]
+    devices = []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        if "data" in item:
+            if str(item.get("type", "device")).startswith("device") and isinstance(item["data"], dict):
+                devices.append(item["data"])
+        elif "identification" in item or "id" in item:
+            devices.append(item)
+    return devices
+
+
+class DeviceEventSubscriber:
+    """Background thread that keeps device_state current from the NMS websocket."""
+
+    def __init__(self, url: str, api_key: str, db, reconnect_max: float = 60):
+        self.url = url
+        self.api_key = api_key
+        self.db = db
+        self.reconnect_max = reconnect_max
+        self.connected = False
+        # Bumped on every (re)connect; the reconciler full-polls when it moves
+        self.generation = 0
+        self.received = 0
+        self.last_event_at = None
+        self._stop = threading.Event()
+        self._ws = None
+        self._thread = None
+
+    def start(self) -> bool:
+        """Start the subscriber thread. False if websocket-client isn't installed."""
+        if websocket is None:
+            logger.warning("websocket-client not installed - device events disabled, polling only")
+            return False
+        self._thread = threading.Thread(target=self._run, name="device-events", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+        if self._ws is not None:
+            self._ws.close()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def wait_connected(self, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        while not self.connected and time.monotonic() < deadline:
+            time.sleep(0.05)
+        return self.connected
+
+    def _run(self):
+        delay = 1.0
+        while not self._stop.is_set():
+            self._ws = websocket.WebSocketApp(
+                self.url,
+                header=[f"x-auth-token: {self.api_key}"],
+                on_open=self._on_open,
+                on_message=self._on_message,
+                on_error=self._on_error,
+                on_close=self._on_close,
+            )
+            started = time.monotonic()
+            self._ws.run_forever(ping_interval=30, ping_timeout=10)
+            self.connected = False
+            if self._stop.is_set():
+                break
+
+            # A connection that stayed up a while resets the backoff
+            if time.monotonic() - started > 60:
+                delay = 1.0
+            logger.warning(f"Device event feed disconnected, reconnecting in {delay:.0f}s")
+            self._stop.wait(delay)
+            delay = min(delay * 2, self.reconnect_max)
+
+    def _on_open(self, ws):
+        self.generation += 1
+        self.connected = True
+        logger.info(f"Subscribed to device events at {self.url}")
+
+    def _on_message(self, ws, message):
+        try:
+            states = [s for s in (device_state(d) for d in parse_device_events(message)) if s]
+            if states:
+                self.db.record_device_states(states, "event")
+                self.received += len(states)
+                self.last_event_at = time.time()
+        except Exception as e:
+            logger.warning(f"Bad device event ({e}): {str(message)[:200]}")
+
+    def _on_error(self, ws, error):
+        logger.warning(f"Device event feed error: {error}")
+
+    def _on_close(self, ws, status_code, message):
+        self.connected = False
@@ -0,0 +1,225 @@
+"""
+ONU Health Collection
+
+Pulls optical and traffic health for every ONU under the Victorian Village
+site in a single NMS call per cycle and keeps a downsampled history in SQLite.
+The history is attached to forwarded tickets so the triage tech doesn't have
+to dig through the NMS by hand.
+"""
+
+import logging
+from datetime import datetime, timedelta
+
+from .uisp import is_onu_device
+
+logger = logging.getLogger(__name__)
+
+ONLINE_STATUSES = {"active", "online", "connected"}
+
+
+def _bucket_start(ts: datetime, bucket_minutes: int) -> str:
+    """Round a timestamp down to the start of its bucket."""
+    minute = (ts.minute // bucket_minutes) * bucket_minutes
+    return ts.replace(minute=minute, second=0, microsecond=0).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _format_uptime(seconds: int | None) -> str:
+    if not seconds:
+        return "unknown"
+    days, rem = divmod(int(seconds), 86400)
+    hours, rem = divmod(rem, 3600)
+    if days:
+        return f"{days}d {hours}h"
+    return f"{hours}h {rem // 60}m"
+
+
+def extract_reading(device: dict) -> dict | None:
+    """
+    Pull the health fields we care about out of an NMS device record.
+
+    Returns None for devices without an ID. Missing metrics come back as None
+    rather than zero so they don't skew the averages.
+    """
+    ident = device.get("identification", {})
+    overview = device.get("overview", {}) or {}
+    device_id = device.get("id") or ident.get("id")
+    if not device_id:
+        return None
+
+    status = (overview.get("status") or "unknown").lower()
+
+    # ONUs report optical RX power either on the onu block or as the overview signal
+    rx_power = (device.get("onu") or {}).get("rxPower")
+    if rx_power is None:
+        rx_power = overview.get("signal")
+
+    # Throughput only comes back when interfaces are requested
+    rx_rate = tx_rate = None
+    for iface in device.get("interfaces") or []:
+        stats = iface.get("statistics") or {}
+        if stats.get("rxrate") is not None:
+            rx_rate = (rx_rate or 0) + stats["rxrate"]
+        if stats.get("txrate") is not None:
+            tx_rate = (tx_rate or 0) + stats["txrate"]
+
+    return {
+        "device_id": str(device_id),
+        "status": status,
+        "online": 1 if status in ONLINE_STATUSES else 0,
+        "rx_power": float(rx_power) if rx_power is not None else None,
+        "uptime": overview.get("uptime"),
+        "rx_rate": rx_rate,
+        "tx_rate": tx_rate,
+    }
+
+
+class ONUHealthCollector:
+    """Collects ONU health in bulk and flags chronic outliers."""
+
+    def __init__(self, uisp_nms_client, db, site_id: str,
+                 bucket_minutes: int = 15, retention_days: int = 30,
+                 rx_power_min: float = -27.0, outlier_ratio: float = 0.5):
+        self.uisp = uisp_nms_client
+        self.db = db
+        self.site_id = site_id
+        self.bucket_minutes = bucket_minutes
+        self.retention_days = retention_days
+        self.rx_power_min = rx_power_min
+        self.outlier_ratio = outlier_ratio
+        # OLTs, switches and routers in the site listing - never sampled or flagged
+        self.non_onus = set()
+
+    def collect(self, devices: list = None) -> int:
+        """
+        Take one bulk reading of every ONU under the site.
+
+        One device listing per cycle, never one request per ONU; pass the
+        cycle's device snapshot to reuse it. Returns the number of devices recorded.
+        """
+        if devices is None:
+            devices = self.uisp.get_devices(site_id=self.site_id, with_interfaces=True)
+        now = datetime.now()
+        bucket = _bucket_start(now, self.bucket_minutes)
+
+        onus = [d for d in devices if is_onu_device(d)]
+        self.non_onus = {str(d.get("id") or d.get("identification", {}).get("id"))
+                         for d in devices if not is_onu_device(d)}
+        readings = [r for r in (extract_reading(d) for d in onus) if r]
+        self.db.save_onu_health_samples(bucket, readings)
+
+        cutoff = (now - timedelta(days=self.retention_days)).strftime("%Y-%m-%d %H:%M:%S")
+        self.db.prune_onu_health(cutoff)
+
+        logger.info(f"Recorded health for {len(readings)} ONU(s)")
+        self.flag_outliers()
+        return len(readings)
+
+    def flag_outliers(self, hours: int = 24) -> list:
+        """
+        Flag ONUs that spent most of the window offline or below the RX floor.
+
+        Newly flagged and recovered devices are written to the event log.
+        Returns the currently flagged device IDs.
+        """
+        since = (datetime.now() - timedelta(hours=hours)).strftime("%Y-%m-%d %H:%M:%S")
+        history = {}
+        for row in self.db.get_onu_health_since(since):
+            if row["device_id"] not in self.non_onus:
+                history.setdefault(row["device_id"], []).append(row)
+
+        outliers = {}
+        for device_id, rows in history.items():
+            reason = self._outlier_reason(rows)
+            if reason:
+                outliers[device_id] = reason
+
+        previously_flagged = {f["device_id"]: f for f in self.db.get_onu_health_flags()}
+
+        for device_id, reason in outliers.items():
+            if device_id not in previously_flagged:
+                logger.warning(f"ONU {device_id} flagged: {reason}")
+                self.db.log_event("onu_health_flagged", f"Device {device_id}: {reason}")
+            self.db.set_onu_health_flag(device_id, reason)
+
+        for device_id in previously_flagged:
+            if device_id in self.non_onus:
+                # Flagged before collection skipped non-ONU devices
+                self.db.clear_onu_health_flag(device_id)
+            elif device_id not in outliers and device_id in history:
+                logger.info(f"ONU {device_id} recovered")
+                self.db.clear_onu_health_flag(device_id)
+                self.db.log_event("onu_health_cleared", f"Device {device_id} back within limits")
+
+        return list(outliers)
+
+    def _outlier_reason(self, rows: list) -> str | None:
+        """Decide whether a device's recent buckets make it a chronic outlier."""
+        # Need a few buckets before calling anything chronic
+        if len(rows) < 4:
+            return None
+
+        samples = sum(r["samples"] for r in rows)
+        online = sum(r["online_samples"] for r in rows)
+        if samples and (samples - online) / samples >= self.outlier_ratio:
+            return f"offline in {100 * (samples - online) // samples}% of samples"
+
+        rx_rows = [r for r in rows if r["rx_power_avg"] is not None]
+        low = [r for r in rx_rows if r["rx_power_avg"] < self.rx_power_min]
+        if rx_rows and len(low) / len(rx_rows) >= self.outlier_ratio:
+            worst = min(r["rx_power_min"] for r in low)
+            return f"RX power below {self.rx_power_min} dBm in {len(low)}/{len(rx_rows)} buckets (worst {worst:.1f} dBm)"
+
+        return None
+
+    def format_summary(self, device_id: str, hours: int = 24) -> str:
+        """Render the last `hours` of readings for a ticket body."""
+        if not device_id:
+            return "No ONU linked - no health history available."
+
+        since = (datetime.now() - timedelta(hours=hours)).strftime("%Y-%m-%d %H:%M:%S")
+        rows = self.db.get_onu_health(str(device_id), since)
+        if not rows:
+            return f"No readings in the last {hours}h."
+
+        samples = sum(r["samples"] for r in rows)
+        online = sum(r["online_samples"] for r in rows)
+        rx_values = [r["rx_power_avg"] for r in rows if r["rx_power_avg"] is not None]
+        rx_mins = [r["rx_power_min"] for r in rows if r["rx_power_min"] is not None]
+        latest = rows[-1]
+
+        lines = [
+            f"Online: {100 * online // samples if samples else 0}% of {samples} samples",
+            f"Current status: {latest['status']} (uptime {_format_uptime(latest['uptime'])})",
+        ]
+        if rx_values:
+            lines.append(
+                f"RX power: avg {sum(rx_values) / len(rx_values):.1f} dBm, "
+                f"worst {min(rx_mins):.1f} dBm, latest {rx_values[-1]:.1f} dBm"
+            )
+        if latest["rx_rate_avg"] is not None or latest["tx_rate_avg"] is not None:
+            down = (latest["rx_rate_avg"] or 0) / 1_000_000
+            up = (latest["tx_rate_avg"] or 0) / 1_000_000
+            lines.append(f"Throughput (latest bucket): {down:.1f} down / {up:.1f} up Mbps")
+
+        flag = next((f for f in self.db.get_onu_health_flags() if f["device_id"] == str(device_id)), None)
+        if flag:
+            lines.append(f"FLAGGED: {flag['reason']}")
+
+        # Hourly breakdown, oldest first
+        hourly = {}
+        for r in rows:
+            hour = r["bucket_start"][:13]
+            h = hourly.setdefault(hour, {"samples": 0, "online": 0, "rx": []})
+            h["samples"] += r["samples"]
+            h["online"] += r["online_samples"]
+            if r["rx_power_avg"] is not None:
+                h["rx"].append(r["rx_power_avg"])
+
+        lines.append("")
+        lines.append(f"{'Hour':<14} {'Online':>7} {'RX dBm':>8}")
+        for hour, h in hourly.items():
+            pct = 100 * h["online"] // h["samples"] if h["samples"] else 0
+            rx = f"{sum(h['rx']) / len(h['rx']):.1f}" if h["rx"] else "-"
+            lines.append(f"{hour[5:]:<14} {pct:>6}% {rx:>8}")
+
+        return "\n".join(lines)
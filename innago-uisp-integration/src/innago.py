@@ -1,13 +1,14 @@
-import requests
 from typing import Optional
 
+from .ratelimit import RateLimitedSession
+
 
 class InnagoClient:
     """Client for Innago Property Management API."""
 
     def __init__(self, api_url: str, api_key: str):
         self.api_url = api_url.rstrip("/")
-        self.session = requests.Session()
+        self.session = RateLimitedSession()
         self.session.headers.update({
             "x-api-key": api_key,
             "Content-Type": "application/json"
@@ -18,6 +19,37 @@ class InnagoClient:
         resp.raise_for_status()
         return resp.json()
 
+    def _get_paged(self, endpoint: str, params: dict = None, page_size: int = 100) -> list:
+        """Fetch every page of a listing endpoint into one list."""
+        params = dict(params or {})
+        items = []
+        page = 1
+        first_id = None
+
+        while True:
+            data = self._get(endpoint, {**params, "page": page, "pageSize": page_size})
+            if isinstance(data, dict):
+                batch = data.get("data") or data.get("items") or []
+                total_pages = data.get("totalPages")
+            else:
+                batch, total_pages = data, None
+
+            # Endpoint ignored paging and returned the full list again
+            if batch and page > 1 and batch[0].get("id") == first_id:
+                break
+            if batch and page == 1:
+                first_id = batch[0].get("id")
+
+            items.extend(batch)
+            if total_pages is not None:
+                if page >= total_pages:
+                    break
+            elif len(batch) < page_size:
+                break
+            page += 1
+
+        return items
+
     def _post(self, endpoint: str, data: dict) -> dict:
         resp = self.session.post(f"{self.api_url}{endpoint}", json=data)
         resp.raise_for_status()
@@ -48,6 +80,10 @@ class InnagoClient:
             params["status"] = status
         return self._get("/v1/leases", params)
 
+    def get_tenants(self, property_id: str) -> list:
+        """Get all tenants for a property (all pages)."""
+        return self._get_paged("/v1/tenants", {"propertyId": property_id})
+
     def get_tenants_by_lease(self, lease_id: str) -> list:
         """Get tenants for a specific lease."""
         return self._get("/v1/tenants", params={"leaseId": lease_id})
@@ -83,6 +119,10 @@ class InnagoClient:
             params["tenantId"] = tenant_id
         return self._get("/v1/invoices", params)
 
+    def get_property_invoices(self, property_id: str) -> list:
+        """Get every invoice for a property (one listing instead of one call per lease)."""
+        return self._get_paged("/v1/invoices", {"propertyId": property_id})
+
     def create_invoice(self, tenant_id: str, line_items: list) -> dict:
         """Create an invoice for a tenant."""
         return self._post("/v1/invoices", {
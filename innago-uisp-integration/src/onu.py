@@ -6,14 +6,74 @@ Provides functions to provision, activate, and suspend ONUs.
 """
 
 import csv
+import json
 import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
 from typing import Optional
 
+from .tracing import bind, trace_methods, traced
+
+try:
+    import fcntl
+except ImportError:  # Windows - only one instance can run there anyway
+    fcntl = None
+
 logger = logging.getLogger(__name__)
 
 INVENTORY_FILE = Path(__file__).parent.parent / 'onu-inventory.csv'
+CHECKPOINT_FILE = Path(__file__).parent.parent / 'provision-checkpoint.json'
+
+
+def configure_inventory(path: str | None):
+    """Use a different inventory CSV (checkpoint file lives next to it)."""
+    global INVENTORY_FILE, CHECKPOINT_FILE
+    if not path:
+        return
+    INVENTORY_FILE = Path(path)
+    CHECKPOINT_FILE = INVENTORY_FILE.parent / 'provision-checkpoint.json'
+
+
+# Serializes read-modify-write of the inventory CSV and checkpoint file between
+# threads; inventory_lock() adds a file lock so other sync instances wait too
+_inventory_lock = threading.Lock()
+
+
+@contextmanager
+def inventory_lock():
+    """Hold the inventory for a read-modify-write, across threads and processes."""
+    with _inventory_lock:
+        if fcntl is None:
+            yield
+            return
+        with open(INVENTORY_FILE.with_suffix('.lock'), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _replace_atomically(path: Path, write):
+    """Write through a temp file unique to this writer, then swap it into place."""
+    with tempfile.NamedTemporaryFile('w', dir=path.parent, prefix=f'.{path.name}.',
+                                     suffix='.tmp', newline='', delete=False) as f:
+        try:
+            write(f)
+        except BaseException:
+            f.close()
+            os.unlink(f.name)
+            raise
+    # Temp files are created 0600; keep the permissions the file already had
+    os.chmod(f.name, path.stat().st_mode & 0o777 if path.exists() else 0o644)
+    os.replace(f.name, path)
+
 
 FIELDNAMES = [
     'onu_name', 'serial_number', 'mac_address', 'property', 'unit',
@@ -21,6 +81,7 @@ FIELDNAMES = [
 ]
 
 
+@traced("csv.load_inventory")
 def load_inventory() -> list[dict]:
     """Load ONU inventory from CSV."""
     if not INVENTORY_FILE.exists():
@@ -29,12 +90,23 @@ def load_inventory() -> list[dict]:
         return list(csv.DictReader(f))
 
 
+@traced("csv.save_inventory")
 def save_inventory(rows: list[dict]):
-    """Save ONU inventory to CSV."""
-    with open(INVENTORY_FILE, 'w', newline='') as f:
+    """Save ONU inventory to CSV (atomically, so concurrent readers never see a partial file)."""
+    def write(f):
         writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
         writer.writeheader()
         writer.writerows(rows)
+    _replace_atomically(INVENTORY_FILE, write)
+
+
+def inventory_version() -> tuple | None:
+    """Changes whenever the CSV is rewritten (by this or another instance)."""
+    try:
+        stat = INVENTORY_FILE.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
 
 
 def find_onu_by_unit(property_name: str, unit: str) -> Optional[dict]:
@@ -73,18 +145,56 @@ def find_onu_by_name(onu_name: str) -> Optional[dict]:
 
 def update_onu_status(onu_name: str, status: str, uisp_id: str = None):
     """Update ONU status in inventory."""
-    inventory = load_inventory()
+    update_onu_statuses({onu_name: (status, uisp_id)})
 
-    for row in inventory:
-        if row['onu_name'] == onu_name:
+
+def update_onu_statuses(updates: dict):
+    """
+    Update several ONUs in one CSV rewrite.
+
+    updates: {onu_name: (status, uisp_id or None)}
+    """
+    with inventory_lock():
+        inventory = load_inventory()
+
+        for row in inventory:
+            if row['onu_name'] not in updates:
+                continue
+            status, uisp_id = updates[row['onu_name']]
             row['status'] = status
             if uisp_id:
                 row['uisp_id'] = uisp_id
             if status in ['suspended', 'active'] and not row['date_added']:
                 row['date_added'] = datetime.now().strftime('%Y-%m-%d')
-            break
 
-    save_inventory(inventory)
+        save_inventory(inventory)
+
+
+def index_devices_by_serial(devices: list) -> dict:
+    """Index an NMS device snapshot by lowercase serial and colon-less MAC."""
+    index = {}
+    for d in devices:
+        ident = d.get('identification', {})
+        serial = ident.get('serialNumber', '').lower()
+        mac = ident.get('mac', '').lower().replace(':', '')
+        if serial:
+            index[serial] = d
+        if mac:
+            index[mac] = d
+    return index
+
+
+def load_checkpoint() -> dict:
+    """Load per-ONU provisioning progress from the last (interrupted) run."""
+    if not CHECKPOINT_FILE.exists():
+        return {}
+    with open(CHECKPOINT_FILE, 'r') as f:
+        return json.load(f)
+
+
+def save_checkpoint(checkpoint: dict):
+    """Write provisioning progress atomically so a crash never leaves half a file."""
+    _replace_atomically(CHECKPOINT_FILE, lambda f: json.dump(checkpoint, f, indent=2))
 
 
 def generate_onu_name(property_name: str, unit: str) -> str:
@@ -113,12 +223,15 @@ def get_all_onus_status() -> list[dict]:
     } for r in inventory]
 
 
+@trace_methods("onu")
 class ONUProvisioner:
     """Handles ONU provisioning to UISP."""
 
     def __init__(self, uisp_nms_client, site_id: str):
         self.uisp = uisp_nms_client
         self.site_id = site_id
+        # Swapped for the cycle context's indexed lookup during a sync cycle
+        self.find_onu = find_onu_by_unit
 
     def provision_onu(self, onu_name: str, serial: str) -> bool:
         """
@@ -172,10 +285,122 @@ class ONUProvisioner:
 
         return results
 
+    def provision_pending_parallel(self, workers: int = 4) -> dict:
+        """
+        Provision all pending ONUs with bounded concurrency.
+
+        Serials are resolved from a single device snapshot, each ONU's progress
+        (authorized -> suspended) is checkpointed so a rerun resumes where the
+        last one stopped, and the inventory CSV is rewritten once at the end.
+        """
+        started = time.monotonic()
+        pending = get_pending_onus()
+        checkpoint = load_checkpoint()
+        results = {
+            'success': 0, 'failed': 0, 'not_found': 0, 'resumed': 0,
+            'failures': [], 'timings': {}, 'elapsed': 0.0
+        }
+
+        if not pending:
+            return results
+
+        # One device download for the whole batch
+        devices = index_devices_by_serial(self.uisp.get_devices())
+
+        jobs = []
+        for onu in pending:
+            serial = onu['serial_number'].lower().replace(':', '')
+            progress = checkpoint.get(onu['onu_name'])
+            if progress and progress.get('serial') != onu['serial_number']:
+                # Serial was corrected since the last run - start that ONU over
+                progress = None
+
+            device = devices.get(serial)
+            if not device and not progress:
+                logger.warning(f"ONU not found in UISP: {onu['serial_number']}")
+                results['not_found'] += 1
+                results['failures'].append((onu['onu_name'], 'not found in UISP'))
+                continue
+
+            if progress:
+                results['resumed'] += 1
+            else:
+                progress = {
+                    'serial': onu['serial_number'],
+                    'device_id': device.get('id'),
+                    'stage': 'found'
+                }
+                checkpoint[onu['onu_name']] = progress
+            jobs.append((onu['onu_name'], progress))
+
+        with inventory_lock():
+            save_checkpoint(checkpoint)
+
+        completed = {}
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            futures = {
+                pool.submit(bind(self._provision_from_checkpoint), name, progress, checkpoint): name
+                for name, progress in jobs
+            }
+            for future in as_completed(futures):
+                name = futures[future]
+                ok, elapsed, error = future.result()
+                results['timings'][name] = elapsed
+                if ok:
+                    results['success'] += 1
+                    completed[name] = ('suspended', checkpoint[name]['device_id'])
+                else:
+                    results['failed'] += 1
+                    results['failures'].append((name, error))
+
+        if completed:
+            update_onu_statuses(completed)
+
+        # Finished ONUs are now recorded in the CSV - only keep unfinished progress
+        with inventory_lock():
+            for name in completed:
+                checkpoint.pop(name, None)
+            if checkpoint:
+                save_checkpoint(checkpoint)
+            elif CHECKPOINT_FILE.exists():
+                CHECKPOINT_FILE.unlink()
+
+        results['elapsed'] = time.monotonic() - started
+        return results
+
+    @traced("onu.provision_stage", record=("onu_name",))
+    def _provision_from_checkpoint(self, onu_name: str, progress: dict,
+                                   checkpoint: dict) -> tuple:
+        """Run the remaining provisioning stages for one ONU. Returns (ok, seconds, error)."""
+        started = time.monotonic()
+        device_id = progress['device_id']
+
+        def advance(stage: str):
+            progress['stage'] = stage
+            with inventory_lock():
+                save_checkpoint(checkpoint)
+
+        try:
+            if progress['stage'] == 'found':
+                self.uisp.authorize_device(device_id, onu_name, self.site_id)
+                logger.info(f"Authorized as: {onu_name}")
+                advance('authorized')
+
+            if progress['stage'] == 'authorized':
+                self.uisp.suspend_device(device_id, "Awaiting tenant - Innago integration")
+                logger.info(f"Suspended {onu_name} (awaiting tenant)")
+                advance('suspended')
+
+            return True, time.monotonic() - started, None
+
+        except Exception as e:
+            logger.error(f"Failed to provision {onu_name} at stage '{progress['stage']}': {e}")
+            return False, time.monotonic() - started, str(e)
+
     def activate_onu(self, property_name: str, unit: str,
                      download_mbps: int = 500, upload_mbps: int = 500) -> bool:
         """Activate ONU for a unit with bandwidth limits (called when lease starts)."""
-        onu = find_onu_by_unit(property_name, unit)
+        onu = self.find_onu(property_name, unit)
 
         if not onu:
             logger.warning(f"No ONU found for {property_name} unit {unit}")
@@ -194,6 +419,7 @@ class ONUProvisioner:
             logger.info(f"Set QoS on {onu['onu_name']}: {download_mbps}/{upload_mbps} Mbps")
 
             update_onu_status(onu['onu_name'], 'active')
+            onu['status'] = 'active'
             logger.info(f"Activated ONU: {onu['onu_name']}")
             return True
         except Exception as e:
@@ -203,7 +429,7 @@ class ONUProvisioner:
     def set_onu_speed(self, property_name: str, unit: str,
                       download_mbps: int, upload_mbps: int) -> bool:
         """Update bandwidth limits on an ONU (for upgrades)."""
-        onu = find_onu_by_unit(property_name, unit)
+        onu = self.find_onu(property_name, unit)
 
         if not onu or not onu['uisp_id']:
             logger.warning(f"No provisioned ONU found for {property_name} unit {unit}")
@@ -219,7 +445,7 @@ class ONUProvisioner:
 
     def suspend_onu(self, property_name: str, unit: str, reason: str = "Tenant moved out") -> bool:
         """Suspend ONU for a unit (called when lease ends)."""
-        onu = find_onu_by_unit(property_name, unit)
+        onu = self.find_onu(property_name, unit)
 
         if not onu:
             logger.warning(f"No ONU found for {property_name} unit {unit}")
@@ -236,6 +462,7 @@ class ONUProvisioner:
         try:
             self.uisp.suspend_device(onu['uisp_id'], reason)
             update_onu_status(onu['onu_name'], 'suspended')
+            onu['status'] = 'suspended'
             logger.info(f"Suspended ONU: {onu['onu_name']}")
             return True
         except Exception as e:
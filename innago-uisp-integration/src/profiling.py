@@ -0,0 +1,88 @@
+"""
+Cycle Profiling
+
+Wraps a sync cycle (or a provisioning command) in cProfile and, optionally,
+tracemalloc. Each profiled run writes two files to the profile directory:
+
+  <label>-<timestamp>.prof   raw stats for snakeviz / pstats
+  <label>-<timestamp>.txt    top functions by cumulative and own time, plus
+                             the biggest allocation sites when memory is on
+
+cProfile only sees the thread that started it, so time spent inside worker
+pools shows up as waiting in the pool; use --trace-report for those.
+"""
+
+import cProfile
+import io
+import logging
+import pstats
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class CycleProfiler:
+    """Profile every Nth run of a block and write timestamped reports."""
+
+    def __init__(self, directory: str = "profiles", every: int = 1,
+                 memory: bool = False, top: int = 30):
+        self.directory = Path(directory)
+        self.every = max(1, every)
+        self.memory = memory
+        self.top = top
+        self.runs = 0
+
+    @contextmanager
+    def profile(self, label: str):
+        """Profile the block if this run is due; otherwise just run it."""
+        self.runs += 1
+        if (self.runs - 1) % self.every:
+            yield
+            return
+
+        profiler = cProfile.Profile()
+        started_tracemalloc = self.memory and not tracemalloc.is_tracing()
+        if started_tracemalloc:
+            tracemalloc.start(10)
+
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            snapshot = tracemalloc.take_snapshot() if self.memory else None
+            peak = tracemalloc.get_traced_memory()[1] if self.memory else None
+            if started_tracemalloc:
+                tracemalloc.stop()
+            try:
+                self._write(label, profiler, snapshot, peak)
+            except OSError as e:
+                logger.warning(f"Could not write profile for {label}: {e}")
+
+    def _write(self, label: str, profiler: cProfile.Profile, snapshot, peak):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        stem = self.directory / f"{label}-{datetime.now().strftime('%Y%m%d-%H%M%S')}-run{self.runs}"
+
+        profiler.dump_stats(f"{stem}.prof")
+
+        out = io.StringIO()
+        stats = pstats.Stats(profiler, stream=out).strip_dirs()
+        out.write(f"Profile: {label} (run {self.runs})\n\n")
+        out.write(f"Top {self.top} by cumulative time\n")
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top)
+        out.write(f"Top {self.top} by own time\n")
+        stats.sort_stats(pstats.SortKey.TIME).print_stats(self.top)
+
+        if snapshot is not None:
+            out.write(f"Memory: peak {peak / 1024 / 1024:.1f} MiB traced\n\n")
+            out.write(f"Top {self.top} allocation sites\n")
+            for stat in snapshot.statistics("lineno")[:self.top]:
+                frame = stat.traceback[0]
+                out.write(f"  {stat.size / 1024:>10.1f} KiB  {stat.count:>8} blocks  "
+                          f"{frame.filename}:{frame.lineno}\n")
+
+        Path(f"{stem}.txt").write_text(out.getvalue())
+        logger.info(f"Wrote profile {stem}.prof / .txt")
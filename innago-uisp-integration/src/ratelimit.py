@@ -0,0 +1,287 @@
+"""
+Per-host rate limiting for upstream APIs.
+
+Every session talking to the same host shares one RateLimiter with separate
+token buckets for reads (GET/HEAD) and writes. 429/503 responses are retried
+after their Retry-After delay and shrink the bucket's rate; successful calls
+slowly bring it back up to the configured budget. POST/PATCH are only replayed
+on 429 - a 503 from a proxy can arrive after the write was committed.
+"""
+
+import logging
+import threading
+import time
+from collections.abc import Mapping
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import requests
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+READ_METHODS = {"GET", "HEAD", "OPTIONS"}
+THROTTLE_STATUSES = {429, 503}
+# Safe to replay whatever the status; anything else is only retried on 429 (not processed)
+IDEMPOTENT_METHODS = READ_METHODS | {"PUT", "DELETE"}
+
+DEFAULT_LIMITS = {
+    "read_per_sec": 5.0,
+    "write_per_sec": 2.0,
+    "burst": 10,
+    "max_retries": 3,
+    "max_wait": 120.0,
+    # Every request gets these unless the caller passes its own timeout= (a hung
+    # UISP POST would otherwise block a forwarding worker and shard-lease renewal)
+    "connect_timeout": 10.0,
+    "read_timeout": 60.0,
+}
+
+
+class TokenBucket:
+    """Thread-safe token bucket whose rate can be lowered while throttled."""
+
+    def __init__(self, rate: float, burst: int):
+        self.base_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self) -> float:
+        """Take one token, sleeping as needed. Returns seconds waited."""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                else:
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    def throttle(self, delay: float, factor: float = 0.5):
+        """Back off: pause the bucket for `delay` and cut its rate."""
+        with self.lock:
+            self.rate = max(self.base_rate * 0.05, self.rate * factor)
+            self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+            self.tokens = 0.0
+
+    def recover(self, step: float = 0.05):
+        """Creep back toward the configured rate after a success."""
+        if self.rate < self.base_rate:
+            with self.lock:
+                self.rate = min(self.base_rate, self.rate + self.base_rate * step)
+
+
+class RateLimiter:
+    """Read and write budgets plus throttling stats for one upstream host."""
+
+    def __init__(self, host: str, read_per_sec: float, write_per_sec: float, burst: int,
+                 max_retries: int = 3, max_wait: float = 120.0,
+                 connect_timeout: float = 10.0, read_timeout: float = 60.0):
+        self.host = host
+        self.max_retries = max_retries
+        self.max_wait = max_wait
+        self.timeout = (connect_timeout, read_timeout)
+        self.read = TokenBucket(read_per_sec, burst)
+        self.write = TokenBucket(write_per_sec, max(1, burst // 2))
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            "requests": 0,
+            "throttled": 0,
+            "retries": 0,
+            "wait_seconds": 0.0,
+        }
+
+    def bucket(self, method: str) -> TokenBucket:
+        return self.read if method.upper() in READ_METHODS else self.write
+
+    def acquire(self, method: str):
+        waited = self.bucket(method).acquire()
+        with self._stats_lock:
+            self.stats["requests"] += 1
+            self.stats["wait_seconds"] += waited
+
+    def on_success(self, method: str):
+        self.bucket(method).recover()
+
+    def on_throttled(self, method: str, delay: float, retrying: bool):
+        bucket = self.bucket(method)
+        bucket.throttle(delay)
+        with self._stats_lock:
+            self.stats["throttled"] += 1
+            if retrying:
+                self.stats["retries"] += 1
+        logger.warning(
+            f"{self.host} throttled {method} - waiting {delay:.1f}s, "
+            f"rate now {bucket.rate:.2f}/s"
+        )
+
+    def get_stats(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats["wait_seconds"] = round(stats["wait_seconds"], 2)
+        stats["read_rate"] = round(self.read.rate, 2)
+        stats["write_rate"] = round(self.write.rate, 2)
+        return stats
+
+
+# Shared registry - one limiter per host for the whole process
+_limits = {}
+_limiters = {}
+_registry_lock = threading.Lock()
+
+
+def validate_rate_limits(limits) -> dict:
+    """
+    Check a `rate_limits` section: known keys only, positive numbers.
+    Returns it with numbers coerced; raises ValueError naming the bad key.
+    """
+    limits = limits or {}
+    if not isinstance(limits, Mapping):
+        raise ValueError("rate_limits must be a mapping")
+    unknown = set(limits) - {"default", "hosts"}
+    if unknown:
+        raise ValueError(f"Unknown rate_limits key(s): {', '.join(sorted(map(str, unknown)))}")
+
+    def check(where: str, settings) -> dict:
+        if not isinstance(settings or {}, Mapping):
+            raise ValueError(f"{where} must be a mapping")
+        checked = {}
+        for key, value in (settings or {}).items():
+            if key not in DEFAULT_LIMITS:
+                raise ValueError(f"Unknown setting {where}.{key} "
+                                 f"(expected one of {', '.join(DEFAULT_LIMITS)})")
+            kind = type(DEFAULT_LIMITS[key])
+            try:
+                if isinstance(value, bool):
+                    raise ValueError
+                value = kind(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"{where}.{key} must be a number, got {value!r}")
+            # max_retries may be 0 (never retry); everything else divides or sleeps by it
+            if value < 0 or (value == 0 and key != "max_retries"):
+                raise ValueError(f"{where}.{key} must be positive")
+            checked[key] = value
+        return checked
+
+    hosts = limits.get("hosts") or {}
+    if not isinstance(hosts, Mapping):
+        raise ValueError("rate_limits.hosts must be a mapping")
+    return {
+        "default": check("rate_limits.default", limits.get("default")),
+        "hosts": {host: check(f"rate_limits.hosts.{host}", settings) for host, settings in hosts.items()},
+    }
+
+
+def configure_rate_limits(limits: dict):
+    """
+    Set budgets from the `rate_limits` config section.
+
+    limits: {"default": {...}, "hosts": {"10.8.10.10": {...}}}
+    Raises ValueError for unknown keys or non-positive values.
+    """
+    global _limits
+    limits = validate_rate_limits(limits)
+    with _registry_lock:
+        _limits = limits or {}
+        _limiters.clear()
+
+
+def get_limiter(host: str) -> RateLimiter:
+    """Get (or create) the shared limiter for a host."""
+    with _registry_lock:
+        if host not in _limiters:
+            settings = dict(DEFAULT_LIMITS)
+            settings.update(_limits.get("default") or {})
+            settings.update((_limits.get("hosts") or {}).get(host) or {})
+            _limiters[host] = RateLimiter(host, **settings)
+        return _limiters[host]
+
+
+def get_all_stats() -> dict:
+    """Throttling stats for every host seen so far."""
+    with _registry_lock:
+        limiters = list(_limiters.values())
+    return {limiter.host: limiter.get_stats() for limiter in limiters}
+
+
+def parse_retry_after(value: str | None, default: float) -> float:
+    """Retry-After is either delta-seconds or an HTTP date."""
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+        return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return default
+
+
+def may_have_landed(error: Exception) -> bool:
+    """
+    Whether a failed request may still have been processed upstream - a read
+    timeout, or the connection dropping after the request went out. Failures
+    to connect (DNS, refused, TLS, connect timeout) never sent anything.
+    """
+    if isinstance(error, (requests.exceptions.ConnectTimeout, requests.exceptions.SSLError,
+                          requests.exceptions.ProxyError)):
+        return False
+    if isinstance(error, requests.exceptions.Timeout):
+        return True
+    if isinstance(error, requests.exceptions.ConnectionError):
+        reason = error.args[0] if error.args else None
+        reason = getattr(reason, "reason", reason)  # unwrap urllib3's MaxRetryError
+        return not isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+    return False
+
+
+class RateLimitedSession(requests.Session):
+    """requests.Session that goes through the shared per-host limiter."""
+
+    def request(self, method, url, *args, **kwargs):
+        parts = urlsplit(url)
+        limiter = get_limiter(parts.netloc)
+        kwargs.setdefault("timeout", limiter.timeout)
+
+        # Query strings are left out of the trace - they can carry filters with tenant data
+        with span(f"http {method.upper()}", **{"http.method": method.upper(),
+                                               "http.host": parts.netloc,
+                                               "http.path": parts.path}) as s:
+            for attempt in range(limiter.max_retries + 1):
+                limiter.acquire(method)
+                resp = super().request(method, url, *args, **kwargs)
+                s.set_attribute("http.status_code", resp.status_code)
+
+                if resp.status_code not in THROTTLE_STATUSES:
+                    limiter.on_success(method)
+                    return resp
+
+                s.set_attribute("http.retries", attempt + 1)
+                replayable = resp.status_code == 429 or method.upper() in IDEMPOTENT_METHODS
+                retrying = replayable and attempt < limiter.max_retries
+                delay = parse_retry_after(resp.headers.get("Retry-After"), default=2.0 ** attempt)
+                limiter.on_throttled(method, min(delay, limiter.max_wait), retrying)
+                if not retrying:
+                    return resp
+                resp.close()
+
+            return resp
@@ -0,0 +1,111 @@
+"""
+Work Partitioning Across Sync Instances
+
+Several sync daemons can share one SQLite database (same box, or hosts on a
+shared volume) and split the units between them:
+
+- Units hash to a fixed number of shards (stable - a unit never changes shard)
+- Shards are assigned to the live instances on a consistent-hash ring, so an
+  instance joining or leaving only moves ~1/N of the shards
+- An instance only works a shard while it holds that shard's lease in
+  `shard_leases`; leases are renewed every cycle (and between phases) and expire
+  on their own if the instance dies, after which the ring hands them to the
+  survivors
+
+Site-wide jobs (ONU health collection) are keyed the same way, so exactly one
+instance runs them.
+"""
+
+import bisect
+import hashlib
+import logging
+import os
+import socket
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+
+def shard_for(key: str, shards: int) -> int:
+    """Stable shard for a unit number (or any work key)."""
+    return _hash(str(key)) % shards
+
+
+class HashRing:
+    """Consistent-hash ring with virtual nodes."""
+
+    def __init__(self, members: list, vnodes: int = 64):
+        self.members = sorted(members)
+        self._ring = sorted(
+            (_hash(f"{member}#{i}"), member)
+            for member in self.members
+            for i in range(vnodes)
+        )
+        self._points = [point for point, _ in self._ring]
+
+    def owner(self, key: str) -> str | None:
+        if not self._ring:
+            return None
+        index = bisect.bisect(self._points, _hash(key)) % len(self._ring)
+        return self._ring[index][1]
+
+
+class ShardCoordinator:
+    """Heartbeats this instance and keeps the shard leases the ring assigns it."""
+
+    def __init__(self, db, shards: int = 16, lease_seconds: float = 900,
+                 instance_id: str = None):
+        self.db = db
+        self.shards = shards
+        self.lease_seconds = lease_seconds
+        self.hostname = socket.gethostname()
+        self.instance_id = instance_id or f"{self.hostname}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.owned = set()
+        self.members = []
+
+    def heartbeat(self) -> set:
+        """
+        Refresh this instance, recompute the ring over live instances and
+        acquire/renew/release shard leases to match. Returns the shards held.
+        """
+        now = time.time()
+        self.db.heartbeat_instance(self.instance_id, self.hostname, os.getpid(), now)
+
+        live = [i["instance_id"] for i in self.db.get_live_instances(now - self.lease_seconds)]
+        if self.instance_id not in live:
+            live.append(self.instance_id)
+        ring = HashRing(live)
+        wanted = [s for s in range(self.shards) if ring.owner(f"shard-{s}") == self.instance_id]
+
+        held = set(self.db.acquire_shard_leases(self.instance_id, wanted, now, now + self.lease_seconds))
+
+        # Hand back shards the ring moved to someone else so they needn't wait out the lease
+        moved = self.owned - set(wanted)
+        if moved:
+            self.db.release_shard_leases(self.instance_id, sorted(moved))
+
+        if held != self.owned or live != self.members:
+            waiting = sorted(set(wanted) - held)
+            logger.info(
+                f"Instance {self.instance_id}: {len(live)} live instance(s), holding "
+                f"{len(held)}/{self.shards} shard(s)"
+                + (f", waiting on {waiting}" if waiting else "")
+            )
+        self.owned = held
+        self.members = live
+        return held
+
+    def owns(self, key: str) -> bool:
+        """True if this instance currently holds the shard for `key`."""
+        return shard_for(key, self.shards) in self.owned
+
+    def release_all(self):
+        """Deregister on clean shutdown so survivors pick up the shards immediately."""
+        self.db.remove_instance(self.instance_id)
+        self.owned = set()
+        logger.info(f"Instance {self.instance_id} released its shards")
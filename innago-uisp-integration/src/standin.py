@@ -0,0 +1,353 @@
+"""
+Stand-in APIs
+
+A local HTTP server that answers the Innago, UISP NMS and UISP CRM endpoints
+the integration uses, backed by a SyntheticPortfolio. Point config at it:
+
+    innago.api_url: http://127.0.0.1:8765/innago
+    uisp.host:      127.0.0.1:8765
+
+Every request is counted per route (IDs collapsed to {id}) so a scale test can
+report how many upstream calls a cycle made. Device changes (PATCHes, churn)
+are pushed to websocket clients on /nms/ws as {"type": "device", "data": ...}.
+Admin routes:
+
+    GET  /_stats            request counts since the last reset
+    POST /_stats/reset
+    POST /_advance          {"new_month": false} - churn the portfolio one cycle
+"""
+
+import base64
+import hashlib
+import json
+import logging
+import re
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+logger = logging.getLogger(__name__)
+
+INNAGO_PREFIX = "/innago/v1"
+NMS_PREFIX = "/nms/api/v2.1"
+CRM_PREFIX = "/crm/api/v1.0"
+EVENTS_PATH = "/nms/ws"
+
+_WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+_WS_TEXT, _WS_CLOSE, _WS_PING, _WS_PONG = 0x1, 0x8, 0x9, 0xA
+
+_ID_SEGMENT = re.compile(r"/(?:[A-Z]\d+|dev-\d+|\d+)(?=/|$)")
+
+
+def _merge(target: dict, patch: dict):
+    for key, value in patch.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value)
+        else:
+            target[key] = value
+
+
+def _ws_frame(opcode: int, payload: bytes) -> bytes:
+    """One unmasked, unfragmented server->client frame."""
+    length = len(payload)
+    if length < 126:
+        header = bytes([0x80 | opcode, length])
+    elif length < 1 << 16:
+        header = bytes([0x80 | opcode, 126]) + length.to_bytes(2, "big")
+    else:
+        header = bytes([0x80 | opcode, 127]) + length.to_bytes(8, "big")
+    return header + payload
+
+
+def _ws_read_frame(rfile) -> tuple:
+    """(opcode, payload) of the next client frame; opcode None when the socket closed."""
+    head = rfile.read(2)
+    if len(head) < 2:
+        return None, b""
+    length = head[1] & 0x7F
+    if length == 126:
+        length = int.from_bytes(rfile.read(2), "big")
+    elif length == 127:
+        length = int.from_bytes(rfile.read(8), "big")
+    mask = rfile.read(4) if head[1] & 0x80 else b""
+    payload = rfile.read(length)
+    if mask:
+        payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+    return head[0] & 0x0F, payload
+
+
+class StandInServer(ThreadingHTTPServer):
+    """Threaded HTTP server holding the portfolio and request counters."""
+
+    daemon_threads = True
+
+    def __init__(self, portfolio, host: str = "127.0.0.1", port: int = 8765):
+        super().__init__((host, port), _Handler)
+        self.portfolio = portfolio
+        self.lock = threading.Lock()
+        self.counts = Counter()
+        self.crm_clients = [{"id": 1, "companyName": "Victorian Village Apartments",
+                             "firstName": "Property", "lastName": "Management"}]
+        self.crm_tickets = []
+        self.messages = []
+        self.events_published = 0
+        # Websocket senders; separate lock because PATCH handlers publish under self.lock
+        self._subscribers = set()
+        self._subscribers_lock = threading.Lock()
+        portfolio.listeners.append(self.publish_device)
+
+    @property
+    def address(self) -> str:
+        host, port = self.server_address[:2]
+        return f"{host}:{port}"
+
+    def start(self) -> threading.Thread:
+        """Serve in a background thread (for scale-test runs)."""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self) -> dict:
+        with self.lock:
+            return dict(self.counts)
+
+    def reset_stats(self):
+        with self.lock:
+            self.counts.clear()
+
+    def publish_device(self, device: dict):
+        """Push a device update to every websocket subscriber."""
+        record = {k: v for k, v in device.items() if k != "interfaces"}
+        frame = _ws_frame(_WS_TEXT, json.dumps({"type": "device", "action": "update", "data": record}).encode())
+        with self._subscribers_lock:
+            subscribers = list(self._subscribers)
+            self.events_published += 1
+        for send in subscribers:
+            try:
+                send(frame)
+            except OSError:
+                with self._subscribers_lock:
+                    self._subscribers.discard(send)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: StandInServer
+
+    def log_message(self, fmt, *args):
+        logger.debug(fmt % args)
+
+    def _send(self, status: int, data: bytes):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}") if length else {}
+
+    def _dispatch(self, method: str):
+        parts = urlsplit(self.path)
+        path = parts.path.rstrip("/")
+        query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+
+        if not path.startswith("/_"):
+            with self.server.lock:
+                self.server.counts[f"{method} {_ID_SEGMENT.sub('/{id}', path)}"] += 1
+
+        body = self._body() if method in ("POST", "PATCH", "PUT") else {}
+        try:
+            # Serialize under the lock too - /_advance mutates records in place
+            with self.server.lock:
+                status, result = self._route(method, path, query, body)
+                data = json.dumps(result).encode()
+        except Exception as e:
+            logger.exception(f"Stand-in error on {method} {path}")
+            status, data = 500, json.dumps({"error": str(e)}).encode()
+        self._send(status, data)
+
+    def do_GET(self):
+        if urlsplit(self.path).path == EVENTS_PATH and self.headers.get("Upgrade", "").lower() == "websocket":
+            self._websocket()
+        else:
+            self._dispatch("GET")
+
+    def _websocket(self):
+        """Hold the connection open; device updates are pushed by publish_device."""
+        key = self.headers.get("Sec-WebSocket-Key", "")
+        accept = base64.b64encode(hashlib.sha1((key + _WS_GUID).encode()).digest()).decode()
+        self.send_response(101, "Switching Protocols")
+        self.send_header("Upgrade", "websocket")
+        self.send_header("Connection", "Upgrade")
+        self.send_header("Sec-WebSocket-Accept", accept)
+        self.end_headers()
+        self.wfile.flush()
+        self.close_connection = True
+
+        write_lock = threading.Lock()
+
+        def send(frame: bytes):
+            with write_lock:
+                self.wfile.write(frame)
+                self.wfile.flush()
+
+        with self.server.lock:
+            self.server.counts[f"WS {EVENTS_PATH}"] += 1
+        with self.server._subscribers_lock:
+            self.server._subscribers.add(send)
+        try:
+            while True:
+                opcode, payload = _ws_read_frame(self.rfile)
+                if opcode is None:
+                    break
+                if opcode == _WS_PING:
+                    send(_ws_frame(_WS_PONG, payload))
+                elif opcode == _WS_CLOSE:
+                    send(_ws_frame(_WS_CLOSE, payload[:2]))
+                    break
+        except OSError:
+            pass
+        finally:
+            with self.server._subscribers_lock:
+                self.server._subscribers.discard(send)
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PATCH(self):
+        self._dispatch("PATCH")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    # -------------------------------------------------------------------------
+    # Routing
+    # -------------------------------------------------------------------------
+
+    def _route(self, method: str, path: str, query: dict, body: dict) -> tuple:
+        server = self.server
+        if path == "/_stats":
+            return 200, dict(server.counts)
+        if path == "/_stats/reset":
+            server.counts.clear()
+            return 200, {}
+        if path == "/_advance" and method == "POST":
+            changes = server.portfolio.advance(new_month=bool(body.get("new_month")))
+            return 200, {**changes, **server.portfolio.summary()}
+
+        if path.startswith(INNAGO_PREFIX):
+            return self._innago(method, path[len(INNAGO_PREFIX):], query, body)
+        if path.startswith(NMS_PREFIX):
+            return self._nms(method, path[len(NMS_PREFIX):], query, body)
+        if path.startswith(CRM_PREFIX):
+            return self._crm(method, path[len(CRM_PREFIX):], query, body)
+        return 404, {"error": f"No route for {path}"}
+
+    def _innago(self, method: str, path: str, query: dict, body: dict) -> tuple:
+        p = self.server.portfolio
+
+        if method == "GET" and path == "/leases":
+            leases = p.leases
+            if query.get("status"):
+                leases = [l for l in leases if l["status"] == query["status"]]
+            if query.get("propertyId"):
+                leases = [l for l in leases if l["propertyId"] == query["propertyId"]]
+            return 200, leases
+
+        if method == "GET" and path.startswith("/leases/"):
+            lease_id = path.split("/")[2]
+            lease = p.find("leases", lease_id)
+            return (200, lease) if lease else (404, {"error": "lease not found"})
+
+        if method == "GET" and path == "/tenants":
+            tenants = p.tenants
+            if query.get("leaseId"):
+                return 200, [t for t in tenants if t["leaseId"] == query["leaseId"]]
+            if "page" in query:
+                page, size = int(query["page"]), int(query.get("pageSize", 100))
+                total_pages = max(1, -(-len(tenants) // size))
+                return 200, {"data": tenants[(page - 1) * size:page * size], "totalPages": total_pages}
+            return 200, tenants
+
+        if method == "GET" and path.startswith("/tenants/"):
+            tenant_id = path.split("/")[2]
+            tenant = p.find("tenants", tenant_id)
+            return (200, tenant) if tenant else (404, {"error": "tenant not found"})
+
+        if method == "GET" and path == "/maintenance":
+            tickets = p.tickets
+            if query.get("status"):
+                tickets = [t for t in tickets if t["status"] == query["status"]]
+            return 200, tickets
+
+        if method == "PATCH" and path.startswith("/maintenance/"):
+            ticket = p.find("tickets", path.split("/")[2])
+            if ticket is None:
+                return 404, {"error": "ticket not found"}
+            ticket["status"] = body.get("status", ticket["status"])
+            return 200, ticket
+
+        if method == "GET" and path == "/invoices":
+            invoices = p.invoices
+            if query.get("leaseId"):
+                invoices = [i for i in invoices if i["leaseId"] == query["leaseId"]]
+            if query.get("tenantId"):
+                invoices = [i for i in invoices if i["tenantId"] == query["tenantId"]]
+            return 200, invoices
+
+        if method == "POST" and path == "/messages":
+            self.server.messages.append(body)
+            return 201, {"id": len(self.server.messages)}
+
+        return 404, {"error": f"No Innago route for {method} {path}"}
+
+    def _nms(self, method: str, path: str, query: dict, body: dict) -> tuple:
+        p = self.server.portfolio
+        devices = p.devices
+
+        if method == "GET" and path == "/devices":
+            result = devices
+            if query.get("siteId"):
+                result = [d for d in result
+                          if d["identification"].get("site", {}).get("id") == query["siteId"]]
+            if query.get("withInterfaces") != "true":
+                result = [{k: v for k, v in d.items() if k != "interfaces"} for d in result]
+            return 200, result
+
+        if path.startswith("/devices/"):
+            device_id = path.split("/")[2]
+            device = p.find("devices", device_id)
+            if device is None:
+                return 404, {"error": "device not found"}
+            if method == "PATCH":
+                _merge(device, body)
+                p.device_changed(device)
+            return 200, device
+
+        if method == "GET" and path == "/sites":
+            return 200, [{"id": p.params["site_id"], "name": "Synthetic"}]
+
+        return 404, {"error": f"No NMS route for {method} {path}"}
+
+    def _crm(self, method: str, path: str, query: dict, body: dict) -> tuple:
+        server = self.server
+
+        if method == "GET" and path == "/clients":
+            return 200, server.crm_clients
+
+        if method == "POST" and path == "/clients":
+            client = {**body, "id": len(server.crm_clients) + 1}
+            server.crm_clients.append(client)
+            return 201, client
+
+        if method == "POST" and path == "/tickets":
+            ticket = {**body, "id": len(server.crm_tickets) + 1}
+            server.crm_tickets.append(ticket)
+            return 201, ticket
+
+        if method == "POST" and path == "/invoices":
+            return 201, {**body, "id": 1}
+
+        return 404, {"error": f"No CRM route for {method} {path}"}
@@ -14,15 +14,28 @@ This integration:
 5. Generates monthly billing report for the complex
 """
 
+import json
 import logging
+import os
 import re
-from datetime import datetime
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 
 from .config import Config
 from .db import Database
 from .innago import InnagoClient
 from .uisp import UispNmsClient, UispCrmClient
-from .onu import ONUProvisioner, find_onu_by_unit
+from .onu import ONUProvisioner, configure_inventory
+from .context import CycleContext
+from .sharding import ShardCoordinator
+from .health import ONUHealthCollector
+from .classifier import Classification, INTERNET, UPGRADE
+from .ratelimit import configure_rate_limits, get_all_stats, may_have_landed
+from .delinquency import DelinquencyRun
+from .events import DeviceEventSubscriber, device_state
+from .tracing import bind, configure_tracing, span, traced
 
 logger = logging.getLogger(__name__)
 
@@ -32,38 +45,141 @@ class SyncEngine:
 
     def __init__(self, config: Config):
         self.config = config
-        self.db = Database()
+        self.db = Database(config.database_path)
+        configure_inventory(config.inventory_path)
         self.innago = InnagoClient(config.innago_api_url, config.innago_api_key)
         self.uisp_nms = UispNmsClient(config.uisp_host, config.uisp_nms_api_key)
         self.uisp_crm = UispCrmClient(config.uisp_host, config.uisp_crm_api_key)
         self.onu = ONUProvisioner(self.uisp_nms, config.uisp_parent_site_id)
+        self.health = ONUHealthCollector(self.uisp_nms, self.db, config.uisp_parent_site_id)
+        self._apply_config()
+
+        # Upstream snapshot shared by every phase of a cycle; dropped when the cycle ends
+        self.cycle = CycleContext(self.innago, self.uisp_nms, self.db,
+                                  config.innago_property_id, config.uisp_parent_site_id)
+        self.onu.find_onu = self.cycle.find_onu
+
+        # Only set when several daemons split the units between them
+        self.shards = None
+        if config.sharding_enabled:
+            self.shards = ShardCoordinator(
+                self.db,
+                shards=config.sharding_shards,
+                lease_seconds=config.sharding_lease_seconds,
+                instance_id=config.sharding.get("instance_id"),
+            )
+        # Written into ticket claims so a stuck claim can be traced to its daemon
+        self.instance_id = self.shards.instance_id if self.shards else f"{socket.gethostname()}:{os.getpid()}"
+
+        # NMS device feed (daemon mode only); reconcile_devices polls when it's down
+        self.events = None
+        self._last_full_poll = None
+        self._last_throttled = {}
+        self._polled_generation = None
+
+        # lease_id -> tenants, refreshed only when the lease diff needs it
+        self._tenants_by_lease = {}
+
+    def _apply_config(self):
+        """Push reloadable settings into long-lived helpers."""
+        configure_rate_limits(self.config.rate_limits)
+        configure_tracing(self.config.tracing)
+        self.health.bucket_minutes = self.config.health_bucket_minutes
+        self.health.retention_days = self.config.health_retention_days
+        self.health.rx_power_min = self.config.health_rx_power_min
+
+    def owns(self, key: str) -> bool:
+        """Is this instance responsible for a unit (or site-wide job key)?"""
+        return self.shards is None or self.shards.owns(key)
+
+    def live_instances(self) -> list:
+        """Instance IDs known to be running right now (this one, plus sharded peers)."""
+        peers = self.shards.members if self.shards is not None else []
+        return sorted(set(peers) | {self.instance_id})
+
+    def _renew_shards(self):
+        """Heartbeat and renew shard leases (no-op when not sharded)."""
+        if self.shards is not None:
+            self.shards.heartbeat()
+
+    def shutdown(self):
+        """Release shard leases so other instances take over immediately."""
+        if self.events is not None:
+            self.events.stop()
+        if self.shards is not None:
+            self.shards.release_all()
+
+    def start_device_events(self) -> bool:
+        """Subscribe to the NMS device feed if `events.enabled`. Returns True if started."""
+        if not self.config.events_enabled or self.events is not None:
+            return False
+        subscriber = DeviceEventSubscriber(self.config.events_url, self.config.uisp_nms_api_key, self.db)
+        if not subscriber.start():
+            return False
+        self.events = subscriber
+        return True
+
+    def stale_claim_cutoff(self) -> datetime:
+        """Ticket claims older than this were abandoned mid-forward."""
+        return datetime.now() - timedelta(minutes=self.config.ticket_claim_timeout_minutes)
 
     def run_sync(self):
         """Run a full sync cycle."""
+        if self.config.reload_if_changed():
+            self._apply_config()
+            self.db.log_event("config_reloaded", str(self.config.path))
+
         logger.info("Starting sync cycle")
-        try:
-            self.sync_leases()
-            self.check_rent_delinquency()
-            self.sync_maintenance_tickets()
-            logger.info("Sync cycle complete")
-        except Exception as e:
-            logger.error(f"Sync cycle failed: {e}")
-            self.db.log_event("sync_error", str(e))
+        with span("sync.cycle") as cycle:
+            if cycle.trace_id:
+                logger.info(f"Trace ID: {cycle.trace_id}")
+            try:
+                # Leases are renewed between phases so a long cycle can't outlive them
+                self._renew_shards()
+                self.sync_leases()
+                self._renew_shards()
+                self.check_rent_delinquency()
+                self._renew_shards()
+                self.collect_onu_health()
+                self._renew_shards()
+                self.reconcile_devices()
+                self._renew_shards()
+                self.sync_maintenance_tickets()
+                logger.info("Sync cycle complete")
+            except Exception as e:
+                cycle.status = "ERROR"
+                cycle.set_attribute("error", str(e))
+                logger.error(f"Sync cycle failed: {e}")
+                self.db.log_event("sync_error", str(e))
+            finally:
+                self.cycle.invalidate()
+                self._export_rate_limit_stats()
+
+    def _export_rate_limit_stats(self):
+        """Record cumulative per-host throttling stats for --status, only when throttling changed."""
+        stats = get_all_stats()
+        throttled = {host: (s["throttled"], s["retries"]) for host, s in stats.items() if s["throttled"]}
+        # A row per cycle would add ~288 sync_log rows a day for nothing
+        if not throttled or throttled == self._last_throttled:
+            return
+        self._last_throttled = throttled
+        self.db.log_event("rate_limit_stats", json.dumps(stats))
+        logger.warning(f"Upstream throttling so far: {({h: t for h, (t, _) in throttled.items()})}")
 
     # -------------------------------------------------------------------------
     # Lease Sync - Activate/Suspend ONUs based on occupancy
     # -------------------------------------------------------------------------
 
+    @traced("sync.leases")
     def sync_leases(self):
         """Sync lease status -> ONU status."""
         logger.info("Syncing leases...")
 
         # Get all active leases from Innago
-        active_leases = self.innago.get_leases(
-            self.config.innago_property_id,
-            status="active"
-        )
+        active_leases = self.cycle.leases
         active_units = set()
+        active_lease_ids = set()
+        to_activate = []
 
         for lease in active_leases:
             unit = self._extract_unit_number(lease)
@@ -72,38 +188,47 @@ class SyncEngine:
 
             active_units.add(unit)
             lease_id = str(lease.get("id"))
+            active_lease_ids.add(lease_id)
+
+            # Another instance holds this unit's shard
+            if not self.owns(unit):
+                continue
 
             # Check if we've seen this lease
             if not self.db.is_unit_tracked(unit):
                 # New lease - activate ONU
                 logger.info(f"New lease detected: unit {unit}")
-                self._activate_unit(unit, lease_id, lease)
+                to_activate.append((unit, lease_id, lease))
 
             elif not self.db.is_lease_active(lease_id):
                 # Lease changed (new tenant in same unit)
                 logger.info(f"New tenant in unit {unit}")
-                self._activate_unit(unit, lease_id, lease)
+                to_activate.append((unit, lease_id, lease))
+
+        # Drop tenants for leases that ended, then fetch only if the diff has new leases
+        self._tenants_by_lease = {
+            lid: t for lid, t in self._tenants_by_lease.items() if lid in active_lease_ids
+        }
+        self._resolve_tenants({lease_id for _, lease_id, _ in to_activate})
+
+        for unit, lease_id, lease in to_activate:
+            self._activate_unit(unit, lease_id, lease)
 
         # Check for ended leases (units no longer in active list)
         tracked_units = self.db.get_all_tracked_units()
         for unit_record in tracked_units:
             unit = unit_record["unit_number"]
-            if unit not in active_units and unit_record["status"] == "active":
+            if unit not in active_units and unit_record["status"] == "active" and self.owns(unit):
                 logger.info(f"Lease ended: unit {unit}")
                 self._suspend_unit(unit, "Lease ended")
 
+    @traced("unit.activate", record=("unit", "lease_id"))
     def _activate_unit(self, unit: str, lease_id: str, lease: dict):
         """Activate ONU for a unit with default package speeds."""
         property_addr = self._extract_property_address(lease)
 
         # Get tenant ID for notifications
-        tenant_id = None
-        try:
-            tenants = self.innago.get_tenants_by_lease(lease_id)
-            if tenants:
-                tenant_id = str(tenants[0].get("id"))
-        except Exception:
-            pass
+        tenant_id = self._tenant_id_for_lease(lease_id)
 
         # Get default package speeds
         default_pkg = self.config.default_package
@@ -123,8 +248,44 @@ class SyncEngine:
             status="active",
             package=default_pkg.get("name", "VIC-VIL 500")
         )
+        self.cycle.units_changed()
         self.db.log_event("unit_activated", f"Unit {unit} @ {download}/{upload} Mbps")
 
+    @traced("sync.resolve_tenants")
+    def _resolve_tenants(self, lease_ids: set):
+        """
+        Make sure tenants for `lease_ids` are in the lease -> tenants map.
+
+        One paged pass over the property's tenants covers every new lease;
+        nothing is fetched when all of them are already known.
+        """
+        missing = {lid for lid in lease_ids if lid not in self._tenants_by_lease}
+        if not missing:
+            return
+
+        try:
+            by_lease = self.cycle.tenants_by_lease(self._tenant_lease_ids)
+            for lid in missing:
+                self._tenants_by_lease[lid] = by_lease.get(lid, [])
+            logger.info(f"Resolved tenants for {len(missing)} lease(s) from {len(self.cycle.tenants)} tenant(s)")
+        except Exception as e:
+            logger.warning(f"Bulk tenant lookup failed, leases will be activated without tenant: {e}")
+
+    @staticmethod
+    def _tenant_lease_ids(tenant: dict) -> list:
+        """Lease IDs a tenant record belongs to (Innago uses a few shapes)."""
+        if tenant.get("leaseId"):
+            return [str(tenant["leaseId"])]
+        if (tenant.get("lease") or {}).get("id"):
+            return [str(tenant["lease"]["id"])]
+        return [str(lid) for lid in tenant.get("leaseIds") or []]
+
+    def _tenant_id_for_lease(self, lease_id: str) -> str | None:
+        """First tenant on a lease from the in-memory map (never fetches)."""
+        tenants = self._tenants_by_lease.get(str(lease_id)) or []
+        return str(tenants[0].get("id")) if tenants else None
+
+    @traced("unit.suspend", record=("unit",))
     def _suspend_unit(self, unit: str, reason: str):
         """Suspend ONU for a unit."""
         unit_record = self.db.get_unit(unit)
@@ -136,57 +297,58 @@ class SyncEngine:
             self.onu.suspend_onu(property_addr, unit, reason)
 
         self.db.update_unit_status(unit, "suspended")
+        self.cycle.units_changed()
         self.db.log_event("unit_suspended", f"Unit {unit}: {reason}")
 
     # -------------------------------------------------------------------------
-    # Rent Delinquency - Suspend if not paid by 5th
+    # Rent Delinquency - Suspend if not paid by the grace day
     # -------------------------------------------------------------------------
 
-    def check_rent_delinquency(self):
-        """Check rent payment status and suspend delinquent units."""
-        today = datetime.now()
+    @traced("sync.delinquency")
+    def check_rent_delinquency(self, force: bool = False) -> list:
+        """
+        Check rent payment status and suspend/reactivate units.
 
-        # Only check after the 5th of the month
-        if today.day < 5:
-            logger.info("Before grace period (5th) - skipping delinquency check")
-            return
+        Runs as a bulk, checkpointed DelinquencyRun. Returns the run reports.
+        """
+        grace_day = self.config.grace_period_day
+
+        # Only check after the grace day of the month
+        if datetime.now().day < grace_day and not force:
+            logger.info(f"Before grace period ({grace_day}th) - skipping delinquency check")
+            return []
 
         logger.info("Checking rent delinquency...")
+        if self.shards is not None and not self.shards.owned:
+            self._renew_shards()
+        return DelinquencyRun(self, workers=self.config.delinquency_workers).run()
 
-        for unit_record in self.db.get_active_units():
-            unit = unit_record["unit_number"]
-            lease_id = unit_record["lease_id"]
+    @traced("unit.lease_balance", record=("lease_id",))
+    def get_lease_balance(self, lease_id: str) -> float:
+        """Outstanding balance for a lease, from the cycle's lease/invoice listings."""
+        return self.cycle.lease_balance(lease_id)
 
-            try:
-                # Check if rent is paid in Innago
-                balance = self.innago.get_lease_balance(lease_id)
-
-                if balance > 0:
-                    # Owes rent - suspend if not already suspended for delinquency
-                    if unit_record.get("rent_status") != "delinquent":
-                        logger.info(f"Unit {unit} delinquent (balance: ${balance})")
-                        self._suspend_for_delinquency(unit, balance)
-                else:
-                    # Paid up - reactivate if was suspended for delinquency
-                    if unit_record.get("rent_status") == "delinquent":
-                        logger.info(f"Unit {unit} paid up - reactivating")
-                        self._reactivate_after_payment(unit)
-
-            except Exception as e:
-                logger.error(f"Error checking balance for unit {unit}: {e}")
+    @traced("unit.delinquency_suspend", record=("unit",))
+    def _suspend_for_delinquency(self, unit: str, balance: float) -> bool:
+        """
+        Suspend ONU for rent delinquency and notify tenant.
 
-    def _suspend_for_delinquency(self, unit: str, balance: float):
-        """Suspend ONU for rent delinquency and notify tenant."""
+        Returns False - without touching rent_status or notifying - if the ONU wasn't updated.
+        """
         unit_record = self.db.get_unit(unit)
         if not unit_record:
-            return
+            return False
 
+        onu_ok = False
         property_addr = unit_record.get("property_address")
         if property_addr:
-            self.onu.suspend_onu(property_addr, unit, f"Rent delinquent: ${balance}")
+            onu_ok = self.onu.suspend_onu(property_addr, unit, f"Rent delinquent: ${balance}")
+        if not onu_ok:
+            # Leave rent_status alone so the next plan() retries - and don't tell the tenant yet
+            return False
 
         # Notify tenant through Innago
-        tenant_id = unit_record.get("tenant_id")
+        tenant_id = unit_record.get("tenant_id") or self._tenant_id_for_lease(unit_record.get("lease_id"))
         if tenant_id:
             try:
                 self.innago.notify_internet_suspended(tenant_id, "unpaid rent")
@@ -195,20 +357,30 @@ class SyncEngine:
                 logger.warning(f"Failed to send suspension notice: {e}")
 
         self.db.update_rent_status(unit, "delinquent")
+        self.cycle.units_changed()
         self.db.log_event("delinquency_suspend", f"Unit {unit}: ${balance} owed")
+        return True
+
+    @traced("unit.delinquency_reactivate", record=("unit",))
+    def _reactivate_after_payment(self, unit: str) -> bool:
+        """
+        Reactivate ONU after rent payment and notify tenant.
 
-    def _reactivate_after_payment(self, unit: str):
-        """Reactivate ONU after rent payment and notify tenant."""
+        Returns False - without touching rent_status or notifying - if the ONU wasn't updated.
+        """
         unit_record = self.db.get_unit(unit)
         if not unit_record:
-            return
+            return False
 
+        onu_ok = False
         property_addr = unit_record.get("property_address")
         if property_addr:
-            self.onu.activate_onu(property_addr, unit)
+            onu_ok = self.onu.activate_onu(property_addr, unit)
+        if not onu_ok:
+            return False
 
         # Notify tenant through Innago
-        tenant_id = unit_record.get("tenant_id")
+        tenant_id = unit_record.get("tenant_id") or self._tenant_id_for_lease(unit_record.get("lease_id"))
         if tenant_id:
             try:
                 self.innago.notify_internet_restored(tenant_id)
@@ -217,50 +389,202 @@ class SyncEngine:
                 logger.warning(f"Failed to send restoration notice: {e}")
 
         self.db.update_rent_status(unit, "current")
+        self.cycle.units_changed()
         self.db.log_event("delinquency_cleared", f"Unit {unit} paid - reactivated")
+        return True
+
+    # -------------------------------------------------------------------------
+    # ONU Health - Bulk optical/traffic readings for ticket triage
+    # -------------------------------------------------------------------------
+
+    @traced("sync.onu_health")
+    def collect_onu_health(self):
+        """Record one bulk health reading for every ONU under the site."""
+        # Site-wide job: exactly one instance runs it
+        if not self.owns("onu-health"):
+            return
+
+        logger.info("Collecting ONU health...")
+        try:
+            self.health.collect(self.cycle.devices)
+        except Exception as e:
+            # Health history is a triage aid - never block ticket forwarding on it
+            logger.warning(f"ONU health collection failed: {e}")
+
+    # -------------------------------------------------------------------------
+    # Device State - React to ONUs that changed in UISP
+    # -------------------------------------------------------------------------
+
+    @traced("sync.devices")
+    def reconcile_devices(self):
+        """
+        Handle devices flagged in device_state since the last cycle: log outages
+        and replacements, and put back ONUs whose enabled state no longer matches
+        the unit. With the event feed up only changed devices are looked at; a
+        full poll fills device_state when the feed is down, reconnected, or
+        every `events.full_poll_minutes`.
+        """
+        feed = self.events
+        feed_live = feed is not None and feed.connected and feed.generation == self._polled_generation
+        poll_due = (self._last_full_poll is None or
+                    time.monotonic() - self._last_full_poll >= self.config.events_full_poll_minutes * 60)
+
+        if not feed_live or poll_due:
+            try:
+                # Shares the cycle's device snapshot with health collection
+                states = [s for s in (device_state(d) for d in self.cycle.devices) if s]
+                flagged = self.db.record_device_states(states, "poll")
+                self._last_full_poll = time.monotonic()
+                self._polled_generation = feed.generation if feed is not None else None
+                logger.info(f"Full device poll: {len(states)} device(s), {flagged} changed")
+            except Exception as e:
+                logger.warning(f"Device poll failed: {e}")
+
+        changed = self.db.get_changed_devices()
+        if not changed:
+            return
+
+        onus = self.cycle.onu_by_device
+        handled = {}
+        for row in changed:
+            onu = onus.get(row["device_id"])
+            if onu is not None:
+                # The unit's owner reacts; everyone else leaves the flag for it
+                if not self.owns(onu["unit"]):
+                    continue
+                try:
+                    self._reconcile_device(row, onu)
+                except Exception as e:
+                    logger.error(f"Failed to reconcile {onu['onu_name']}: {e}")
+                    continue
+            handled[row["device_id"]] = row["version"]
+
+        self.db.clear_device_changes(handled)
+        logger.info(f"Reconciled {len(handled)} changed device(s)")
+
+    def _reconcile_device(self, row: dict, onu: dict):
+        changes = set(row["changes"].split(","))
+        unit, name = onu["unit"], onu["onu_name"]
+
+        if "replaced" in changes:
+            logger.warning(f"ONU {name} reports a new serial {row['serial']} (was {row['previous_serial']})")
+            self.db.log_event("onu_replaced", f"{name} (unit {unit}): {row['previous_serial']} -> {row['serial']}")
+
+        if "online" in changes:
+            self.db.log_event("onu_online" if row["online"] else "onu_offline",
+                              f"{name} (unit {unit}): {row['status']}")
+
+        # First sighting is the baseline, not drift; only act on a transition
+        if "enabled" not in changes or row["enabled"] is None:
+            return
+
+        unit_record = self.cycle.unit_record(unit)
+        should_enable = bool(unit_record and unit_record["status"] == "active"
+                             and unit_record.get("rent_status") != "delinquent")
+        if bool(row["enabled"]) == should_enable:
+            return
+
+        state = "enabled" if row["enabled"] else "disabled"
+        logger.warning(f"ONU {name} was {state} outside the integration (unit {unit})")
+        self.db.log_event("onu_drift", f"{name} (unit {unit}) {state} in UISP, expected "
+                                       f"{'enabled' if should_enable else 'suspended'}")
+        if not self.config.events_enforce:
+            return
+
+        if should_enable:
+            package = self.config.get_package_by_name(unit_record.get("package")) or self.config.default_package
+            # activate_onu logs and returns False instead of raising - keep the flag so it's retried
+            if not self.onu.activate_onu(onu["property"], unit, package.get("download", 500),
+                                         package.get("upload", 500)):
+                raise RuntimeError(f"activate_onu failed for unit {unit}")
+        else:
+            self.uisp_nms.suspend_device(row["device_id"], "Re-suspended: enabled outside the integration")
 
     # -------------------------------------------------------------------------
     # Maintenance Tickets - Forward internet issues to UISP
     # -------------------------------------------------------------------------
 
+    @traced("sync.tickets")
     def sync_maintenance_tickets(self):
         """Forward internet-related tickets to UISP."""
         logger.info("Checking maintenance tickets...")
 
-        tickets = self.innago.get_maintenance_tickets(
-            property_id=self.config.innago_property_id,
-            status="open"
-        )
-
-        for ticket in tickets:
+        to_forward = []
+        for ticket in self.cycle.tickets:
             ticket_id = str(ticket.get("id"))
 
             # Skip if already synced
             if self.db.is_ticket_synced(ticket_id):
                 continue
 
-            # Check if internet-related
-            subject = ticket.get("subject", "").lower()
-            description = ticket.get("description", "").lower()
-            text = f"{subject} {description}"
+            # Tickets follow their unit's shard
+            if not self.owns(self._extract_unit_from_ticket(ticket) or ticket_id):
+                continue
+
+            # Upgrade requests are a hidden feature; anything ambiguous is forwarded
+            result = self._classify_ticket(ticket)
+            if result.kind == UPGRADE:
+                self._handle_upgrade_request(ticket, result)
+            elif result.kind == INTERNET:
+                to_forward.append(ticket)
+
+        if to_forward:
+            self._forward_tickets(to_forward)
 
-            # Check for upgrade request first (hidden feature)
-            if self._is_upgrade_request(text):
-                self._handle_upgrade_request(ticket)
-            elif self._is_internet_related(text):
-                self._forward_ticket_to_uisp(ticket)
+    def _forward_tickets(self, tickets: list):
+        """
+        Forward internet tickets through a worker pool. With incident grouping on,
+        a burst from one building (e.g. a fiber cut) becomes a single UISP ticket.
+        """
+        batches = [[ticket] for ticket in tickets]
+        if self.config.ticket_group_incidents:
+            batches = self._group_by_building(tickets)
 
-    def _is_internet_related(self, text: str) -> bool:
-        """Check if ticket text contains internet-related keywords."""
-        keywords = self.config.internet_keywords
-        return any(kw.lower() in text.lower() for kw in keywords)
+        workers = min(self.config.ticket_workers, len(batches))
+        logger.info(f"Forwarding {len(tickets)} ticket(s) as {len(batches)} UISP ticket(s) "
+                    f"with {workers} worker(s)")
+
+        def forward(batch):
+            # One bad ticket mustn't stop the rest of the batch list
+            try:
+                if len(batch) == 1:
+                    self._forward_ticket_to_uisp(batch[0])
+                else:
+                    self._forward_incident(batch)
+            except Exception as e:
+                ticket_ids = ", ".join(str(ticket.get("id")) for ticket in batch)
+                logger.error(f"Failed to forward ticket(s) {ticket_ids}: {e}")
 
-    def _is_upgrade_request(self, text: str) -> bool:
-        """Check if ticket is requesting a speed upgrade."""
-        upgrade_keywords = ["upgrade", "faster", "1g", "2g", "gigabit", "speed upgrade"]
-        return any(kw in text.lower() for kw in upgrade_keywords)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(bind(forward), batches))
 
-    def _handle_upgrade_request(self, ticket: dict):
+    def _group_by_building(self, tickets: list) -> list:
+        """Batch tickets by building; buildings below the threshold stay one ticket each."""
+        by_building = {}
+        batches = []
+        for ticket in tickets:
+            unit = self._extract_unit_from_ticket(ticket)
+            unit_record = self.cycle.unit_record(unit) if unit else None
+            building = unit_record.get("property_address") if unit_record else None
+            if building:
+                by_building.setdefault(building, []).append(ticket)
+            else:
+                batches.append([ticket])
+
+        for group in by_building.values():
+            if len(group) >= self.config.ticket_incident_min_tickets:
+                batches.append(group)
+            else:
+                batches.extend([ticket] for ticket in group)
+        return batches
+
+    def _classify_ticket(self, ticket: dict) -> Classification:
+        """Score a ticket with the classifier compiled from config."""
+        text = f"{ticket.get('subject', '')} {ticket.get('description', '')}"
+        return self.config.classifier.classify(text)
+
+    @traced("ticket.upgrade")
+    def _handle_upgrade_request(self, ticket: dict, result: Classification):
         """
         Handle a package upgrade request (hidden feature).
         Upgrades are available but not advertised.
@@ -272,15 +596,9 @@ class SyncEngine:
             logger.warning(f"Could not determine unit for upgrade ticket {ticket_id}")
             return
 
-        text = f"{ticket.get('subject', '')} {ticket.get('description', '')}".lower()
-
         # Determine requested package
-        new_package_name = None
-        if "2g" in text or "2000" in text or "2 gig" in text:
-            new_package_name = "VIC-VIL 2G"
-        elif "1g" in text or "1000" in text or "gigabit" in text or "1 gig" in text:
-            new_package_name = "VIC-VIL 1G"
-        else:
+        new_package_name = result.package
+        if not new_package_name:
             # Can't determine package, forward as regular ticket
             self._forward_ticket_to_uisp(ticket)
             return
@@ -305,6 +623,7 @@ class SyncEngine:
 
             # Update package in database
             self.db.update_unit_package(unit, new_package_name)
+            self.cycle.units_changed()
 
             # Log the upgrade
             addon_price = new_package.get("addon", 0)
@@ -316,28 +635,36 @@ class SyncEngine:
         except Exception as e:
             logger.error(f"Failed to process upgrade for unit {unit}: {e}")
 
+    def _ticket_onu(self, unit: str) -> tuple:
+        """(onu_name, uisp device id) for a unit, from the cycle's inventory snapshot."""
+        if unit:
+            unit_record = self.cycle.unit_record(unit)
+            property_addr = unit_record.get("property_address") if unit_record else None
+
+            if property_addr:
+                onu_info = self.cycle.find_onu(property_addr, unit)
+                if onu_info:
+                    return onu_info.get("onu_name", f"Unit {unit}"), onu_info.get("uisp_id")
+        return "Unknown", None
+
+    def _ticket_health(self, onu_id: str, ticket_id: str) -> str:
+        try:
+            return self.health.format_summary(onu_id)
+        except Exception as e:
+            logger.warning(f"Could not load ONU health for ticket {ticket_id}: {e}")
+            return "Unavailable"
+
+    @traced("ticket.forward")
     def _forward_ticket_to_uisp(self, ticket: dict):
         """Create a ticket in UISP CRM linked to the tenant's ONU."""
         ticket_id = str(ticket.get("id"))
         unit = self._extract_unit_from_ticket(ticket)
-
         subject = ticket.get("subject", "Internet Issue")
         description = ticket.get("description", "No description")
 
-        # Get ONU info for this unit
-        onu_info = None
-        onu_name = "Unknown"
-        onu_id = None
-
-        if unit:
-            unit_record = self.db.get_unit(unit)
-            property_addr = unit_record.get("property_address") if unit_record else None
-
-            if property_addr:
-                onu_info = find_onu_by_unit(property_addr, unit)
-                if onu_info:
-                    onu_name = onu_info.get("onu_name", f"Unit {unit}")
-                    onu_id = onu_info.get("uisp_id")
+        # Look everything up before claiming, so a failure here leaves no claim behind
+        onu_name, onu_id = self._ticket_onu(unit)
+        health_summary = self._ticket_health(onu_id, ticket_id)
 
         # Build ticket message with ONU details
         message = f"""Forwarded from Innago (Ticket #{ticket_id})
@@ -349,10 +676,19 @@ ONU Device ID: {onu_id or 'Not found'}
 Tenant Issue:
 {description}
 
+ONU Health (last 24h):
+{health_summary}
+
 ---
 View ONU in UISP NMS: http://{self.config.uisp_host}/nms/#/devices/{onu_id}/overview
 """
 
+        # Claim before the POST: a concurrent worker, another instance or a rerun
+        # after a crash sees the row and leaves the ticket alone
+        if not self.db.claim_ticket(ticket_id, "internet_support", self.instance_id):
+            logger.debug(f"Ticket {ticket_id} already claimed or forwarded")
+            return
+
         try:
             # Create ticket in UISP CRM
             # Use the Victorian Village master client or create ticket without client
@@ -365,14 +701,80 @@ View ONU in UISP NMS: http://{self.config.uisp_host}/nms/#/devices/{onu_id}/over
 
             logger.info(f"Created UISP ticket {uisp_ticket_id} for Innago #{ticket_id}")
 
-            self.db.save_synced_ticket(ticket_id, uisp_ticket_id, "internet_support")
-            self.db.log_event("ticket_forwarded", f"Innago #{ticket_id} -> UISP #{uisp_ticket_id} (ONU: {onu_name})")
+        except Exception as e:
+            if may_have_landed(e):
+                # The POST may have gone through - keep the claim rather than risk a duplicate
+                logger.error(f"Lost the response forwarding ticket {ticket_id}, left claimed for review: {e}")
+                return
+            # Nothing was created, so let the next cycle retry
+            self.db.release_ticket_claim(ticket_id, self.instance_id)
+            logger.error(f"Failed to forward ticket {ticket_id}: {e}")
+            return
+
+        self.db.complete_ticket_claim(ticket_id, uisp_ticket_id, "internet_support")
+        self.db.log_event("ticket_forwarded", f"Innago #{ticket_id} -> UISP #{uisp_ticket_id} (ONU: {onu_name})")
+
+    @traced("ticket.incident")
+    def _forward_incident(self, tickets: list):
+        """Create one UISP ticket for several tickets from the same building."""
+        # Look up every ONU before claiming, so a failure here leaves no claims behind
+        onus = {str(ticket.get("id")): self._ticket_onu(self._extract_unit_from_ticket(ticket))
+                for ticket in tickets}
+        unit_record = self.cycle.unit_record(self._extract_unit_from_ticket(tickets[0]))
+        building = unit_record.get("property_address", "Unknown") if unit_record else "Unknown"
+
+        claimed = []
+        for ticket in tickets:
+            ticket_id = str(ticket.get("id"))
+            if self.db.claim_ticket(ticket_id, "incident", self.instance_id):
+                claimed.append((ticket_id, ticket))
+        if not claimed:
+            return
+        if len(claimed) == 1:
+            # Everything else was taken elsewhere - forward the remainder normally
+            ticket_id, ticket = claimed[0]
+            self.db.release_ticket_claim(ticket_id, self.instance_id)
+            self._forward_ticket_to_uisp(ticket)
+            return
+
+        lines = []
+        first_onu_id = None
+        for ticket_id, ticket in claimed:
+            unit = self._extract_unit_from_ticket(ticket)
+            onu_name, onu_id = onus[ticket_id]
+            first_onu_id = first_onu_id or onu_id
+            lines.append(f"- Innago #{ticket_id}, Unit {unit or 'Unknown'}, ONU {onu_name} "
+                         f"({onu_id or 'not found'}): {ticket.get('subject', 'Internet Issue')}")
 
-            # TODO: If using UISP CRM, create actual ticket there
-            # self.uisp_crm.create_ticket(client_id, subject, message)
+        message = f"""Possible building-wide outage: {len(claimed)} internet tickets from {building} in one sync cycle
 
+{chr(10).join(lines)}
+
+---
+Each unit's ticket is also recorded against this incident in the sync database.
+"""
+        ticket_ids = [ticket_id for ticket_id, _ in claimed]
+        try:
+            uisp_ticket = self.uisp_crm.create_ticket_for_device(
+                subject=f"[Incident] {building}: {len(claimed)} units reporting internet issues",
+                message=message,
+                device_id=first_onu_id
+            )
+            uisp_ticket_id = str(uisp_ticket.get("id", ""))
         except Exception as e:
-            logger.error(f"Failed to forward ticket {ticket_id}: {e}")
+            if may_have_landed(e):
+                logger.error(f"Lost the response forwarding incident for {building}, left claimed for review: {e}")
+                return
+            for ticket_id in ticket_ids:
+                self.db.release_ticket_claim(ticket_id, self.instance_id)
+            logger.error(f"Failed to forward incident for {building} ({', '.join(ticket_ids)}): {e}")
+            return
+
+        for ticket_id in ticket_ids:
+            self.db.complete_ticket_claim(ticket_id, uisp_ticket_id, "incident")
+        logger.info(f"Created UISP incident {uisp_ticket_id} for {building} ({len(claimed)} tickets)")
+        self.db.log_event("incident_forwarded",
+                          f"{building}: Innago #{', #'.join(ticket_ids)} -> UISP #{uisp_ticket_id}")
 
     # -------------------------------------------------------------------------
     # Billing Report - Generate monthly invoice for complex
@@ -0,0 +1,355 @@
+"""
+Synthetic Portfolio
+
+Generates a consistent fake portfolio for scale testing: ONU inventory rows,
+Innago leases / tenants / invoices / maintenance tickets and the NMS device
+list, all keyed to the same units. advance() moves it forward one sync cycle
+(move-outs, move-ins, payments, new tickets; optionally a new rent month), so
+repeated cycles see realistic churn.
+
+The portfolio is served to the integration by standin.py.
+"""
+
+import csv
+import json
+import random
+from datetime import datetime
+from pathlib import Path
+
+from .onu import FIELDNAMES, generate_onu_name
+
+STREETS = ["Harper", "Elm", "Walnut", "Chestnut", "Linden", "Maple", "Poplar", "Cedar"]
+FIRST_NAMES = ["Alex", "Jordan", "Sam", "Taylor", "Morgan", "Casey", "Riley", "Jamie", "Drew", "Quinn"]
+LAST_NAMES = ["Smith", "Garcia", "Nguyen", "Patel", "Brown", "Lee", "Miller", "Davis", "Lopez", "Clark"]
+
+DEFAULT_TICKET_MIX = {"internet": 0.45, "upgrade": 0.1, "other": 0.45}
+
+TICKET_TEMPLATES = {
+    "internet": [
+        ("Internet not working", "The wifi in unit {unit} keeps dropping every few minutes"),
+        ("No internet", "Router light is red and we have no internet"),
+        ("Internet down", "Internet has been offline since this morning"),
+        ("Slow wifi", "Wifi is slow and the connection keeps dropping"),
+    ],
+    "upgrade": [
+        ("Faster internet", "Can we upgrade to the 1 gig package?"),
+        ("Upgrade request", "I would like to upgrade to 2g please"),
+    ],
+    "other": [
+        ("Leaky faucet", "Kitchen faucet has a slow leak"),
+        ("Dryer broken", "Dryer is not heating"),
+        ("Clogged drain", "Bathroom sink drain is slow"),
+        ("Toilet running", "Toilet keeps running after flushing"),
+    ],
+}
+
+UNPAID_STATUSES = ("unpaid", "partially_paid", "overdue")
+
+
+class SyntheticPortfolio:
+    """A generated portfolio plus the knobs that drive its churn."""
+
+    def __init__(self, units: int = 1000, units_per_building: int = 24, occupancy: float = 0.92,
+                 churn_rate: float = 0.02, delinquency_rate: float = 0.08,
+                 ticket_rate: float = 0.01, ticket_mix: dict = None, rent: float = 1100.0,
+                 device_flap_rate: float = 0.01, tamper_rate: float = 0.002,
+                 property_id: str = "synthetic-property", site_id: str = "synthetic-site",
+                 seed: int = 0):
+        self.params = {
+            "units": units,
+            "units_per_building": units_per_building,
+            "occupancy": occupancy,
+            "churn_rate": churn_rate,
+            "delinquency_rate": delinquency_rate,
+            "ticket_rate": ticket_rate,
+            "ticket_mix": dict(ticket_mix or DEFAULT_TICKET_MIX),
+            "device_flap_rate": device_flap_rate,
+            "tamper_rate": tamper_rate,
+            "rent": rent,
+            "property_id": property_id,
+            "site_id": site_id,
+            "seed": seed,
+        }
+        self.rng = random.Random(seed)
+        self.cycle = 0
+        self.month = 1
+        self.counters = {"lease": 0, "tenant": 0, "invoice": 0, "ticket": 0}
+
+        self.inventory = []     # ONU CSV rows
+        self.devices = []       # NMS device records
+        self.leases = []
+        self.tenants = []
+        self.invoices = []
+        self.tickets = []
+        self._indexes = {}
+        # Called with each device record that changes (the stand-in publishes them as events)
+        self.listeners = []
+
+    # -------------------------------------------------------------------------
+    # Generation
+    # -------------------------------------------------------------------------
+
+    @classmethod
+    def generate(cls, **params) -> "SyntheticPortfolio":
+        portfolio = cls(**params)
+        portfolio._build()
+        return portfolio
+
+    def _next_id(self, kind: str) -> str:
+        self.counters[kind] += 1
+        return f"{kind[0].upper()}{self.counters[kind]}"
+
+    def _build(self):
+        p = self.params
+        today = datetime.now().strftime("%Y-%m-%d")
+
+        for i in range(p["units"]):
+            building = i // p["units_per_building"]
+            address = f"{100 + 50 * (building // len(STREETS))} S {STREETS[building % len(STREETS)]}"
+            # Unit numbers are unique across the portfolio (units table is keyed by them)
+            unit = str(i + 1)
+            onu_name = generate_onu_name(address, unit)
+            serial = f"UBNT{i:08X}"
+            mac = ":".join(f"{(i >> shift) & 0xFF:02x}" for shift in (40, 32, 24, 16, 8, 0))
+            device_id = f"dev-{i:06d}"
+
+            self.inventory.append({
+                "onu_name": onu_name, "serial_number": serial, "mac_address": mac,
+                "property": address, "unit": unit, "date_added": today,
+                "status": "suspended", "uisp_id": device_id,
+            })
+            self.devices.append(self._device(device_id, onu_name, serial, mac))
+
+            if self.rng.random() < p["occupancy"]:
+                self._move_in(unit, address)
+
+        # First month of rent, with the configured share unpaid
+        self._bill_month()
+
+    def _device(self, device_id: str, name: str, serial: str, mac: str) -> dict:
+        online = self.rng.random() > 0.02
+        return {
+            "id": device_id,
+            "identification": {
+                "id": device_id, "name": name, "serialNumber": serial, "mac": mac,
+                "model": "UF-Nano-ONU", "authorized": True,
+                "site": {"id": self.params["site_id"]},
+            },
+            "enabled": False,
+            "overview": {
+                "status": "active" if online else "disconnected",
+                "signal": round(self.rng.gauss(-21.0, 2.5), 1),
+                "uptime": self.rng.randint(3600, 90 * 86400),
+            },
+            "interfaces": [{
+                "identification": {"name": "eth0"},
+                "statistics": {"rxrate": self.rng.randint(0, 200_000_000),
+                               "txrate": self.rng.randint(0, 50_000_000)},
+            }],
+        }
+
+    def _move_in(self, unit: str, address: str):
+        lease_id = self._next_id("lease")
+        tenant_id = self._next_id("tenant")
+        self.leases.append({
+            "id": lease_id,
+            "propertyId": self.params["property_id"],
+            "status": "active",
+            "unitNumber": unit,
+            "property": {"address": address},
+            "startDate": datetime.now().strftime("%Y-%m-%d"),
+            "rent": self.params["rent"],
+            "balance": 0.0,
+        })
+        self.tenants.append({
+            "id": tenant_id,
+            "leaseId": lease_id,
+            "propertyId": self.params["property_id"],
+            "firstName": self.rng.choice(FIRST_NAMES),
+            "lastName": self.rng.choice(LAST_NAMES),
+            "email": f"tenant{tenant_id.lower()}@example.com",
+        })
+
+    def _bill_month(self):
+        """Invoice every active lease; a delinquency_rate share stays unpaid."""
+        tenant_by_lease = {t["leaseId"]: t["id"] for t in self.tenants}
+        for lease in self.active_leases():
+            paid = self.rng.random() >= self.params["delinquency_rate"]
+            amount = lease["rent"]
+            self.invoices.append({
+                "id": self._next_id("invoice"),
+                "leaseId": lease["id"],
+                "tenantId": tenant_by_lease.get(lease["id"]),
+                "month": self.month,
+                "amount": amount,
+                "amountPaid": amount if paid else 0.0,
+                "status": "paid" if paid else "overdue",
+            })
+        self._refresh_balances()
+
+    def _refresh_balances(self):
+        owed = {}
+        for inv in self.invoices:
+            if inv["status"] in UNPAID_STATUSES:
+                owed[inv["leaseId"]] = owed.get(inv["leaseId"], 0.0) + inv["amount"] - inv["amountPaid"]
+        for lease in self.leases:
+            lease["balance"] = round(owed.get(lease["id"], 0.0), 2)
+
+    # -------------------------------------------------------------------------
+    # Churn
+    # -------------------------------------------------------------------------
+
+    def advance(self, new_month: bool = False) -> dict:
+        """Move the portfolio forward one cycle. Returns what changed."""
+        p = self.params
+        self.cycle += 1
+        changes = {"move_outs": 0, "move_ins": 0, "payments": 0, "new_tickets": 0, "closed_tickets": 0,
+                   "device_flaps": 0, "tampered": 0}
+
+        active = self.active_leases()
+        move_outs = self.rng.sample(active, int(len(active) * p["churn_rate"]))
+        for lease in move_outs:
+            lease["status"] = "ended"
+        changes["move_outs"] = len(move_outs)
+
+        # Refill roughly as many vacant units as moved out
+        occupied = {l["unitNumber"] for l in self.active_leases()}
+        vacated = {l["unitNumber"] for l in move_outs}
+        vacant = [r for r in self.inventory if r["unit"] not in occupied and r["unit"] not in vacated]
+        for row in self.rng.sample(vacant, min(len(vacant), len(move_outs))):
+            self._move_in(row["unit"], row["property"])
+            changes["move_ins"] += 1
+
+        # Half of the overdue invoices get paid each cycle
+        for inv in self.invoices:
+            if inv["status"] in UNPAID_STATUSES and self.rng.random() < 0.5:
+                inv["amountPaid"] = inv["amount"]
+                inv["status"] = "paid"
+                changes["payments"] += 1
+
+        if new_month:
+            self.month += 1
+            self._bill_month()
+        else:
+            self._refresh_balances()
+
+        for ticket in self.tickets:
+            if ticket["status"] == "open" and self.rng.random() < 0.3:
+                ticket["status"] = "closed"
+                changes["closed_tickets"] += 1
+        changes["new_tickets"] = self.open_tickets()
+
+        # ONUs dropping off / coming back
+        for device in self.rng.sample(self.devices, int(len(self.devices) * p["device_flap_rate"])):
+            overview = device["overview"]
+            overview["status"] = "disconnected" if overview["status"] == "active" else "active"
+            self.device_changed(device)
+            changes["device_flaps"] += 1
+
+        # A tech re-enabling suspended ONUs by hand
+        disabled = [d for d in self.devices if not d["enabled"]]
+        for device in self.rng.sample(disabled, min(len(disabled), int(len(self.devices) * p["tamper_rate"]))):
+            device["enabled"] = True
+            self.device_changed(device)
+            changes["tampered"] += 1
+
+        return changes
+
+    def device_changed(self, device: dict):
+        for listener in self.listeners:
+            listener(device)
+
+    def open_tickets(self) -> int:
+        active = self.active_leases()
+        count = sum(1 for _ in active if self.rng.random() < self.params["ticket_rate"])
+        kinds = list(self.params["ticket_mix"])
+        weights = [self.params["ticket_mix"][k] for k in kinds]
+
+        for lease in self.rng.sample(active, count):
+            kind = self.rng.choices(kinds, weights)[0]
+            subject, description = self.rng.choice(TICKET_TEMPLATES[kind])
+            self.tickets.append({
+                "id": self._next_id("ticket"),
+                "propertyId": self.params["property_id"],
+                "unitNumber": lease["unitNumber"],
+                "subject": subject,
+                "description": description.format(unit=lease["unitNumber"]),
+                "status": "open",
+                "kind": kind,
+            })
+        return count
+
+    # -------------------------------------------------------------------------
+    # Lookups
+    # -------------------------------------------------------------------------
+
+    def find(self, kind: str, record_id: str) -> dict | None:
+        """Look up a lease/tenant/device/ticket by ID (records are only ever appended)."""
+        records = getattr(self, kind)
+        count, index = self._indexes.get(kind, (None, None))
+        if count != len(records):
+            index = {r["id"]: r for r in records}
+            self._indexes[kind] = (len(records), index)
+        return index.get(record_id)
+
+    def active_leases(self) -> list:
+        return [l for l in self.leases if l["status"] == "active"]
+
+    def summary(self) -> dict:
+        active = self.active_leases()
+        return {
+            "units": len(self.inventory),
+            "active_leases": len(active),
+            "delinquent_leases": sum(1 for l in active if l["balance"] > 0),
+            "open_tickets": sum(1 for t in self.tickets if t["status"] == "open"),
+            "devices": len(self.devices),
+            "cycle": self.cycle,
+            "month": self.month,
+        }
+
+    # -------------------------------------------------------------------------
+    # Persistence
+    # -------------------------------------------------------------------------
+
+    def save(self, directory: str):
+        """Write onu-inventory.csv and portfolio.json to `directory`."""
+        out = Path(directory)
+        out.mkdir(parents=True, exist_ok=True)
+
+        with open(out / "onu-inventory.csv", "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
+            writer.writeheader()
+            writer.writerows(self.inventory)
+
+        state = {
+            "params": self.params,
+            "cycle": self.cycle,
+            "month": self.month,
+            "counters": self.counters,
+            "devices": self.devices,
+            "leases": self.leases,
+            "tenants": self.tenants,
+            "invoices": self.invoices,
+            "tickets": self.tickets,
+        }
+        with open(out / "portfolio.json", "w") as f:
+            json.dump(state, f)
+
+    @classmethod
+    def load(cls, directory: str) -> "SyntheticPortfolio":
+        src = Path(directory)
+        with open(src / "portfolio.json") as f:
+            state = json.load(f)
+
+        portfolio = cls(**state["params"])
+        # Don't replay the generator's random stream on every load
+        portfolio.rng = random.Random(f"{state['params']['seed']}-{state['cycle']}")
+        portfolio.cycle = state["cycle"]
+        portfolio.month = state["month"]
+        portfolio.counters = state["counters"]
+        for key in ("devices", "leases", "tenants", "invoices", "tickets"):
+            setattr(portfolio, key, state[key])
+
+        with open(src / "onu-inventory.csv", newline="") as f:
+            portfolio.inventory = list(csv.DictReader(f))
+        return portfolio
@@ -0,0 +1,274 @@
+"""
+Span Tracing
+
+Lightweight span-based tracing written to a rotating local JSONL file. Each
+line is one finished span in OpenTelemetry's shape (trace_id, span_id,
+parent_span_id, start/end in unix nanos, attributes, status), so the file can
+be replayed into a collector later if we ever run one.
+
+Every sync cycle is one trace. `main.py --trace-report` prints the slowest
+spans and a per-phase flame summary for a cycle.
+"""
+
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import secrets
+import time
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+# Dedicated logger so spans never end up in the service log
+_trace_logger = logging.getLogger("vicvil.trace")
+_trace_logger.propagate = False
+_trace_path = None
+
+
+def configure_tracing(settings: dict):
+    """
+    Start (or stop) writing spans, from the `tracing` config section.
+
+    settings: {"enabled": false, "path": "traces.jsonl", "max_bytes": ..., "backup_count": ...}
+    Off unless enabled; Config.tracing resolves the path next to the database.
+    """
+    global _trace_path
+    settings = settings or {}
+    for handler in list(_trace_logger.handlers):
+        _trace_logger.removeHandler(handler)
+        handler.close()
+
+    if not settings.get("enabled", False):
+        _trace_path = None
+        return
+
+    path = settings.get("path", "traces.jsonl")
+    handler = RotatingFileHandler(path, maxBytes=int(settings.get("max_bytes", 10_000_000)),
+                                  backupCount=int(settings.get("backup_count", 5)))
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    _trace_logger.addHandler(handler)
+    _trace_logger.setLevel(logging.INFO)
+    _trace_path = path
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_span_id", "start_ns",
+                 "end_ns", "attributes", "status")
+
+    def __init__(self, name: str, parent: "Span" = None, attributes: dict = None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_span_id = parent.span_id if parent else None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = dict(attributes or {})
+        self.status = "OK"
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1_000_000, 3),
+            "attributes": self.attributes,
+            "status": self.status,
+        }
+
+
+class _NoopSpan:
+    """Stand-in yielded by span() while tracing is off."""
+    trace_id = None
+
+    def set_attribute(self, key: str, value):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Time a block as a child of the current span (or as a new trace)."""
+    if not _trace_path:
+        yield _NOOP_SPAN
+        return
+    current = Span(name, _current_span.get(), attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except Exception as e:
+        current.status = "ERROR"
+        current.attributes["error"] = str(e)[:200]
+        raise
+    finally:
+        current.end_ns = time.time_ns()
+        _current_span.reset(token)
+        if _trace_path:
+            _trace_logger.info(json.dumps(current.to_dict(), default=str))
+
+
+def traced(name: str = None, record: tuple = ()):
+    """
+    Decorator: run the function inside a span.
+
+    record: argument names to copy onto the span as attributes (e.g. "unit").
+    """
+    def decorator(fn):
+        span_name = name or fn.__qualname__
+        signature = inspect.signature(fn) if record else None
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            attrs = {}
+            if signature:
+                bound = signature.bind_partial(*args, **kwargs).arguments
+                attrs = {k: bound[k] for k in record if k in bound}
+            with span(span_name, **attrs):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def trace_methods(prefix: str, skip: tuple = ()):
+    """
+    Class decorator: trace every public method as '<prefix>.<method>'.
+
+    skip: methods called once per row in a loop - a span each would cost more
+    than the call and bury the cycle's real timings.
+    """
+    def decorator(cls):
+        for attr, value in list(vars(cls).items()):
+            if attr.startswith("_") or attr in skip or not inspect.isfunction(value):
+                continue
+            setattr(cls, attr, traced(f"{prefix}.{attr}")(value))
+        return cls
+    return decorator
+
+
+def bind(fn):
+    """
+    Carry the caller's current span into worker threads.
+
+    Threads start with an empty context, so wrap functions handed to a pool.
+    """
+    parent = _current_span.get()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        token = _current_span.set(parent)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current_span.reset(token)
+    return wrapper
+
+
+# -----------------------------------------------------------------------------
+# Reporting
+# -----------------------------------------------------------------------------
+
+def load_spans(path: str) -> list:
+    """Read spans from the JSONL file and its rotated backups (oldest first)."""
+    base = Path(path)
+    # RotatingFileHandler keeps path.1 (newest) .. path.N (oldest)
+    backups = [p for p in base.parent.glob(base.name + ".*") if p.suffix[1:].isdigit()]
+    files = sorted(backups, key=lambda p: int(p.suffix[1:]), reverse=True) + [base]
+
+    spans = []
+    for file in files:
+        if not file.exists():
+            continue
+        with open(file) as f:
+            for line in f:
+                try:
+                    spans.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+    return spans
+
+
+def _flame_lines(spans: list) -> list:
+    """Aggregate spans by call path: [(depth, name, count, total_ms, self_ms)]."""
+    by_id = {s["span_id"]: s for s in spans}
+    children = {}
+    for s in spans:
+        children.setdefault(s.get("parent_span_id"), []).append(s)
+
+    totals = {}   # path -> [count, total_ms, child_ms]
+    order = []
+
+    def walk(s, path):
+        key = path + (s["name"],)
+        if key not in totals:
+            totals[key] = [0, 0.0, 0.0]
+            order.append(key)
+        totals[key][0] += 1
+        totals[key][1] += s["duration_ms"]
+        for child in children.get(s["span_id"], []):
+            totals[key][2] += child["duration_ms"]
+            walk(child, key)
+
+    roots = [s for s in spans if s.get("parent_span_id") not in by_id]
+    for root in sorted(roots, key=lambda s: s["start_time_unix_nano"]):
+        walk(root, ())
+
+    return [(len(key) - 1, key[-1], c, total, max(0.0, total - child))
+            for key in order for c, total, child in [totals[key]]]
+
+
+def format_report(spans: list, trace_id: str = None, top: int = 15) -> str:
+    """Slowest spans plus a flame summary for one cycle (latest by default)."""
+    cycles = [s for s in spans if s["name"] == "sync.cycle"]
+    if trace_id:
+        matches = [s for s in spans if s["trace_id"].startswith(trace_id)]
+        if not matches:
+            return f"No spans found for trace {trace_id}"
+        trace_id = matches[0]["trace_id"]
+    elif cycles:
+        trace_id = max(cycles, key=lambda s: s["start_time_unix_nano"])["trace_id"]
+    elif spans:
+        trace_id = spans[-1]["trace_id"]
+    else:
+        return "No spans recorded yet."
+
+    trace = [s for s in spans if s["trace_id"] == trace_id]
+    root = min(trace, key=lambda s: s["start_time_unix_nano"])
+    started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(root["start_time_unix_nano"] / 1e9))
+    wall = (max(s["end_time_unix_nano"] for s in trace) - root["start_time_unix_nano"]) / 1e6
+    errors = sum(1 for s in trace if s["status"] == "ERROR")
+
+    lines = [
+        f"Trace {trace_id} - {root['name']} @ {started}",
+        f"{len(trace)} spans, {wall:,.1f} ms wall, {errors} error(s)",
+        "",
+        f"Slowest {top} spans:",
+    ]
+    for s in sorted(trace, key=lambda s: s["duration_ms"], reverse=True)[:top]:
+        attrs = " ".join(f"{k}={v}" for k, v in s["attributes"].items() if k != "error")
+        flag = " [ERROR]" if s["status"] == "ERROR" else ""
+        lines.append(f"  {s['duration_ms']:>10,.1f} ms  {s['name']:<34} {attrs}{flag}")
+
+    lines += ["", "Flame summary (total / self):"]
+    for depth, name, count, total, self_ms in _flame_lines(trace):
+        label = f"{'  ' * depth}{name}"
+        lines.append(f"  {label:<44} {count:>5} x {total:>10,.1f} ms  (self {self_ms:,.1f})")
+
+    other_cycles = sorted(cycles, key=lambda s: s["start_time_unix_nano"], reverse=True)[:5]
+    if len(other_cycles) > 1:
+        lines += ["", "Recent cycles:"]
+        for c in other_cycles:
+            when = time.strftime("%m-%d %H:%M:%S", time.localtime(c["start_time_unix_nano"] / 1e9))
+            lines.append(f"  {c['trace_id'][:12]}  {when}  {c['duration_ms']:>10,.1f} ms")
+
+    return "\n".join(lines)
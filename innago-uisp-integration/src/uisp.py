@@ -1,5 +1,53 @@
-import requests
-from typing import Optional
+import threading
+from typing import Callable, Iterator, Optional
+
+import ijson
+
+from .ratelimit import RateLimitedSession
+
+
+def _stream_items(resp, predicate: Callable = None, fields: tuple = None) -> Iterator[dict]:
+    """
+    Incrementally parse a JSON array response, yielding matching records.
+
+    Only one record is materialized at a time, so a listing of thousands of
+    devices never sits in memory as a whole.
+    """
+    resp.raw.decode_content = True
+    for item in ijson.items(resp.raw, "item", use_float=True):
+        if predicate is not None and not predicate(item):
+            continue
+        if fields:
+            item = {k: item[k] for k in fields if k in item}
+        yield item
+
+
+# Predicates for streamed listings
+def is_onu_device(device: dict) -> bool:
+    """True for ONU/ONT (fiber CPE) devices."""
+    model = device.get("identification", {}).get("model", "").lower()
+    return "onu" in model or "ont" in model or "fiber" in model
+
+
+def serial_matches(serial: str) -> Callable:
+    """Match a device by serial number or MAC (case/colon-insensitive)."""
+    wanted = serial.lower().replace(":", "")
+
+    def predicate(device: dict) -> bool:
+        ident = device.get("identification", {})
+        return wanted in (
+            ident.get("serialNumber", "").lower(),
+            ident.get("mac", "").lower().replace(":", ""),
+        )
+    return predicate
+
+
+def company_name_contains(name: str) -> Callable:
+    """Match a CRM client whose company or contact name contains `name`."""
+    def predicate(client: dict) -> bool:
+        full_name = f"{client.get('firstName', '')} {client.get('lastName', '')}"
+        return name in (client.get("companyName") or "") or name in full_name
+    return predicate
 
 
 class UispCrmClient:
@@ -7,7 +55,10 @@ class UispCrmClient:
 
     def __init__(self, host: str, api_key: str):
         self.base_url = f"http://{host}/crm/api/v1.0"
-        self.session = requests.Session()
+        self._vic_vil_client_id = None
+        # Ticket workers share this client; only one may create the master client
+        self._client_lock = threading.Lock()
+        self.session = RateLimitedSession()
         self.session.headers.update({
             "X-Auth-App-Key": api_key,
             "Content-Type": "application/json"
@@ -28,11 +79,25 @@ class UispCrmClient:
         resp.raise_for_status()
         return resp.json()
 
+    def _iter(self, endpoint: str, params: dict = None, predicate: Callable = None,
+              fields: tuple = None) -> Iterator[dict]:
+        with self.session.get(f"{self.base_url}{endpoint}", params=params, stream=True) as resp:
+            resp.raise_for_status()
+            yield from _stream_items(resp, predicate, fields)
+
     # Clients
     def get_clients(self) -> list:
         """Get all clients."""
         return self._get("/clients")
 
+    def iter_clients(self, predicate: Callable = None, fields: tuple = None) -> Iterator[dict]:
+        """Stream clients, yielding only those matching `predicate`."""
+        return self._iter("/clients", predicate=predicate, fields=fields)
+
+    def find_client(self, predicate: Callable) -> Optional[dict]:
+        """Return the first client matching `predicate` (stops reading early)."""
+        return next(self.iter_clients(predicate), None)
+
     def get_client(self, client_id: str) -> dict:
         """Get a specific client."""
         return self._get(f"/clients/{client_id}")
@@ -123,14 +188,19 @@ class UispCrmClient:
         return self._post("/tickets", ticket_data)
 
     def _get_vic_vil_client_id(self) -> int:
-        """Get or create the Victorian Village master client for tickets."""
+        """Get or create the Victorian Village master client for tickets (looked up once)."""
+        if self._vic_vil_client_id is not None:
+            return self._vic_vil_client_id
+        with self._client_lock:
+            if self._vic_vil_client_id is None:
+                self._vic_vil_client_id = self._find_or_create_vic_vil_client()
+        return self._vic_vil_client_id
+
+    def _find_or_create_vic_vil_client(self) -> int:
         # Search for existing client
-        clients = self._get("/clients")
-        for client in clients:
-            if "Victorian Village" in client.get("companyName", ""):
-                return int(client.get("id"))
-            if "Victorian Village" in f"{client.get('firstName', '')} {client.get('lastName', '')}":
-                return int(client.get("id"))
+        client = self.find_client(company_name_contains("Victorian Village"))
+        if client:
+            return int(client.get("id"))
 
         # Create if not found
         new_client = self._post("/clients", {
@@ -150,10 +220,9 @@ class UispCrmClient:
         This client gets invoices and can access the UISP portal.
         """
         # Search for existing
-        clients = self._get("/clients")
-        for client in clients:
-            if client.get("companyName") == company_name:
-                return client
+        client = self.find_client(lambda c: c.get("companyName") == company_name)
+        if client:
+            return client
 
         # Create new billing client
         first_name = "Property"
@@ -228,7 +297,7 @@ class UispNmsClient:
 
     def __init__(self, host: str, api_key: str):
         self.base_url = f"http://{host}/nms/api/v2.1"
-        self.session = requests.Session()
+        self.session = RateLimitedSession()
         self.session.headers.update({
             "x-auth-token": api_key,
             "Content-Type": "application/json"
@@ -249,14 +318,30 @@ class UispNmsClient:
         resp.raise_for_status()
         return resp.json()
 
+    def _iter(self, endpoint: str, params: dict = None, predicate: Callable = None,
+              fields: tuple = None) -> Iterator[dict]:
+        with self.session.get(f"{self.base_url}{endpoint}", params=params, stream=True) as resp:
+            resp.raise_for_status()
+            yield from _stream_items(resp, predicate, fields)
+
     # Devices
-    def get_devices(self, site_id: Optional[str] = None) -> list:
-        """Get all devices, optionally filtered by site."""
+    def get_devices(self, site_id: Optional[str] = None, with_interfaces: bool = False) -> list:
+        """Get all devices, optionally filtered by site (with interface stats if requested)."""
         params = {}
         if site_id:
             params["siteId"] = site_id
+        if with_interfaces:
+            params["withInterfaces"] = "true"
         return self._get("/devices", params)
 
+    def iter_devices(self, site_id: Optional[str] = None, predicate: Callable = None,
+                     fields: tuple = None) -> Iterator[dict]:
+        """Stream devices, yielding only those matching `predicate`."""
+        params = {}
+        if site_id:
+            params["siteId"] = site_id
+        return self._iter("/devices", params, predicate, fields)
+
     def get_device(self, device_id: str) -> dict:
         """Get a specific device."""
         return self._get(f"/devices/{device_id}")
@@ -316,15 +401,7 @@ class UispNmsClient:
 
     def find_device_by_serial(self, serial: str) -> Optional[dict]:
         """Find device by serial number or MAC."""
-        devices = self.get_devices()
-        serial_lower = serial.lower().replace(':', '')
-        for d in devices:
-            ident = d.get('identification', {})
-            device_serial = ident.get('serialNumber', '').lower()
-            device_mac = ident.get('mac', '').lower().replace(':', '')
-            if serial_lower in [device_serial, device_mac]:
-                return d
-        return None
+        return next(self.iter_devices(predicate=serial_matches(serial)), None)
 
     def authorize_device(self, device_id: str, name: str, site_id: str = None) -> dict:
         """Authorize a device with a name and optionally assign to site."""
@@ -101,20 +101,8 @@ def dashboard():
         ''')
         leak_alerts = [dict(row) for row in cursor.fetchall()]
 
-        # Check for overage alerts (most recent per account)
-        cursor.execute('''
-            SELECT sl.*, a.building_name, a.unit_number, a.address
-            FROM scrape_logs sl
-            JOIN accounts a ON sl.account_id = a.id
-            WHERE sl.status = 'overage_alert'
-            AND sl.id IN (
-                SELECT MAX(id) FROM scrape_logs
-                WHERE status = 'overage_alert'
-                GROUP BY account_id
-            )
-            ORDER BY sl.created_at DESC
-        ''')
-        overage_alerts = [dict(row) for row in cursor.fetchall()]
+    # Overage alerts (most recent undismissed per account)
+    overage_alerts = db.get_active_alerts('overage')
 
     # Mark meters with leak detection
     leak_account_ids = {leak['account_id'] for leak in leak_alerts}
@@ -287,13 +275,10 @@ def dismiss_leak(log_id):
     return jsonify({'status': 'success'})
 
 
-@app.route('/api/overage/dismiss/<int:log_id>', methods=['POST'])
-def dismiss_overage(log_id):
-    """Dismiss an overage alert."""
-    with db.get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM scrape_logs WHERE id = ? AND status = ?', (log_id, 'overage_alert'))
-        conn.commit()
+@app.route('/api/overage/dismiss/<int:alert_id>', methods=['POST'])
+def dismiss_overage(alert_id):
+    """Dismiss an overage alert (it won't be re-sent for the same threshold this month)."""
+    db.dismiss_alert(alert_id, 'overage')
     return jsonify({'status': 'success'})
 
 
@@ -338,14 +323,38 @@ def api_hourly(account_id):
 
 @app.route('/api/scrape', methods=['POST'])
 def trigger_scrape():
-    """Manually trigger a scrape."""
-    from scraper import run_scrape
-    try:
-        results = run_scrape()
-        return jsonify({'status': 'success', 'results': results})
-    except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)}), 500
-
+    """
+    Queue a scrape for the scrape service and return its job ID right away.
+    If one is already queued or running, attach to it instead of starting another.
+    """
+    if not db.scrape_worker_alive():
+        # Nothing would ever pick the job up
+        return jsonify({'status': 'error', 'message': 'Scrape service not running'}), 503
+    job, attached = db.enqueue_or_attach_scrape_job('dashboard')
+    return jsonify({'status': job['status'], 'job_id': job['id'], 'attached': attached}), 202
+
+
+@app.route('/api/scrape/<int:job_id>')
+def scrape_status(job_id):
+    """Status and progress of a queued scrape."""
+    job = db.get_scrape_job(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Scrape job not found'}), 404
+    results = job['result'] or {}
+    return jsonify({
+        'job_id': job['id'],
+        'status': job['status'],
+        'requested_by': job['requested_by'],
+        'progress': {'done': job['progress_done'], 'total': job['progress_total']},
+        'created_at': job['created_at'],
+        'started_at': job['started_at'],
+        'finished_at': job['finished_at'],
+        'success': results.get('success'),
+        'failed': results.get('failed'),
+        'elapsed': results.get('elapsed'),
+        'error': job['error'],
+        'worker_alive': db.scrape_worker_alive(),
+    })
 
 if __name__ == '__main__':
     db.init_db()
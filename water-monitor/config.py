@@ -9,6 +9,52 @@ DATABASE_PATH = os.getenv("DATABASE_PATH", "water_monitor.db")
 # Scraping settings
 SCRAPE_INTERVAL_HOURS = int(os.getenv("SCRAPE_INTERVAL_HOURS", "1"))
 BASE_URL = "https://mywateradvisor2.com/"
+# Accounts scraped at once (each in its own browser context)
+SCRAPE_CONCURRENCY = int(os.getenv("SCRAPE_CONCURRENCY", "4"))
+# Minimum seconds between account logins on the same site
+SCRAPE_SITE_DELAY = float(os.getenv("SCRAPE_SITE_DELAY", "2"))
+# Saved login sessions older than this are not tried (a fresh login replaces them)
+SESSION_MAX_AGE_HOURS = float(os.getenv("SESSION_MAX_AGE_HOURS", "24"))
+
+# Requests the browser drops: resource types anywhere, and domains (trackers, map tiles).
+# XHR/fetch and first-party scripts always load; allowed domains are never blocked by domain
+SCRAPE_BLOCK_RESOURCES = os.getenv("SCRAPE_BLOCK_RESOURCES", "true").lower() == "true"
+SCRAPE_BLOCK_TYPES = [t.strip() for t in os.getenv(
+    "SCRAPE_BLOCK_TYPES", "image,media,font").split(",") if t.strip()]
+SCRAPE_BLOCK_DOMAINS = [d.strip() for d in os.getenv(
+    "SCRAPE_BLOCK_DOMAINS",
+    "google-analytics.com,googletagmanager.com,doubleclick.net,facebook.net,facebook.com,hotjar.com,"
+    "segment.io,segment.com,newrelic.com,nr-data.net,fullstory.com,clarity.ms,mixpanel.com,"
+    "tile.openstreetmap.org,tiles.mapbox.com,maps.googleapis.com,maps.gstatic.com").split(",") if d.strip()]
+SCRAPE_ALLOW_DOMAINS = [d.strip() for d in os.getenv(
+    "SCRAPE_ALLOW_DOMAINS", "mywateradvisor2.com").split(",") if d.strip()]
+
+# Browserless scraping: "auto" calls the site's JSON API directly and falls back to
+# the browser per account when that fails; "http" or "browser" force one backend.
+# On hold: stays "browser" until the API paths below are checked against a HAR captured
+# from the live SPA - until then "auto" would post every tenant's credentials to a
+# guessed login endpoint. tests/ only exercise the flow against stub_site.py
+SCRAPE_BACKEND = os.getenv("SCRAPE_BACKEND", "browser").lower()
+# API endpoints the dashboard SPA uses (paths are relative to API_BASE_URL; unverified)
+API_BASE_URL = os.getenv("API_BASE_URL", BASE_URL)
+API_LOGIN_PATH = os.getenv("API_LOGIN_PATH", "api/login")
+API_USAGE_PATHS = [p.strip() for p in os.getenv(
+    "API_USAGE_PATHS", "api/usage/summary,api/usage/hourly,api/usage/daily,api/usage/monthly").split(",") if p.strip()]
+# Accounts fetched at once over the shared connection pool
+HTTP_CONCURRENCY = int(os.getenv("HTTP_CONCURRENCY", "8"))
+# After the API flow fails for an account, use the browser for it this long before retrying
+HTTP_RETRY_HOURS = float(os.getenv("HTTP_RETRY_HOURS", "24"))
+
+# Scrape job queue: the dashboard's "Refresh" and the hourly scheduler both queue scrapes.
+# With SCRAPE_SERVICE=true the separate scrape service (manage.py scrape_service, warm Chromium)
+# drains it; otherwise manage.py run / scheduler.py drain it in a background thread
+SCRAPE_SERVICE = os.getenv("SCRAPE_SERVICE", "false").lower() == "true"
+SCRAPE_SERVICE_POLL_SECONDS = float(os.getenv("SCRAPE_SERVICE_POLL_SECONDS", "2"))
+# A worker that hasn't heartbeated for this long counts as stopped (scrape requests get a 503)
+SCRAPE_WORKER_TIMEOUT_SECONDS = float(os.getenv("SCRAPE_WORKER_TIMEOUT_SECONDS", "60"))
+# Relaunch the warm browser after this many jobs, or once Chromium's memory passes this many MB
+SCRAPE_BROWSER_MAX_JOBS = int(os.getenv("SCRAPE_BROWSER_MAX_JOBS", "24"))
+SCRAPE_BROWSER_MAX_MB = float(os.getenv("SCRAPE_BROWSER_MAX_MB", "600"))
 
 # Alert settings
 SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
@@ -1,6 +1,8 @@
+import json
+import re
 import sqlite3
-from datetime import datetime, date
-from typing import Optional
+from datetime import datetime, date, timedelta
+from typing import Optional, Tuple
 from contextlib import contextmanager
 from cryptography.fernet import Fernet
 import config
@@ -139,6 +141,87 @@ def init_db():
         except:
             pass  # Column already exists
 
+        # Saved browser session (cookies + localStorage), encrypted like the password (migration)
+        try:
+            cursor.execute('ALTER TABLE accounts ADD COLUMN session_state_encrypted TEXT')
+            cursor.execute('ALTER TABLE accounts ADD COLUMN session_saved_at TIMESTAMP')
+            conn.commit()
+        except:
+            pass  # Columns already exist
+
+        # When the browserless API flow last failed for an account (migration)
+        try:
+            cursor.execute('ALTER TABLE accounts ADD COLUMN http_failed_at TIMESTAMP')
+            conn.commit()
+        except:
+            pass  # Column already exists
+
+        # Alert levels already fired per account and period (migration), e.g. the
+        # 20% overage threshold for 2026-01. Backfilled once from the overage_alert logs
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'alert_state'")
+        if cursor.fetchone() is None:
+            cursor.execute('''
+                CREATE TABLE alert_state (
+                    account_id INTEGER NOT NULL,
+                    period TEXT NOT NULL,
+                    alert_kind TEXT NOT NULL,
+                    level INTEGER NOT NULL,
+                    fired_at TIMESTAMP NOT NULL,
+                    message TEXT,
+                    dismissed_at TIMESTAMP,
+                    PRIMARY KEY (account_id, period, alert_kind, level),
+                    FOREIGN KEY (account_id) REFERENCES accounts(id)
+                )
+            ''')
+            cursor.execute('''
+                SELECT account_id, strftime('%Y-%m', created_at) AS period, created_at, message
+                FROM scrape_logs WHERE status = 'overage_alert' AND account_id IS NOT NULL
+            ''')
+            backfill = []
+            for row in cursor.fetchall():
+                level = re.match(r'\[(\d+)%\]', row['message'] or '')
+                if level:
+                    backfill.append((row['account_id'], row['period'], int(level.group(1)),
+                                     row['created_at'], row['message']))
+            cursor.executemany('''
+                INSERT OR IGNORE INTO alert_state (account_id, period, alert_kind, level, fired_at, message)
+                VALUES (?, ?, 'overage', ?, ?, ?)
+            ''', backfill)
+            conn.commit()
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_alert_state_kind ON alert_state (alert_kind, dismissed_at, fired_at)
+        ''')
+        conn.commit()
+
+        # Scrape job queue, worked through by scrape_service.py
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS scrape_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                status TEXT NOT NULL DEFAULT 'queued',
+                requested_by TEXT,
+                backend TEXT,
+                worker TEXT,
+                progress_done INTEGER DEFAULT 0,
+                progress_total INTEGER,
+                result TEXT,
+                error TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                started_at TIMESTAMP,
+                finished_at TIMESTAMP
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_scrape_jobs_status ON scrape_jobs (status, id)')
+
+        # Workers draining the queue, so the app can tell when nothing is
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS scrape_workers (
+                worker TEXT PRIMARY KEY,
+                started_at TIMESTAMP,
+                heartbeat_at TIMESTAMP NOT NULL
+            )
+        ''')
+        conn.commit()
+
         print("Database initialized successfully")
 
 # Account management functions
@@ -179,6 +262,12 @@ def update_account(account_id: int, **kwargs):
     if 'password' in kwargs:
         updates['password_encrypted'] = encrypt_password(kwargs['password'])
 
+    # A saved session belongs to the old login; new credentials also get the API flow retried
+    if 'password' in kwargs or 'email' in updates:
+        updates['session_state_encrypted'] = None
+        updates['session_saved_at'] = None
+        updates['http_failed_at'] = None
+
     if not updates:
         return
 
@@ -193,6 +282,54 @@ def delete_account(account_id: int):
     """Soft delete an account."""
     update_account(account_id, is_active=0)
 
+# Saved login sessions
+def save_session_state(account_id: int, state: dict):
+    """Store a Playwright storage_state for an account (encrypted)."""
+    encrypted = get_cipher().encrypt(json.dumps(state).encode()).decode()
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE accounts SET session_state_encrypted = ?, session_saved_at = ?
+            WHERE id = ?
+        ''', (encrypted, datetime.now().isoformat(), account_id))
+
+def get_session_state(account: dict, max_age_hours: float) -> Optional[dict]:
+    """Saved storage_state for an account, or None if missing, too old or unreadable."""
+    encrypted = account.get('session_state_encrypted')
+    saved_at = account.get('session_saved_at')
+    if not encrypted or not saved_at:
+        return None
+    if datetime.now() - datetime.fromisoformat(saved_at) > timedelta(hours=max_age_hours):
+        return None
+    try:
+        return json.loads(get_cipher().decrypt(encrypted.encode()).decode())
+    except Exception:
+        return None  # Key rotated or corrupt - just log in again
+
+def clear_session_state(account_id: int):
+    """Forget a saved session (expired or rejected by the site)."""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE accounts SET session_state_encrypted = NULL, session_saved_at = NULL
+            WHERE id = ?
+        ''', (account_id,))
+
+def set_http_failed(account_id: int, failed: bool = True):
+    """Record (or clear) an API-flow failure; the account is scraped with the browser meanwhile."""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE accounts SET http_failed_at = ? WHERE id = ?
+        ''', (datetime.now().isoformat() if failed else None, account_id))
+
+def http_failed_recently(account: dict, retry_hours: float) -> bool:
+    """True if the API flow failed for this account within the last retry_hours."""
+    failed_at = account.get('http_failed_at')
+    if not failed_at:
+        return False
+    return datetime.now() - datetime.fromisoformat(failed_at) < timedelta(hours=retry_hours)
+
 # Reading functions
 def save_hourly_reading(account_id: int, reading_date: date, hour: int,
                         usage_gallons: float, cumulative_reading: float = None):
@@ -315,5 +452,240 @@ def log_scrape(account_id: int, status: str, message: str = ""):
             VALUES (?, ?, ?)
         ''', (account_id, status, message))
 
+# Batched scrape writes
+class ScrapeResultWriter:
+    """
+    Writes one account's scrape results on a single connection, committed
+    once on exit (rolled back if the block raises).
+
+    Hourly rows and the daily summary are compared with what's stored and only
+    new or changed values are written, so a re-scrape of the same hours is
+    nearly free. Usage:
+
+        with ScrapeResultWriter(account_id) as writer:
+            writer.save_hourly_readings(rows)
+            writer.log('success', '...')
+    """
+
+    def __init__(self, account_id: int):
+        self.account_id = account_id
+        self.conn = None
+        self.hourly_written = 0
+        self.hourly_unchanged = 0
+
+    def __enter__(self):
+        self.conn = sqlite3.connect(config.DATABASE_PATH)
+        self.conn.row_factory = sqlite3.Row
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.conn.commit()
+            else:
+                self.conn.rollback()
+        finally:
+            self.conn.close()
+
+    def save_hourly_readings(self, rows: list):
+        """rows: [{'date', 'hour', 'usage'}, ...] - written with one executemany."""
+        rows = [(str(r['date']), r['hour'], r['usage']) for r in rows]
+        if not rows:
+            return
+        dates = sorted({d for d, _, _ in rows})
+        placeholders = ', '.join('?' * len(dates))
+        stored = {(r['reading_date'], r['hour']): r['usage_gallons'] for r in self.conn.execute(f'''
+            SELECT reading_date, hour, usage_gallons FROM hourly_readings
+            WHERE account_id = ? AND reading_date IN ({placeholders})
+        ''', (self.account_id, *dates))}
+
+        changed = [(self.account_id, d, h, u) for d, h, u in rows
+                   if (d, h) not in stored or stored[(d, h)] != u]
+        self.conn.executemany('''
+            INSERT INTO hourly_readings (account_id, reading_date, hour, usage_gallons)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(account_id, reading_date, hour) DO UPDATE SET usage_gallons = excluded.usage_gallons
+        ''', changed)
+        self.hourly_written += len(changed)
+        self.hourly_unchanged += len(rows) - len(changed)
+
+    def save_daily_summary(self, reading_date: date, total_usage: float):
+        row = self.conn.execute('''
+            SELECT total_usage_gallons FROM daily_summaries WHERE account_id = ? AND reading_date = ?
+        ''', (self.account_id, str(reading_date))).fetchone()
+        if row is not None and row[0] == total_usage:
+            return
+        self.conn.execute('''
+            INSERT INTO daily_summaries (account_id, reading_date, total_usage_gallons)
+            VALUES (?, ?, ?)
+            ON CONFLICT(account_id, reading_date) DO UPDATE SET total_usage_gallons = excluded.total_usage_gallons
+        ''', (self.account_id, str(reading_date), total_usage))
+
+    def update_account(self, **fields):
+        """Scrape-owned account fields (last_scraped, monthly_usage, avg_12mo)."""
+        fields = {k: v for k, v in fields.items() if k in ('last_scraped', 'monthly_usage', 'avg_12mo')}
+        if fields:
+            set_clause = ', '.join(f'{k} = ?' for k in fields)
+            self.conn.execute(f'UPDATE accounts SET {set_clause} WHERE id = ?',
+                              (*fields.values(), self.account_id))
+
+    def log(self, status: str, message: str = ""):
+        self.conn.execute('''
+            INSERT INTO scrape_logs (account_id, status, message)
+            VALUES (?, ?, ?)
+        ''', (self.account_id, status, message))
+
+    def fired_levels(self, alert_kind: str, period: str) -> set:
+        """Levels of `alert_kind` already fired for this account in `period` (e.g. '2026-01')."""
+        return {row[0] for row in self.conn.execute('''
+            SELECT level FROM alert_state WHERE account_id = ? AND period = ? AND alert_kind = ?
+        ''', (self.account_id, period, alert_kind))}
+
+    def record_alert(self, alert_kind: str, period: str, level: int, message: str) -> bool:
+        """Mark a level as fired. False if it already was."""
+        cursor = self.conn.execute('''
+            INSERT OR IGNORE INTO alert_state (account_id, period, alert_kind, level, fired_at, message)
+            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP, ?)
+        ''', (self.account_id, period, alert_kind, level, message))
+        return cursor.rowcount == 1
+
+# Alert state
+def get_active_alerts(alert_kind: str) -> list:
+    """Most recent undismissed alert of a kind per account, with the account's address fields."""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT s.rowid AS id, s.account_id, s.period, s.level, s.message, s.fired_at AS created_at,
+                   a.building_name, a.unit_number, a.address
+            FROM alert_state s
+            JOIN accounts a ON s.account_id = a.id
+            WHERE s.alert_kind = ? AND s.dismissed_at IS NULL
+            AND s.fired_at = (
+                SELECT MAX(fired_at) FROM alert_state
+                WHERE account_id = s.account_id AND alert_kind = s.alert_kind AND dismissed_at IS NULL
+            )
+            ORDER BY s.fired_at DESC
+        ''', (alert_kind,))
+        return [dict(row) for row in cursor.fetchall()]
+
+def dismiss_alert(alert_id: int, alert_kind: str):
+    """Hide an alert from the dashboard; its level stays fired so it isn't re-sent this period."""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE alert_state SET dismissed_at = ? WHERE rowid = ? AND alert_kind = ?
+        ''', (datetime.now().isoformat(), alert_id, alert_kind))
+
+# Scrape jobs
+def _scrape_job(row) -> Optional[dict]:
+    if row is None:
+        return None
+    job = dict(row)
+    job['result'] = json.loads(job['result']) if job['result'] else None
+    return job
+
+def _worker_cutoff() -> str:
+    return (datetime.now() - timedelta(seconds=config.SCRAPE_WORKER_TIMEOUT_SECONDS)).isoformat()
+
+def _requeue_orphaned_scrape_jobs(cursor) -> int:
+    # Running jobs whose worker stopped heartbeating go back in the queue
+    cursor.execute('''
+        UPDATE scrape_jobs SET status = 'queued', worker = NULL, started_at = NULL
+        WHERE status = 'running' AND worker NOT IN (
+            SELECT worker FROM scrape_workers WHERE heartbeat_at > ?
+        )
+    ''', (_worker_cutoff(),))
+    return cursor.rowcount
+
+def enqueue_or_attach_scrape_job(requested_by: str, backend: str = None) -> Tuple[dict, bool]:
+    """
+    Single-flight enqueue: if a scrape is already queued or running, return
+    that job instead of adding another. Returns (job, attached).
+    """
+    with get_db() as conn:
+        cursor = conn.cursor()
+        # Held write lock, so two simultaneous requests can't both see an empty queue
+        cursor.execute('BEGIN IMMEDIATE')
+        _requeue_orphaned_scrape_jobs(cursor)
+        cursor.execute('''
+            SELECT * FROM scrape_jobs WHERE status IN ('queued', 'running') ORDER BY id LIMIT 1
+        ''')
+        row = cursor.fetchone()
+        if row is not None:
+            return _scrape_job(row), True
+        cursor.execute('''
+            INSERT INTO scrape_jobs (requested_by, backend) VALUES (?, ?)
+        ''', (requested_by, backend))
+        cursor.execute('SELECT * FROM scrape_jobs WHERE id = ?', (cursor.lastrowid,))
+        return _scrape_job(cursor.fetchone()), False
+
+def claim_scrape_job(worker: str) -> Optional[dict]:
+    """Take the oldest queued job (marks it running). None if the queue is empty."""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute('''
+            SELECT id FROM scrape_jobs WHERE status = 'queued' ORDER BY id LIMIT 1
+        ''')
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        cursor.execute('''
+            UPDATE scrape_jobs SET status = 'running', worker = ?, started_at = ?
+            WHERE id = ?
+        ''', (worker, datetime.now().isoformat(), row['id']))
+        cursor.execute('SELECT * FROM scrape_jobs WHERE id = ?', (row['id'],))
+        return _scrape_job(cursor.fetchone())
+
+def update_scrape_job_progress(job_id: int, done: int, total: int):
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE scrape_jobs SET progress_done = ?, progress_total = ? WHERE id = ?
+        ''', (done, total, job_id))
+
+def finish_scrape_job(job_id: int, result: dict = None, error: str = None):
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE scrape_jobs SET status = ?, result = ?, error = ?, finished_at = ?
+            WHERE id = ?
+        ''', ('failed' if error else 'done', json.dumps(result) if result is not None else None,
+              error, datetime.now().isoformat(), job_id))
+
+def get_scrape_job(job_id: int) -> Optional[dict]:
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM scrape_jobs WHERE id = ?', (job_id,))
+        return _scrape_job(cursor.fetchone())
+
+def requeue_running_scrape_jobs() -> int:
+    """Put jobs left running by a worker that died back in the queue (call at service start)."""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        return _requeue_orphaned_scrape_jobs(cursor)
+
+def scrape_worker_heartbeat(worker: str):
+    """Record that a worker is alive and draining the queue."""
+    now = datetime.now().isoformat()
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO scrape_workers (worker, started_at, heartbeat_at) VALUES (?, ?, ?)
+            ON CONFLICT(worker) DO UPDATE SET heartbeat_at = excluded.heartbeat_at
+        ''', (worker, now, now))
+
+def remove_scrape_worker(worker: str):
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM scrape_workers WHERE worker = ?', (worker,))
+
+def scrape_worker_alive() -> bool:
+    """Whether any worker has heartbeated within SCRAPE_WORKER_TIMEOUT_SECONDS."""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT 1 FROM scrape_workers WHERE heartbeat_at > ? LIMIT 1', (_worker_cutoff(),))
+        return cursor.fetchone() is not None
+
 if __name__ == "__main__":
     init_db()
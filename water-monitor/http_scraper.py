@@ -0,0 +1,149 @@
+"""
+Browserless scraper for mywateradvisor2.com
+
+Logs in and fetches the dashboard's JSON usage endpoints directly over HTTP
+instead of driving Chromium. Every account gets its own cookie jar, but all of
+them share one pooled connection transport, so the whole portfolio runs
+concurrently on a fraction of the memory a browser needs.
+
+Anything unexpected (login rejected, an endpoint moved, a payload with no
+usable numbers) raises ApiFlowError, and scraper.py hands that account to the
+browser instead.
+"""
+
+import time
+from typing import Optional
+
+import httpx
+
+import config
+import database as db
+from usage_json import UsageCapture
+
+USER_AGENT = ('Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 '
+              '(KHTML, like Gecko) Chrome/120.0 Safari/537.36')
+TOKEN_KEYS = ('access_token', 'accessToken', 'token', 'jwt', 'idToken')
+
+
+class ApiFlowError(Exception):
+    """The HTTP flow couldn't produce usage for an account."""
+
+
+def _step(timings: dict, step: str, started: float, signal: str):
+    timings[step] = {'ms': round(1000 * (time.monotonic() - started)), 'signal': signal}
+
+
+def cookies_from_state(jar: httpx.Cookies, state: dict):
+    """Load a saved storage_state's cookies into a jar."""
+    for c in state.get('cookies', []):
+        jar.set(c['name'], c['value'], domain=c.get('domain', ''), path=c.get('path', '/'))
+
+
+def state_from_cookies(jar: httpx.Cookies) -> dict:
+    """A storage_state (Playwright's format) holding the jar's cookies, so either backend can resume it."""
+    return {
+        'cookies': [{'name': c.name, 'value': c.value, 'domain': c.domain, 'path': c.path,
+                     'expires': c.expires or -1, 'httpOnly': False, 'secure': c.secure, 'sameSite': 'Lax'}
+                    for c in jar.jar],
+        'origins': [],
+    }
+
+
+class HttpScraper:
+    def __init__(self, base_url: str = None, concurrency: int = None, pacer=None):
+        self.base_url = base_url or config.API_BASE_URL
+        self.concurrency = max(1, concurrency or config.HTTP_CONCURRENCY)
+        # Spaces out logins like the browser backend (anything with an async wait())
+        self.pacer = pacer
+        self.transport: Optional[httpx.AsyncHTTPTransport] = None
+
+    async def start(self):
+        """Open the shared connection pool."""
+        self.transport = httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency),
+            retries=1,
+        )
+
+    async def stop(self):
+        if self.transport:
+            await self.transport.aclose()
+
+    def client(self, account: dict) -> httpx.AsyncClient:
+        """A client with the account's own cookie jar over the shared pool (seeded from a saved session)."""
+        cookies = httpx.Cookies()
+        session = db.get_session_state(account, config.SESSION_MAX_AGE_HOURS)
+        if session:
+            cookies_from_state(cookies, session)
+        # Never closed on its own - closing a client closes the shared transport
+        return httpx.AsyncClient(base_url=self.base_url, transport=self.transport, cookies=cookies,
+                                 headers={'User-Agent': USER_AGENT, 'Accept': 'application/json'},
+                                 timeout=20, follow_redirects=True)
+
+    async def login(self, client: httpx.AsyncClient, account: dict, timings: dict):
+        if self.pacer:
+            await self.pacer.wait()
+        started = time.monotonic()
+        password = db.decrypt_password(account['password_encrypted'])
+        response = await client.post(config.API_LOGIN_PATH, json={'email': account['email'], 'password': password})
+        _step(timings, 'login', started, str(response.status_code))
+        if response.status_code >= 400:
+            raise ApiFlowError(f'Login returned {response.status_code}')
+
+        # Token-based logins return a bearer token; cookie-based ones just set the jar
+        try:
+            body = response.json()
+        except ValueError:
+            body = {}
+        if isinstance(body, dict) and (body.get('success') is False or body.get('error')):
+            raise ApiFlowError(f"Login rejected: {body.get('error') or body.get('message') or 'success=false'}")
+        token = next((body[k] for k in TOKEN_KEYS if isinstance(body, dict) and body.get(k)), None)
+        if token:
+            client.headers['Authorization'] = f'Bearer {token}'
+
+    async def fetch_usage(self, client: httpx.AsyncClient, timings: dict) -> Optional[UsageCapture]:
+        """Fetch every usage endpoint. None if the site wants a login first."""
+        started = time.monotonic()
+        capture = UsageCapture()
+        for path in config.API_USAGE_PATHS:
+            response = await client.get(path)
+            if response.status_code in (401, 403) or 'login' in response.url.path.lower():
+                _step(timings, 'usage', started, 'logged_out')
+                return None
+            if response.status_code == 404:
+                continue  # Not every account has every view
+            if response.status_code >= 400:
+                raise ApiFlowError(f'{path} returned {response.status_code}')
+            if 'json' not in response.headers.get('content-type', ''):
+                # The SPA shell instead of data means the session isn't valid
+                _step(timings, 'usage', started, 'logged_out')
+                return None
+            capture.add(str(response.url), response.json())
+        _step(timings, 'usage', started, f'{len(capture.payloads)} payloads')
+        return capture
+
+    async def scrape_usage_data(self, account: dict, timings: dict = None) -> dict:
+        """
+        Same result dict as WaterMeterScraper.scrape_usage_data, every field
+        sourced from the API. Raises ApiFlowError when the flow breaks.
+        """
+        timings = {} if timings is None else timings
+        client = self.client(account)
+        try:
+            # Without saved cookies the first fetch would just bounce to the login
+            capture = await self.fetch_usage(client, timings) if client.cookies else None
+            if capture is None:
+                await self.login(client, account, timings)
+                capture = await self.fetch_usage(client, timings)
+                if capture is None:
+                    raise ApiFlowError('Still logged out after login')
+                db.save_session_state(account['id'], state_from_cookies(client.cookies))
+        except httpx.HTTPError as e:
+            raise ApiFlowError(f'{type(e).__name__}: {e}') from e
+
+        result = capture.result()
+        if not (result['hourly_data'] or result['monthly_total'] or result['daily_total']):
+            raise ApiFlowError(f'No usage in {len(capture.payloads)} payloads')
+        result['current_reading'] = None
+        result['sources'] = {f: 'api' for f, v in result.items() if v and f not in ('leak_detected', 'current_reading')}
+        result['payloads'] = len(capture.payloads)
+        return result
@@ -7,10 +7,12 @@ Usage:
     python manage.py add_account             - Add a new account interactively
     python manage.py import_accounts FILE    - Import accounts from CSV
     python manage.py list_accounts           - List all accounts
-    python manage.py scrape                  - Run scrape now
+    python manage.py scrape [CONCURRENCY] [auto|http|browser]
+                                             - Run scrape now (optionally N accounts at once / one backend)
     python manage.py inspect EMAIL PASSWORD  - Inspect site structure (for debugging)
     python manage.py genkey                  - Generate encryption key
-    python manage.py run                     - Run web app + scheduler
+    python manage.py run                     - Run web app + scheduler (+ scrape worker unless SCRAPE_SERVICE)
+    python manage.py scrape_service          - Run the scrape service (warm browser, job queue)
 """
 
 import sys
@@ -111,12 +113,18 @@ def cmd_list_accounts():
         print(f"{a['id']:<4} {(a['building_name'] or '-')[:18]:<20} {(a['unit_number'] or '-')[:5]:<6} {(a['address'] or '-')[:18]:<20} {(a['account_number'] or '-')[:13]:<15} {last:<20}")
 
 
-def cmd_scrape():
+def cmd_scrape(concurrency=None, backend=None):
     """Run scrape manually."""
-    from scraper import run_scrape
+    from scraper import run_scrape, format_timings, format_resources
     print("Starting scrape of all accounts...")
-    results = run_scrape()
-    print(f"Complete: {results['success']} successful, {results['failed']} failed")
+    results = run_scrape(concurrency, backend)
+    print(f"Complete: {results['success']} successful, {results['failed']} failed in {results['elapsed']}s")
+    for t in sorted(results['accounts'], key=lambda t: t['seconds'], reverse=True):
+        print(f"  {t['seconds']:>6.1f}s  {'ok  ' if t['success'] else 'FAIL'}  {t['backend']:<7}  {t['unit']}")
+        if t['steps']:
+            print(f"           {format_timings(t['steps'])}")
+        if t.get('resources'):
+            print(f"           {format_resources(t['resources'])}")
 
 
 def cmd_inspect(email, password):
@@ -127,16 +135,29 @@ def cmd_inspect(email, password):
     print(result)
 
 
+def cmd_scrape_service():
+    """Run the long-lived scrape service."""
+    from scrape_service import run_service
+    run_service()
+
+
 def cmd_run():
     """Run the web app with scheduler."""
     import threading
     from app import app
     from scheduler import create_scheduler
+    import config
     import database as db
 
     # Initialize database
     db.init_db()
 
+    # Work the scrape queue in-process unless the separate scrape service does
+    if not config.SCRAPE_SERVICE:
+        from scrape_service import start_queue_worker
+        start_queue_worker()
+        print("Scrape worker started")
+
     # Start scheduler in background
     scheduler = create_scheduler()
     scheduler.start()
@@ -168,12 +189,17 @@ def main():
     elif cmd == 'list_accounts':
         cmd_list_accounts()
     elif cmd == 'scrape':
-        cmd_scrape()
+        args = sys.argv[2:]
+        concurrency = next((int(a) for a in args if a.isdigit()), None)
+        backend = next((a for a in args if not a.isdigit()), None)
+        cmd_scrape(concurrency, backend)
     elif cmd == 'inspect':
         if len(sys.argv) < 4:
             print("Usage: python manage.py inspect EMAIL PASSWORD")
             return
         cmd_inspect(sys.argv[2], sys.argv[3])
+    elif cmd == 'scrape_service':
+        cmd_scrape_service()
     elif cmd == 'run':
         cmd_run()
     else:
@@ -26,9 +26,25 @@ def hourly_scrape_job():
     """Run hourly scrape of all accounts."""
     logger.info("Starting hourly scrape job")
     try:
-        from scraper import run_scrape
-        results = run_scrape()
-        logger.info(f"Hourly scrape complete: {results['success']} success, {results['failed']} failed")
+        # A queue worker (the scrape service, or the thread started alongside the
+        # scheduler) does the work; wait for it before checking alerts
+        import database as db
+        from scrape_service import wait_for_job
+        if not db.scrape_worker_alive():
+            logger.error("Hourly scrape skipped - no scrape worker is running")
+            return
+        # Attaches to a dashboard-requested scrape if one is already in flight
+        job, _ = db.enqueue_or_attach_scrape_job('scheduler')
+        job_id = job['id']
+        job = wait_for_job(job_id, timeout=50 * 60)
+        if job is None:
+            logger.error(f"Hourly scrape job {job_id} didn't finish in 50 minutes")
+            return
+        if job['status'] == 'failed':
+            logger.error(f"Hourly scrape job {job_id} failed: {job['error']}")
+            return
+        results = job['result']
+        logger.info(f"Hourly scrape complete: {results['success']} success, {results['failed']} failed in {results['elapsed']}s")
 
         # Check alerts after scraping
         check_alerts_job()
@@ -93,6 +109,12 @@ def run_scheduler():
     """Run the scheduler standalone."""
     logger.info("Starting Water Monitor Scheduler")
 
+    import database as db
+    db.init_db()
+    if not config.SCRAPE_SERVICE:
+        from scrape_service import start_queue_worker
+        start_queue_worker()
+
     scheduler = create_scheduler()
     scheduler.start()
 
@@ -0,0 +1,189 @@
+"""
+Scrape service - a long-running worker that keeps Chromium warm.
+
+Works through the scrape_jobs queue in SQLite one job at a time (the
+scheduler and the dashboard queue jobs there instead of scraping in-process).
+The browser is launched once and reused across jobs. It is relaunched after
+SCRAPE_BROWSER_MAX_JOBS jobs, or once Chromium's resident memory passes
+SCRAPE_BROWSER_MAX_MB, so leaks stay contained and memory stays predictable.
+
+Run with: python manage.py scrape_service
+
+Without SCRAPE_SERVICE, manage.py run and scheduler.py call start_queue_worker()
+instead: the same loop on a background thread, launching the browser per job.
+Every worker heartbeats into scrape_workers so the app can tell when none is running.
+"""
+
+import asyncio
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+from typing import Optional
+
+import config
+import database as db
+from scraper import WaterMeterScraper
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def browser_rss_mb(root_pid: int = None) -> Optional[float]:
+    """Resident memory of every process descended from root_pid (Chromium, the Playwright driver), from /proc."""
+    root_pid = root_pid or os.getpid()
+    try:
+        children = {}
+        for pid in filter(str.isdigit, os.listdir('/proc')):
+            try:
+                with open(f'/proc/{pid}/stat') as f:
+                    ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+                children.setdefault(ppid, []).append(int(pid))
+            except (OSError, IndexError, ValueError):
+                continue  # Exited while we looked
+    except OSError:
+        return None  # No /proc (not Linux)
+
+    total_kb = 0
+    stack = list(children.get(root_pid, []))
+    while stack:
+        pid = stack.pop()
+        stack.extend(children.get(pid, []))
+        try:
+            with open(f'/proc/{pid}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total_kb += int(line.split()[1])
+                        break
+        except OSError:
+            continue
+    return total_kb / 1024
+
+
+def wait_for_job(job_id: int, timeout: float, poll: float = 5) -> Optional[dict]:
+    """Block until a queued job finishes (or timeout). Returns the job row, or None on timeout."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = db.get_scrape_job(job_id)
+        if job and job['status'] in ('done', 'failed'):
+            return job
+        time.sleep(poll)
+    return None
+
+
+class ScrapeService:
+    def __init__(self, poll_seconds: float = None, max_jobs: int = None, max_mb: float = None,
+                 keep_warm: bool = True, handle_signals: bool = True):
+        self.poll_seconds = poll_seconds or config.SCRAPE_SERVICE_POLL_SECONDS
+        self.max_jobs = max_jobs or config.SCRAPE_BROWSER_MAX_JOBS
+        self.max_mb = max_mb or config.SCRAPE_BROWSER_MAX_MB
+        self.keep_warm = keep_warm
+        self.handle_signals = handle_signals  # Only possible on the main thread
+        self.worker = f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+        self.scraper = WaterMeterScraper(keep_warm=keep_warm)
+        self.jobs_on_browser = 0
+        self._stopping = None
+        self._heartbeat_stop = threading.Event()
+
+    def _heartbeat(self):
+        # Own thread, so a long job on the event loop can't make the worker look dead
+        interval = config.SCRAPE_WORKER_TIMEOUT_SECONDS / 4
+        while not self._heartbeat_stop.is_set():
+            try:
+                db.scrape_worker_heartbeat(self.worker)
+            except Exception as e:
+                logger.warning(f"Heartbeat failed: {e}")
+            self._heartbeat_stop.wait(interval)
+
+    async def warm_up(self):
+        started = time.monotonic()
+        try:
+            await self.scraper.start()
+            logger.info(f"Browser warm in {time.monotonic() - started:.1f}s")
+        except Exception as e:
+            # Jobs still run; the API backend doesn't need it and the next job retries the launch
+            logger.error(f"Browser failed to start: {e}")
+        self.jobs_on_browser = 0
+
+    async def recycle_if_needed(self):
+        if self.scraper.browser is None:
+            return
+        self.jobs_on_browser += 1
+        rss = browser_rss_mb()
+        reason = None
+        if self.jobs_on_browser >= self.max_jobs:
+            reason = f"{self.jobs_on_browser} jobs"
+        elif rss is not None and rss > self.max_mb:
+            reason = f"{rss:.0f} MB resident"
+        if reason:
+            logger.info(f"Recycling browser ({reason})")
+            await self.scraper.stop()
+            await self.warm_up()
+
+    async def run_job(self, job: dict):
+        logger.info(f"Job {job['id']} started (requested by {job['requested_by']})")
+        self.scraper.backend = job['backend'] or config.SCRAPE_BACKEND
+        try:
+            results = await self.scraper.scrape_all_accounts(
+                on_progress=lambda done, total: db.update_scrape_job_progress(job['id'], done, total))
+            db.finish_scrape_job(job['id'], result=results)
+            logger.info(f"Job {job['id']} done: {results['success']} success, {results['failed']} failed "
+                        f"in {results['elapsed']}s")
+        except Exception as e:
+            db.finish_scrape_job(job['id'], error=str(e))
+            logger.error(f"Job {job['id']} failed: {e}")
+
+    async def run(self):
+        self._stopping = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        if self.handle_signals:
+            for sig in (signal.SIGTERM, signal.SIGINT):
+                loop.add_signal_handler(sig, self._stopping.set)
+
+        db.init_db()
+        db.scrape_worker_heartbeat(self.worker)
+        threading.Thread(target=self._heartbeat, name='scrape-heartbeat', daemon=True).start()
+        requeued = db.requeue_running_scrape_jobs()
+        if requeued:
+            logger.warning(f"Requeued {requeued} job(s) left running by a stopped worker")
+        logger.info(f"Scrape worker {self.worker} starting")
+        if self.keep_warm:
+            await self.warm_up()
+
+        try:
+            while not self._stopping.is_set():
+                job = db.claim_scrape_job(self.worker)
+                if job is None:
+                    try:
+                        await asyncio.wait_for(self._stopping.wait(), timeout=self.poll_seconds)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self.run_job(job)
+                await self.recycle_if_needed()
+        finally:
+            self._heartbeat_stop.set()
+            db.remove_scrape_worker(self.worker)
+            await self.scraper.stop()
+            logger.info("Scrape service stopped")
+
+
+def run_service():
+    asyncio.run(ScrapeService().run())
+
+
+def start_queue_worker() -> threading.Thread:
+    """Drain the queue on a daemon thread (no separate scrape service; browser launched per job)."""
+    service = ScrapeService(keep_warm=False, handle_signals=False)
+    thread = threading.Thread(target=lambda: asyncio.run(service.run()), name='scrape-worker', daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == "__main__":
+    run_service()
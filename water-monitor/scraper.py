@@ -3,21 +3,295 @@ Water Meter Scraper for mywateradvisor2.com
 """
 
 import asyncio
+import time
+from collections import Counter
 from datetime import datetime, date
 from typing import Optional
+from urllib.parse import urlsplit
 from playwright.async_api import async_playwright, Page, Browser
 import database as db
 import config
 import re
 import notifications
+from usage_json import UsageCapture
+from http_scraper import HttpScraper, ApiFlowError
+
+
+LOGIN_URL = "https://mywateradvisor2.com/login"
+EMAIL_SELECTOR = 'input[type="email"], input[name*="email" i], input[placeholder*="email" i]'
+LOGIN_BUTTON_SELECTORS = [
+    'button:has-text("Login")',
+    'button:has-text("Sign In")',
+    'button:has-text("Log In")',
+    'button[type="submit"]',
+    'input[type="submit"]',
+]
+DASHBOARD_SELECTOR = 'text=/Current Billing Cycle/i'
+# XHRs that carry meter usage (the dashboard and its tabs load from these)
+USAGE_URL_PATTERN = re.compile(r'usage|consumption|interval|reading', re.IGNORECASE)
+# Body text changed since `prev` and the stats block has rendered
+TAB_CONTENT_CHANGED = "prev => { const t = document.body.innerText; return t !== prev && /Average/.test(t); }"
+# Every table row's cell texts in one round trip
+TABLE_ROWS = "() => Array.from(document.querySelectorAll('table tr'), r => Array.from(r.querySelectorAll('td'), c => c.innerText))"
+# Fields the usage JSON can fill; the page text is only parsed for what's still missing
+API_FIELDS = ('monthly_total', 'monthly_forecast', 'monthly_avg_12mo', 'daily_total',
+              'daily_min', 'daily_max', 'daily_avg', 'leak_message')
+
+
+def is_usage_response(response) -> bool:
+    return (response.request.resource_type in ('xhr', 'fetch')
+            and bool(USAGE_URL_PATTERN.search(response.url)))
+
+
+def capture_usage_json(page: Page, capture: UsageCapture):
+    """Feed the JSON body of every usage XHR the page makes into `capture`."""
+    async def read(response):
+        try:
+            if 'json' in (response.headers.get('content-type') or ''):
+                capture.add(response.url, await response.json())
+        except Exception:
+            pass  # Body gone (page navigated) or not JSON - the DOM fallback covers it
+
+    def on_response(response):
+        if is_usage_response(response):
+            capture.track(asyncio.ensure_future(read(response)))
+
+    page.on('response', on_response)
+
+
+def hourly_from_rows(rows: list) -> list:
+    """hour:value pairs from table rows (lists of cell texts)."""
+    hourly = []
+    for cell_texts in rows:
+        if len(cell_texts) < 2:
+            continue
+        for i, text in enumerate(cell_texts[:-1]):
+            hour_match = re.match(r'^(\d{1,2})(?::00)?$', text.strip())
+            if hour_match:
+                value_match = re.search(r'([\d.]+)', cell_texts[i+1])
+                if value_match:
+                    try:
+                        hourly.append({'hour': int(hour_match.group(1)), 'usage': float(value_match.group(1))})
+                    except ValueError:
+                        continue
+    return hourly
+
+
+def format_sources(sources: dict, payloads: int) -> str:
+    """'xhr (3 payloads): hourly_data, monthly_total; dom: daily_avg' for log lines."""
+    parts = []
+    for source in dict.fromkeys(sources.values()):
+        fields = [f for f, s in sources.items() if s == source]
+        label = f"{source} ({payloads} payloads)" if source in ('xhr', 'api') else source
+        parts.append(f"{label}: {', '.join(fields)}")
+    return '; '.join(parts) or 'nothing found'
+
+
+def format_timings(timings: dict) -> str:
+    """'login_form 0.4s (form), ...' for log lines."""
+    return ', '.join(f"{step} {t['ms'] / 1000:.1f}s ({t['signal']})" for step, t in timings.items())
+
+
+def save_usage(account: dict, data: dict):
+    """
+    Store one account's scraped usage and send any leak/overage alerts (either backend).
+
+    Everything is written in one transaction (db.ScrapeResultWriter); the
+    alerts go out after it commits.
+    """
+    today = date.today()
+    alerts = []
+
+    with db.ScrapeResultWriter(account['id']) as writer:
+        if data['hourly_data']:
+            writer.save_hourly_readings([dict(h, date=h.get('date', today)) for h in data['hourly_data']])
+
+        if data['daily_total']:
+            writer.save_daily_summary(today, data['daily_total'])
+
+        # Handle leak detection (if enabled for this meter)
+        if data['leak_detected']:
+            writer.log('leak', data['leak_message'])
+            print(f"    LEAK DETECTED: {data['leak_message']}")
+            if account.get('leak_alerts', 1) == 1:
+                monthly = data['monthly_total'] or 0
+                avg = data['monthly_avg_12mo'] or 0
+                leak_msg = f"{data['leak_message']}\nThis month: {monthly:,.0f} gal\n12-mo avg: {avg:,.0f} gal"
+                alerts.append((notifications.send_leak_alert, leak_msg))
+            else:
+                print(f"    (Leak alerts disabled for this meter)")
+
+        # Update last scraped time, monthly usage, and 12-month average
+        update_data = {'last_scraped': datetime.now().isoformat()}
+        if data['monthly_total']:
+            update_data['monthly_usage'] = data['monthly_total']
+        if data['monthly_avg_12mo']:
+            update_data['avg_12mo'] = data['monthly_avg_12mo']
+        writer.update_account(**update_data)
+
+        # Check for projected overage (10%, 20%, 30%, 40% over 12-month average)
+        if data['monthly_total'] and data['monthly_avg_12mo']:
+            import calendar
+            day_of_month = datetime.now().day
+
+            # No alerts for first 5 days of month
+            if day_of_month > 5:
+                avg_12mo = data['monthly_avg_12mo']
+                days_in_month = calendar.monthrange(datetime.now().year, datetime.now().month)[1]
+                current_month = datetime.now().strftime('%Y-%m')
+
+                # Calculate projected usage
+                projected_usage = (data['monthly_total'] / day_of_month) * days_in_month
+                overage_pct = ((projected_usage - avg_12mo) / avg_12mo) * 100
+
+                # Check which thresholds have been alerted this month
+                fired = writer.fired_levels('overage', current_month)
+
+                # Determine which threshold levels have been triggered
+                # Use meter's min_overage_pct setting (default 10%)
+                min_threshold = account.get('min_overage_pct', 10) or 10
+                thresholds = [t for t in [10, 20, 30, 40] if t >= min_threshold]
+                for threshold in thresholds:
+                    if threshold not in fired and overage_pct >= threshold:
+                        overage_threshold = avg_12mo * (1 + threshold/100)
+                        expected_at_this_point = overage_threshold * (day_of_month / days_in_month)
+
+                        alert_msg = f"[{threshold}%] At {data['monthly_total']:.0f} gal (day {day_of_month}), projected {projected_usage:.0f} gal ({overage_pct:.0f}% over {avg_12mo:.0f} avg)"
+                        if (data['monthly_total'] > expected_at_this_point
+                                and writer.record_alert('overage', current_month, threshold, alert_msg)):
+                            writer.log('overage_alert', alert_msg)
+                            print(f"    OVERAGE ALERT: {alert_msg}")
+                            alerts.append((notifications.send_overage_alert, alert_msg))
+                            break  # Only send one alert per scrape
+
+        writer.log('success', f'Daily: {data["daily_total"]}, Monthly: {data["monthly_total"]}, 12mo avg: {data["monthly_avg_12mo"]}, Leak: {data["leak_detected"]}')
+
+    if writer.hourly_written or writer.hourly_unchanged:
+        print(f"    Hourly rows: {writer.hourly_written} written, {writer.hourly_unchanged} unchanged")
+
+    for send, message in alerts:
+        send(account.get('address', account['unit_number']), message)
+
+
+class SitePacer:
+    """Spaces out account starts on one site so parallel scrapes don't hammer it."""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self._lock = asyncio.Lock()
+        self._last_start = 0.0
+
+    async def wait(self):
+        async with self._lock:
+            wait = self._last_start + self.delay - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._last_start = time.monotonic()
+
+
+class ResourceFilter:
+    """
+    page.route handler that drops requests the scrape doesn't need.
+
+    Anything from a deny-listed domain (trackers, map tiles) is blocked, beacons
+    included, unless the domain is also allowed. Otherwise XHR/fetch and
+    documents always load (the usage data and the SPA itself) and other
+    requests are blocked by resource type. Blocked requests are never
+    downloaded, so bytes_saved is an estimate from typical sizes.
+    """
+
+    ALWAYS_LOAD = ('document', 'xhr', 'fetch')
+    TYPICAL_BYTES = {'image': 40_000, 'media': 500_000, 'font': 50_000, 'script': 60_000,
+                     'stylesheet': 20_000}
+
+    def __init__(self, block_types=None, block_domains=None, allow_domains=None):
+        self.block_types = set(config.SCRAPE_BLOCK_TYPES if block_types is None else block_types)
+        self.block_domains = config.SCRAPE_BLOCK_DOMAINS if block_domains is None else block_domains
+        self.allow_domains = config.SCRAPE_ALLOW_DOMAINS if allow_domains is None else allow_domains
+        self.blocked = Counter()
+        self.allowed = Counter()
+        self.bytes_saved = 0
+        self.bytes_loaded = 0
+
+    @staticmethod
+    def _matches(host: str, domains) -> bool:
+        return any(host == d or host.endswith('.' + d) for d in domains)
+
+    def block_reason(self, resource_type: str, url: str) -> Optional[str]:
+        """Why a request should be blocked ('tracker' / its type), or None to let it through."""
+        host = urlsplit(url).hostname or ''
+        if (resource_type != 'document' and not self._matches(host, self.allow_domains)
+                and self._matches(host, self.block_domains)):
+            return 'tracker'
+        if resource_type in self.ALWAYS_LOAD:
+            return None
+        if resource_type in self.block_types:
+            return resource_type
+        return None
+
+    async def handle(self, route):
+        request = route.request
+        reason = self.block_reason(request.resource_type, request.url)
+        if reason:
+            self.blocked[reason] += 1
+            self.bytes_saved += self.TYPICAL_BYTES.get(request.resource_type, 5_000)
+            await route.abort('blockedbyclient')
+        else:
+            self.allowed[request.resource_type] += 1
+            await route.continue_()
+
+    def on_response(self, response):
+        self.bytes_loaded += int(response.headers.get('content-length') or 0)
+
+    async def attach(self, context):
+        await context.route('**/*', self.handle)
+        context.on('response', self.on_response)
+
+    def summary(self) -> dict:
+        return {'allowed': sum(self.allowed.values()), 'blocked': sum(self.blocked.values()),
+                'bytes_loaded': self.bytes_loaded, 'bytes_saved': self.bytes_saved,
+                'blocked_by': dict(self.blocked)}
+
+
+def format_resources(stats: dict) -> str:
+    """'31 allowed (0.8 MB), 112 blocked (~3.1 MB saved: image 90, tracker 22)' for log lines."""
+    blocked_by = ', '.join(f"{k} {v}" for k, v in sorted(stats['blocked_by'].items(), key=lambda kv: -kv[1]))
+    return (f"{stats['allowed']} allowed ({stats['bytes_loaded'] / 1e6:.1f} MB), "
+            f"{stats['blocked']} blocked (~{stats['bytes_saved'] / 1e6:.1f} MB saved"
+            f"{': ' + blocked_by if blocked_by else ''})")
+
 
 class WaterMeterScraper:
-    def __init__(self):
+    def __init__(self, concurrency: int = None, site_delay: float = None, backend: str = None,
+                 keep_warm: bool = False):
         self.browser: Optional[Browser] = None
         self.playwright = None
+        # Leave the browser running between runs (scrape_service.py)
+        self.keep_warm = keep_warm
+        self.concurrency = max(1, concurrency or config.SCRAPE_CONCURRENCY)
+        self.backend = backend or config.SCRAPE_BACKEND
+        self.site_delay = config.SCRAPE_SITE_DELAY if site_delay is None else site_delay
+        self._pacers = {}
+        # account_id -> {step: {'ms', 'signal'}} for the current run
+        self.step_timings = {}
+        # account_id -> ResourceFilter.summary() for the current run
+        self.resource_stats = {}
+        self._filters = {}
+        self._on_progress = None
+        self._progress = [0, 0]
+
+    def pacer(self, url: str) -> SitePacer:
+        """One pacer per host."""
+        host = urlsplit(url).netloc
+        if host not in self._pacers:
+            self._pacers[host] = SitePacer(self.site_delay)
+        return self._pacers[host]
 
     async def start(self):
-        """Start the browser."""
+        """Start the browser (no-op if it's already running)."""
+        if self.browser is not None and self.browser.is_connected():
+            return
+        await self.stop()
         self.playwright = await async_playwright().start()
         self.browser = await self.playwright.chromium.launch(
             headless=True,
@@ -27,65 +301,129 @@ class WaterMeterScraper:
     async def stop(self):
         """Close the browser."""
         if self.browser:
-            await self.browser.close()
+            try:
+                await self.browser.close()
+            except Exception:
+                pass  # Already gone (crashed or killed)
         if self.playwright:
             await self.playwright.stop()
+        self.browser = None
+        self.playwright = None
 
-    async def login(self, page: Page, email: str, password: str) -> bool:
+    def _account_done(self):
+        self._progress[0] += 1
+        if self._on_progress:
+            self._on_progress(*self._progress)
+
+    async def _ready(self, timings: dict, step: str, signals: dict, timeout_ms: int,
+                     fallback_ms: int = 0, action=None) -> Optional[str]:
+        """
+        Wait for whichever readiness signal fires first instead of sleeping.
+
+        signals: {name: Playwright wait coroutine}. They are armed before
+        `action` (e.g. a click) runs, so a fast XHR can't be missed. If none
+        fires within timeout_ms, wait fallback_ms and carry on. The step's
+        duration and the signal that fired (or 'timeout') go into `timings`.
+        """
+        started = time.monotonic()
+        tasks = {asyncio.ensure_future(coro): name for name, coro in signals.items()}
+        await asyncio.sleep(0)  # let the waits register
+        fired = None
+        try:
+            if action is not None:
+                await action
+            pending = set(tasks)
+            deadline = started + timeout_ms / 1000
+            while pending and fired is None:
+                done, pending = await asyncio.wait(pending, timeout=max(0.0, deadline - time.monotonic()),
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+                fired = next((tasks[t] for t in done if t.exception() is None), None)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        if fired is None and fallback_ms:
+            await asyncio.sleep(fallback_ms / 1000)
+        timings[step] = {'ms': round(1000 * (time.monotonic() - started)), 'signal': fired or 'timeout'}
+        return fired
+
+    async def login(self, page: Page, email: str, password: str, timings: dict = None) -> bool:
         """Log into mywateradvisor2.com"""
+        timings = {} if timings is None else timings
         try:
-            # Go directly to login page
-            await page.goto("https://mywateradvisor2.com/login", wait_until='networkidle', timeout=30000)
-            await page.wait_for_timeout(3000)
+            # Go directly to login page; the SPA renders the form after its bundle loads
+            await page.goto(LOGIN_URL, wait_until='domcontentloaded', timeout=30000)
+            await self._ready(timings, 'login_form', {
+                'form': page.wait_for_selector(EMAIL_SELECTOR, state='visible', timeout=10000),
+            }, timeout_ms=10000, fallback_ms=1000)
 
             # Find and fill email field
-            email_input = await page.wait_for_selector('input[type="email"], input[name*="email" i], input[placeholder*="email" i]', timeout=10000)
+            email_input = await page.query_selector(EMAIL_SELECTOR)
             if email_input:
                 await email_input.fill(email)
 
-            await page.wait_for_timeout(500)
-
             # Find and fill password field
             password_input = await page.wait_for_selector('input[type="password"]', timeout=5000)
             if password_input:
                 await password_input.fill(password)
 
-            await page.wait_for_timeout(500)
-
-            # Click login button
-            login_selectors = [
-                'button:has-text("Login")',
-                'button:has-text("Sign In")',
-                'button:has-text("Log In")',
-                'button[type="submit"]',
-                'input[type="submit"]',
-            ]
-
-            for selector in login_selectors:
-                try:
-                    btn = await page.wait_for_selector(selector, timeout=2000)
-                    if btn:
-                        await btn.click()
-                        break
-                except:
-                    continue
-
-            # Wait for login to complete
-            await page.wait_for_timeout(5000)
+            # Click login button, then wait until we leave the login page or usage starts loading
+            login_button = page.locator(', '.join(LOGIN_BUTTON_SELECTORS)).first
+            await self._ready(timings, 'login_submit', {
+                'navigated': page.wait_for_url(lambda url: 'login' not in url.lower(),
+                                               wait_until='commit', timeout=15000),
+                'usage_xhr': page.wait_for_event('response', predicate=is_usage_response, timeout=15000),
+            }, timeout_ms=15000, fallback_ms=2000, action=login_button.click(timeout=5000))
 
-            # Check if logged in (look for dashboard elements or logout button)
-            page_text = await page.inner_text('body')
-            if 'dashboard' in page_text.lower() or 'usage' in page_text.lower() or 'logout' in page_text.lower() or 'gallons' in page_text.lower():
-                return True
+            # Still showing the form means the credentials were rejected
+            if 'login' in page.url.lower() and await page.query_selector('input[type="password"]'):
+                return False
 
-            return True  # Assume success if no error
+            return True
 
         except Exception as e:
             db.log_scrape(None, 'error', f'Login error: {str(e)}')
             return False
 
-    async def scrape_usage_data(self, page: Page, account_id: int) -> dict:
-        """Scrape usage data from the dashboard."""
+    async def resume_session(self, page: Page, timings: dict = None) -> bool:
+        """Open the dashboard with a saved session. False if the site asks for a login."""
+        timings = {} if timings is None else timings
+        try:
+            await page.goto(config.BASE_URL, wait_until='domcontentloaded', timeout=30000)
+            fired = await self._ready(timings, 'resume_session', {
+                'dashboard': page.wait_for_selector(DASHBOARD_SELECTOR, timeout=10000),
+                'login_form': page.wait_for_selector('input[type="password"]', timeout=10000),
+            }, timeout_ms=10000)
+            if fired == 'login_form' or 'login' in page.url.lower():
+                return False
+            # The SPA can render the login form without changing the URL
+            return await page.query_selector('input[type="password"]') is None
+        except Exception:
+            return False
+
+    async def new_context(self, account_id: int, storage_state: dict = None):
+        """A fresh browser context, with the account's resource filter routed in."""
+        context = await self.browser.new_context(storage_state=storage_state)
+        if config.SCRAPE_BLOCK_RESOURCES:
+            if account_id not in self._filters:
+                self._filters[account_id] = ResourceFilter()
+            await self._filters[account_id].attach(context)
+        return context
+
+    async def scrape_usage_data(self, page: Page, account_id: int, timings: dict = None,
+                                capture: UsageCapture = None) -> dict:
+        """
+        Scrape usage data from the dashboard.
+
+        Fields come from the usage JSON the SPA loads (see usage_json) when
+        `capture` has it; the page text and tables are only parsed for what
+        the JSON didn't provide. result['sources'] records which was used.
+        """
+        timings = {} if timings is None else timings
+        capture = capture or UsageCapture()
         result = {
             'hourly_data': [],
             'daily_total': None,       # Will store daily average
@@ -97,104 +435,109 @@ class WaterMeterScraper:
             'daily_avg': None,
             'current_reading': None,
             'leak_detected': False,
-            'leak_message': None
+            'leak_message': None,
+            'sources': {},
         }
 
+        def take_api():
+            api = capture.result()
+            for field in API_FIELDS + ('hourly_data',):
+                if api[field] and not result[field]:
+                    result[field] = api[field]
+                    result['sources'][field] = 'xhr'
+            result['leak_detected'] = result['leak_detected'] or api['leak_detected']
+
+        def take_dom(field, pattern, text):
+            if result[field] is None:
+                match = re.search(pattern, text, re.IGNORECASE)
+                if match:
+                    result[field] = float(match.group(1).replace(',', ''))
+                    result['sources'][field] = 'dom'
+
         try:
-            await page.wait_for_timeout(3000)
+            # Dashboard summary rendered (or its usage XHR finished)
+            await self._ready(timings, 'dashboard', {
+                'summary': page.wait_for_selector(DASHBOARD_SELECTOR, timeout=10000),
+                'usage_xhr': page.wait_for_event('response', predicate=is_usage_response, timeout=10000),
+            }, timeout_ms=10000, fallback_ms=2000)
+            await capture.settle()
+            take_api()
 
             # Get all text from page
             page_text = await page.inner_text('body')
 
-            # Extract "Current Billing Cycle" usage (monthly total)
-            current_match = re.search(r'Current Billing Cycle\s*([\d,]+)\s*gal', page_text, re.IGNORECASE)
-            if current_match:
-                result['monthly_total'] = float(current_match.group(1).replace(',', ''))
-
-            # Extract forecast
-            forecast_match = re.search(r'Forecast\s*([\d,]+)\s*gal', page_text, re.IGNORECASE)
-            if forecast_match:
-                result['monthly_forecast'] = float(forecast_match.group(1).replace(',', ''))
-
-            # Click "Daily" tab to get daily stats
-            daily_btn = await page.query_selector('text=Daily')
-            if daily_btn:
-                await daily_btn.click()
-                await page.wait_for_timeout(2000)
-                page_text = await page.inner_text('body')
-
-            # Extract daily stats (Average is most useful for daily usage)
-            avg_match = re.search(r'Average\s*([\d,]+)', page_text)
-            if avg_match:
-                result['daily_avg'] = float(avg_match.group(1).replace(',', ''))
-                result['daily_total'] = result['daily_avg']  # Use average as daily usage
-
-            min_match = re.search(r'Minimum\s*([\d,]+)', page_text)
-            if min_match:
-                result['daily_min'] = float(min_match.group(1).replace(',', ''))
-
-            max_match = re.search(r'Maximum\s*([\d,]+)', page_text)
-            if max_match:
-                result['daily_max'] = float(max_match.group(1).replace(',', ''))
-
-            # Try to find hourly data in tables
-            tables = await page.query_selector_all('table')
-            for table in tables:
-                rows = await table.query_selector_all('tr')
-                for row in rows:
-                    cells = await row.query_selector_all('td')
-                    if len(cells) >= 2:
-                        try:
-                            cell_texts = [await c.inner_text() for c in cells]
-                            # Look for hour:value pairs
-                            for i, text in enumerate(cell_texts[:-1]):
-                                hour_match = re.match(r'^(\d{1,2})(?::00)?$', text.strip())
-                                if hour_match:
-                                    hour = int(hour_match.group(1))
-                                    value_text = cell_texts[i+1]
-                                    value_match = re.search(r'([\d.]+)', value_text)
-                                    if value_match:
-                                        result['hourly_data'].append({
-                                            'hour': hour,
-                                            'usage': float(value_match.group(1))
-                                        })
-                        except:
-                            continue
-
-            # Click "Billing Month" tab to get 12-month average
-            billing_month_btn = await page.query_selector('text=Billing Month')
-            if not billing_month_btn:
-                billing_month_btn = await page.query_selector('text="Billing Month"')
-            if billing_month_btn:
-                await billing_month_btn.click()
-                await page.wait_for_timeout(2000)
+            # Current Billing Cycle usage (monthly total) and forecast
+            take_dom('monthly_total', r'Current Billing Cycle\s*([\d,]+)\s*gal', page_text)
+            take_dom('monthly_forecast', r'Forecast\s*([\d,]+)\s*gal', page_text)
+
+            # Click "Daily" tab for daily stats, unless its series already came in
+            if result['daily_avg'] is None:
+                daily_btn = await page.query_selector('text=Daily')
+                if daily_btn:
+                    await self._ready(timings, 'daily_tab', {
+                        'content': page.wait_for_function(TAB_CONTENT_CHANGED, arg=page_text, polling=100, timeout=5000),
+                        'usage_xhr': page.wait_for_event('response', predicate=is_usage_response, timeout=5000),
+                    }, timeout_ms=5000, fallback_ms=1000, action=daily_btn.click())
+                    await capture.settle()
+                    take_api()
+                    page_text = await page.inner_text('body')
+
+                # Extract daily stats (Average is most useful for daily usage)
+                take_dom('daily_avg', r'Average\s*([\d,]+)', page_text)
+                if result['daily_total'] is None and result['daily_avg'] is not None:
+                    result['daily_total'] = result['daily_avg']  # Use average as daily usage
+                    result['sources']['daily_total'] = result['sources']['daily_avg']
+                take_dom('daily_min', r'Minimum\s*([\d,]+)', page_text)
+                take_dom('daily_max', r'Maximum\s*([\d,]+)', page_text)
+
+            # No hourly series in the JSON - look for hour:value pairs in tables
+            if not result['hourly_data']:
+                result['hourly_data'] = hourly_from_rows(await page.evaluate(TABLE_ROWS))
+                if result['hourly_data']:
+                    result['sources']['hourly_data'] = 'dom'
+
+            # Click "Billing Month" tab for the 12-month average, unless the monthly series came in
+            if result['monthly_avg_12mo'] is None:
+                billing_month_btn = await page.query_selector('text=Billing Month')
+                if not billing_month_btn:
+                    billing_month_btn = await page.query_selector('text="Billing Month"')
+                if billing_month_btn:
+                    await self._ready(timings, 'billing_month_tab', {
+                        'content': page.wait_for_function(TAB_CONTENT_CHANGED, arg=page_text, polling=100, timeout=5000),
+                        'usage_xhr': page.wait_for_event('response', predicate=is_usage_response, timeout=5000),
+                    }, timeout_ms=5000, fallback_ms=1000, action=billing_month_btn.click())
+                    await capture.settle()
+                    take_api()
+                    page_text = await page.inner_text('body')
+
+                    # Look for 12-month average (the Average stat at bottom of chart)
+                    take_dom('monthly_avg_12mo', r'Average\s*[-]?([\d,]+)', page_text)
+            if result['monthly_avg_12mo'] is not None:
+                print(f"    Found 12-month avg: {result['monthly_avg_12mo']} ({result['sources']['monthly_avg_12mo']})")
+
+            # LEAK DETECTION - look for red elements or leak text, unless the JSON carried the alert
+            if result['leak_message'] is None:
                 page_text = await page.inner_text('body')
-
-                # Look for 12-month average (the Average stat at bottom of chart)
-                avg_12mo_match = re.search(r'Average\s*[-]?([\d,]+)', page_text)
-                if avg_12mo_match:
-                    result['monthly_avg_12mo'] = float(avg_12mo_match.group(1).replace(',', ''))
-                    print(f"    Found 12-month avg: {result['monthly_avg_12mo']}")
-
-            # LEAK DETECTION - look for red elements or leak text
-            page_text = await page.inner_text('body')
-            if 'leak' in page_text.lower():
-                result['leak_detected'] = True
-                # Try to get leak message
-                leak_match = re.search(r'(leak[^.]*\.)', page_text, re.IGNORECASE)
-                if leak_match:
-                    result['leak_message'] = leak_match.group(1)
-                else:
-                    result['leak_message'] = 'Leak detected on meter'
-
-            # Also check for red colored elements (potential leak indicators)
-            red_elements = await page.query_selector_all('[style*="red"], [class*="red"], [class*="alert"], [class*="warning"], [class*="danger"]')
-            for el in red_elements:
-                el_text = await el.inner_text()
-                if el_text.strip():
+                if 'leak' in page_text.lower():
                     result['leak_detected'] = True
-                    result['leak_message'] = el_text.strip()[:200]
-                    break
+                    # Try to get leak message
+                    leak_match = re.search(r'(leak[^.]*\.)', page_text, re.IGNORECASE)
+                    if leak_match:
+                        result['leak_message'] = leak_match.group(1)
+                    else:
+                        result['leak_message'] = 'Leak detected on meter'
+
+                # Also check for red colored elements (potential leak indicators)
+                red_texts = await page.eval_on_selector_all(
+                    '[style*="red"], [class*="red"], [class*="alert"], [class*="warning"], [class*="danger"]',
+                    'els => els.map(e => e.innerText)')
+                for el_text in red_texts:
+                    if el_text.strip():
+                        result['leak_detected'] = True
+                        result['leak_message'] = el_text.strip()[:200]
+                        break
+                if result['leak_message']:
+                    result['sources']['leak_message'] = 'dom'
 
             # Take screenshot for debugging
             await page.screenshot(path=f'/home/hunter/projects/vic-vil/water-monitor/screenshots/account_{account_id}.png')
@@ -205,111 +548,47 @@ class WaterMeterScraper:
         return result
 
     async def scrape_account(self, account: dict) -> bool:
-        """Scrape data for a single account."""
-        page = await self.browser.new_page()
+        """Scrape data for a single account in its own browser context."""
+        # Start from the saved session (cookies + localStorage) when there is one
+        session = db.get_session_state(account, config.SESSION_MAX_AGE_HOURS)
+        context = await self.new_context(account['id'], session)
+        page = await context.new_page()
+        timings = self.step_timings.setdefault(account['id'], {})
+        # Usage JSON the dashboard fetches; listening from the first navigation catches the initial load
+        capture = UsageCapture()
+        capture_usage_json(page, capture)
 
         try:
-            # Decrypt password
-            password = db.decrypt_password(account['password_encrypted'])
+            logged_in = session is not None and await self.resume_session(page, timings)
 
-            # Login
-            logged_in = await self.login(page, account['email'], password)
+            if session is not None and not logged_in:
+                # Expired - log in from a clean context so stale cookies can't interfere
+                print(f"    Saved session expired, logging in")
+                db.clear_session_state(account['id'])
+                await context.close()
+                context = await self.new_context(account['id'])
+                page = await context.new_page()
+                capture_usage_json(page, capture)
 
             if not logged_in:
-                db.log_scrape(account['id'], 'error', 'Login failed')
-                return False
+                # Decrypt password
+                password = db.decrypt_password(account['password_encrypted'])
+
+                # Login
+                logged_in = await self.login(page, account['email'], password, timings)
+
+                if not logged_in:
+                    db.log_scrape(account['id'], 'error', 'Login failed')
+                    return False
+
+                db.save_session_state(account['id'], await context.storage_state())
 
             # Scrape usage data
-            data = await self.scrape_usage_data(page, account['id'])
-
-            # Save data to database
-            today = date.today()
-            current_hour = datetime.now().hour
-
-            if data['hourly_data']:
-                for hour_data in data['hourly_data']:
-                    db.save_hourly_reading(
-                        account['id'],
-                        today,
-                        hour_data['hour'],
-                        hour_data['usage']
-                    )
-
-            if data['daily_total']:
-                db.save_daily_summary(account['id'], today, data['daily_total'])
-
-            # Handle leak detection (if enabled for this meter)
-            if data['leak_detected']:
-                db.log_scrape(account['id'], 'leak', data['leak_message'])
-                print(f"    LEAK DETECTED: {data['leak_message']}")
-                if account.get('leak_alerts', 1) == 1:
-                    monthly = data['monthly_total'] or 0
-                    avg = data['monthly_avg_12mo'] or 0
-                    leak_msg = f"{data['leak_message']}\nThis month: {monthly:,.0f} gal\n12-mo avg: {avg:,.0f} gal"
-                    notifications.send_leak_alert(
-                        account.get('address', account['unit_number']),
-                        leak_msg
-                    )
-                else:
-                    print(f"    (Leak alerts disabled for this meter)")
-
-            # Update last scraped time, monthly usage, and 12-month average
-            update_data = {'last_scraped': datetime.now().isoformat()}
-            if data['monthly_total']:
-                update_data['monthly_usage'] = data['monthly_total']
-            if data['monthly_avg_12mo']:
-                update_data['avg_12mo'] = data['monthly_avg_12mo']
-            db.update_account(account['id'], **update_data)
-
-            # Check for projected overage (10%, 20%, 30%, 40% over 12-month average)
-            if data['monthly_total'] and data['monthly_avg_12mo']:
-                import calendar
-                day_of_month = datetime.now().day
-
-                # No alerts for first 5 days of month
-                if day_of_month > 5:
-                    avg_12mo = data['monthly_avg_12mo']
-                    days_in_month = calendar.monthrange(datetime.now().year, datetime.now().month)[1]
-                    current_month = datetime.now().strftime('%Y-%m')
-
-                    # Calculate projected usage
-                    projected_usage = (data['monthly_total'] / day_of_month) * days_in_month
-                    overage_pct = ((projected_usage - avg_12mo) / avg_12mo) * 100
-
-                    # Check which thresholds have been alerted this month
-                    with db.get_db() as conn:
-                        cursor = conn.cursor()
-                        cursor.execute('''
-                            SELECT message FROM scrape_logs
-                            WHERE account_id = ? AND status = 'overage_alert'
-                            AND strftime('%Y-%m', created_at) = ?
-                        ''', (account['id'], current_month))
-                        existing_alerts = [row[0] for row in cursor.fetchall()]
-
-                    # Determine which threshold levels have been triggered
-                    # Use meter's min_overage_pct setting (default 10%)
-                    min_threshold = account.get('min_overage_pct', 10) or 10
-                    thresholds = [t for t in [10, 20, 30, 40] if t >= min_threshold]
-                    for threshold in thresholds:
-                        threshold_tag = f"[{threshold}%]"
-                        already_alerted = any(threshold_tag in msg for msg in existing_alerts)
-
-                        if not already_alerted and overage_pct >= threshold:
-                            overage_threshold = avg_12mo * (1 + threshold/100)
-                            expected_at_this_point = overage_threshold * (day_of_month / days_in_month)
-
-                            if data['monthly_total'] > expected_at_this_point:
-                                alert_msg = f"[{threshold}%] At {data['monthly_total']:.0f} gal (day {day_of_month}), projected {projected_usage:.0f} gal ({overage_pct:.0f}% over {avg_12mo:.0f} avg)"
-                                db.log_scrape(account['id'], 'overage_alert', alert_msg)
-                                print(f"    OVERAGE ALERT: {alert_msg}")
-                                notifications.send_overage_alert(
-                                    account.get('address', account['unit_number']),
-                                    alert_msg
-                                )
-                                break  # Only send one alert per scrape
-
-            db.log_scrape(account['id'], 'success', f'Daily: {data["daily_total"]}, Monthly: {data["monthly_total"]}, 12mo avg: {data["monthly_avg_12mo"]}, Leak: {data["leak_detected"]}')
+            data = await self.scrape_usage_data(page, account['id'], timings, capture)
+            print(f"    Timings: {format_timings(timings)}")
+            print(f"    Sources: {format_sources(data['sources'], len(capture.payloads))}")
 
+            save_usage(account, data)
             return True
 
         except Exception as e:
@@ -318,34 +597,138 @@ class WaterMeterScraper:
 
         finally:
             await page.close()
+            await context.close()
+            if account['id'] in self._filters:
+                stats = self._filters.pop(account['id']).summary()
+                self.resource_stats[account['id']] = stats
+                print(f"    Resources: {format_resources(stats)}")
+
+    async def _scrape_paced(self, account: dict, semaphore: asyncio.Semaphore) -> dict:
+        """Scrape one account once a slot is free and the site's pacing allows."""
+        label = f"{account['building_name']} - {account['unit_number']}"
+        async with semaphore:
+            await self.pacer(config.BASE_URL).wait()
+            print(f"Scraping: {label}")
+            started = time.monotonic()
+            try:
+                success = await self.scrape_account(account)
+            except Exception as e:
+                db.log_scrape(account['id'], 'error', str(e))
+                success = False
+            seconds = round(time.monotonic() - started, 1)
+            print(f"  {label}: {'Success' if success else 'Failed'} ({seconds}s)")
+            self._account_done()
+            return {'account_id': account['id'], 'unit': label, 'success': success, 'seconds': seconds,
+                    'steps': self.step_timings.get(account['id'], {}),
+                    'resources': self.resource_stats.get(account['id'])}
+
+    async def _scrape_http_account(self, http: HttpScraper, account: dict, semaphore: asyncio.Semaphore) -> dict:
+        """Scrape one account over the JSON API; success False means the browser should take it."""
+        label = f"{account['building_name']} - {account['unit_number']}"
+        steps = self.step_timings.setdefault(account['id'], {})
+        async with semaphore:
+            started = time.monotonic()
+            try:
+                data = await http.scrape_usage_data(account, steps)
+                print(f"Scraped via API: {label}")
+                print(f"    Sources: {format_sources(data['sources'], data['payloads'])}")
+                save_usage(account, data)
+                if account.get('http_failed_at'):
+                    db.set_http_failed(account['id'], False)
+                success = True
+            except ApiFlowError as e:
+                print(f"  {label}: API flow failed ({e})")
+                db.log_scrape(account['id'], 'http_fallback', f'API flow failed: {e}')
+                db.set_http_failed(account['id'])
+                success = False
+            except Exception as e:
+                db.log_scrape(account['id'], 'error', str(e))
+                success = False
+            seconds = round(time.monotonic() - started, 1)
+            if success or self.backend == 'http':
+                self._account_done()  # Otherwise it's counted when the browser has had its go
+            return {'account_id': account['id'], 'unit': label, 'success': success, 'seconds': seconds,
+                    'steps': steps, 'backend': 'http'}
+
+    async def scrape_http_accounts(self, accounts: list) -> list:
+        """Scrape accounts concurrently over one pooled HTTP transport."""
+        http = HttpScraper(pacer=self.pacer(config.API_BASE_URL))
+        await http.start()
+        try:
+            semaphore = asyncio.Semaphore(http.concurrency)
+            return list(await asyncio.gather(*(self._scrape_http_account(http, a, semaphore) for a in accounts)))
+        finally:
+            await http.stop()
 
-    async def scrape_all_accounts(self):
-        """Scrape data for all active accounts."""
-        await self.start()
-
+    async def scrape_browser_accounts(self, accounts: list) -> list:
+        """Scrape accounts in Chromium, up to `concurrency` at once."""
+        try:
+            await self.start()
+        except Exception as e:
+            # Don't lose the accounts the API already handled this run
+            print(f"Browser failed to start: {e}")
+            await self.stop()
+            for a in accounts:
+                db.log_scrape(a['id'], 'error', f'Browser failed to start: {e}')
+            for _ in accounts:
+                self._account_done()
+            return [{'account_id': a['id'], 'unit': f"{a['building_name']} - {a['unit_number']}", 'success': False,
+                     'seconds': 0.0, 'steps': {}, 'backend': 'browser'} for a in accounts]
+        try:
+            semaphore = asyncio.Semaphore(self.concurrency)
+            timings = await asyncio.gather(*(self._scrape_paced(a, semaphore) for a in accounts))
+        finally:
+            if not self.keep_warm:
+                await self.stop()
+        return [dict(t, backend='browser') for t in timings]
+
+    async def scrape_all_accounts(self, on_progress=None):
+        """
+        Scrape data for all active accounts.
+
+        With the "auto" backend accounts go over the JSON API first and only
+        those whose API flow fails (now, or within HTTP_RETRY_HOURS) get a
+        browser - which is only started if there are any. Returns counts plus
+        per-account timings. on_progress(done, total) is called as each
+        account finishes.
+        """
+        started = time.monotonic()
         accounts = db.get_all_accounts()
-        results = {'success': 0, 'failed': 0}
-
-        for account in accounts:
-            print(f"Scraping: {account['building_name']} - {account['unit_number']}")
-            success = await self.scrape_account(account)
-            if success:
-                results['success'] += 1
-                print(f"  Success")
-            else:
-                results['failed'] += 1
-                print(f"  Failed")
-
-            # Small delay between accounts
-            await asyncio.sleep(2)
-
-        await self.stop()
+        timings = []
+        self.step_timings = {}
+        self.resource_stats = {}
+        self._on_progress = on_progress
+        self._progress = [0, len(accounts)]
+
+        browser_accounts = accounts
+        if self.backend in ('http', 'auto'):
+            http_accounts = accounts
+            if self.backend == 'auto':
+                http_accounts = [a for a in accounts if not db.http_failed_recently(a, config.HTTP_RETRY_HOURS)]
+            http_timings = await self.scrape_http_accounts(http_accounts)
+            done = {t['account_id'] for t in http_timings if t['success'] or self.backend == 'http'}
+            timings += [t for t in http_timings if t['account_id'] in done]
+            browser_accounts = [a for a in accounts if a['id'] not in done] if self.backend == 'auto' else []
+
+        if browser_accounts:
+            timings += await self.scrape_browser_accounts(browser_accounts)
+
+        results = {
+            'success': sum(1 for t in timings if t['success']),
+            'failed': sum(1 for t in timings if not t['success']),
+            'elapsed': round(time.monotonic() - started, 1),
+            'accounts': timings,
+        }
+        slowest = max((t['seconds'] for t in timings), default=0)
+        via_http = sum(1 for t in timings if t['backend'] == 'http')
+        print(f"Scraped {len(timings)} accounts in {results['elapsed']}s "
+              f"({via_http} via API, {len(timings) - via_http} via browser; slowest account {slowest}s)")
         return results
 
 
-def run_scrape():
+def run_scrape(concurrency: int = None, backend: str = None):
     """Synchronous wrapper for scraping all accounts."""
-    scraper = WaterMeterScraper()
+    scraper = WaterMeterScraper(concurrency=concurrency, backend=backend)
     return asyncio.run(scraper.scrape_all_accounts())
 
 
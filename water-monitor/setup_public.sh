@@ -23,9 +23,10 @@ lsof -ti:5000 | xargs kill -9 2>/dev/null || true
 # Install systemd service
 echo "[3/5] Setting up systemd service..."
 cp /home/hunter/projects/vic-vil/water-monitor/water-monitor.service /etc/systemd/system/
+cp /home/hunter/projects/vic-vil/water-monitor/water-monitor-scraper.service /etc/systemd/system/
 systemctl daemon-reload
-systemctl enable water-monitor
-systemctl start water-monitor
+systemctl enable water-monitor water-monitor-scraper
+systemctl start water-monitor water-monitor-scraper
 
 # Setup nginx
 echo "[4/5] Configuring nginx..."
@@ -59,3 +60,4 @@ echo "Service commands:"
 echo "  sudo systemctl status water-monitor"
 echo "  sudo systemctl restart water-monitor"
 echo "  sudo journalctl -u water-monitor -f"
+echo "  sudo journalctl -u water-monitor-scraper -f"
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the mywateradvisor2 JSON API
+
+Serves the fixtures in fixtures/mywateradvisor2/ behind the same login flow
+the HTTP scraper uses, so the browserless backend (and its browser fallback)
+can be exercised without touching the real site:
+
+    python stub_site.py [PORT] [--break PATH ...] [--reject EMAIL ...]
+
+then run a scrape with API_BASE_URL=http://127.0.0.1:PORT/ (and
+SCRAPE_BACKEND=http to stop failures falling through to the browser).
+
+--break api/usage/hourly makes that endpoint return 500; --reject makes the
+login fail for that email. The fixtures are hand-built payloads, not
+recordings of the live site; their dates are shifted so the newest day
+(fixture_dates.json) is today.
+"""
+
+import json
+import re
+import secrets
+import sys
+from datetime import date, timedelta
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+FIXTURES = Path(__file__).parent / 'fixtures' / 'mywateradvisor2'
+DATE_PATTERN = re.compile(r'\d{4}-\d{2}-\d{2}')
+
+
+def load_fixture(name: str, shift: timedelta) -> bytes:
+    text = (FIXTURES / f'{name}.json').read_text()
+    return DATE_PATTERN.sub(lambda m: (date.fromisoformat(m.group()) + shift).isoformat(), text).encode()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    sessions = set()
+    broken = set()
+    rejected = set()
+    shift = timedelta(0)
+
+    def log_message(self, format, *args):
+        print(f"  stub: {self.command} {self.path} -> {args[1] if len(args) > 1 else ''}")
+
+    def _send(self, status: int, body: bytes, content_type: str = 'application/json', headers: dict = None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _logged_in(self) -> bool:
+        cookie = SimpleCookie(self.headers.get('Cookie', ''))
+        token = (self.headers.get('Authorization') or '').removeprefix('Bearer ')
+        return (cookie.get('session') and cookie['session'].value in self.sessions) or token in self.sessions
+
+    def do_POST(self):
+        path = self.path.strip('/').split('?')[0]
+        if path != 'api/login':
+            return self._send(404, b'{"error": "not found"}')
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        if not body.get('email') or not body.get('password') or body['email'] in self.rejected:
+            return self._send(401, b'{"success": false, "error": "Invalid email or password"}')
+        session = secrets.token_hex(16)
+        self.sessions.add(session)
+        self._send(200, load_fixture('login', self.shift),
+                   headers={'Set-Cookie': f'session={session}; Path=/; HttpOnly'})
+
+    def do_GET(self):
+        path = self.path.strip('/').split('?')[0]
+        if not path.startswith('api/'):
+            # The SPA shell - what the real site serves for any page
+            return self._send(200, b'<html><body>mywateradvisor2 stub</body></html>', 'text/html')
+        if path in self.broken:
+            return self._send(500, b'{"error": "internal error"}')
+        if not self._logged_in():
+            return self._send(401, b'{"error": "unauthorized"}')
+        name = path.removeprefix('api/usage/')
+        if not re.fullmatch(r'[a-z_]+', name) or name == 'fixture_dates' or not (FIXTURES / f'{name}.json').exists():
+            return self._send(404, b'{"error": "not found"}')
+        self._send(200, load_fixture(name, self.shift))
+
+
+def make_server(port: int = 0, broken=(), rejected=()) -> ThreadingHTTPServer:
+    """A stub server with its own sessions (port 0 picks a free one); call serve_forever() on it."""
+    fixture_dates = json.loads((FIXTURES / 'fixture_dates.json').read_text())
+    handler = type('StubHandler', (StubHandler,), {
+        'sessions': set(),
+        'broken': {path.strip('/') for path in broken},
+        'rejected': set(rejected),
+        'shift': date.today() - date.fromisoformat(fixture_dates['latest_day']),
+    })
+    return ThreadingHTTPServer(('127.0.0.1', port), handler)
+
+
+def main(argv: list):
+    port = 8765
+    broken, rejected = [], []
+    args = iter(argv)
+    for arg in args:
+        if arg == '--break':
+            broken.append(next(args))
+        elif arg == '--reject':
+            rejected.append(next(args))
+        else:
+            port = int(arg)
+
+    server = make_server(port, broken, rejected)
+    shift = server.RequestHandlerClass.shift
+    print(f"mywateradvisor2 stub on http://127.0.0.1:{port}/ (fixture days shifted by {shift.days})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
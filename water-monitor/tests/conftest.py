@@ -0,0 +1,42 @@
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+from cryptography.fernet import Fernet
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import config  # noqa: E402
+import database as db  # noqa: E402
+import stub_site  # noqa: E402
+
+EMAIL = 'tenant@example.com'
+
+
+@pytest.fixture
+def account(tmp_path, monkeypatch):
+    """A fresh database holding one account."""
+    monkeypatch.setattr(config, 'DATABASE_PATH', str(tmp_path / 'water_monitor.db'))
+    monkeypatch.setattr(config, 'ENCRYPTION_KEY', Fernet.generate_key().decode())
+    db.init_db()
+    return db.get_account(db.add_account(EMAIL, 'hunter2', 'Building A', '101'))
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    """Start stub_site on a free port: stub(broken=..., rejected=...) -> base URL, also set as API_BASE_URL."""
+    servers = []
+
+    def start(broken=(), rejected=()):
+        server = stub_site.make_server(0, broken, rejected)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        url = f'http://127.0.0.1:{server.server_address[1]}/'
+        monkeypatch.setattr(config, 'API_BASE_URL', url)
+        return url
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
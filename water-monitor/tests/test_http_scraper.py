@@ -0,0 +1,87 @@
+"""
+The browserless backend against stub_site.py: a clean API scrape, the
+per-account browser fallback, and sessions saved by one run resumed by the next.
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+import database as db
+from conftest import EMAIL
+from http_scraper import HttpScraper, cookies_from_state, state_from_cookies
+from scraper import WaterMeterScraper
+
+
+def scrape(backend: str, monkeypatch) -> tuple:
+    """Run scrape_all_accounts; returns (results, accounts handed to the browser)."""
+    handed_over = []
+
+    async def fake_browser(self, accounts):
+        # No Chromium here - just record which accounts fell through
+        handed_over.extend(a['id'] for a in accounts)
+        return [{'account_id': a['id'], 'unit': a['unit_number'], 'success': True, 'seconds': 0.0,
+                 'steps': {}, 'backend': 'browser'} for a in accounts]
+
+    monkeypatch.setattr(WaterMeterScraper, 'scrape_browser_accounts', fake_browser)
+    results = asyncio.run(WaterMeterScraper(site_delay=0, backend=backend).scrape_all_accounts())
+    return results, handed_over
+
+
+def test_http_scrape_saves_usage(account, stub, monkeypatch):
+    stub()
+    results, handed_over = scrape('auto', monkeypatch)
+
+    assert results['success'] == 1 and handed_over == []
+    assert results['accounts'][0]['backend'] == 'http'
+    saved = db.get_account(account['id'])
+    assert saved['monthly_usage'] and saved['last_scraped']
+    assert saved['http_failed_at'] is None
+    assert db.get_daily_summaries(account['id'])
+
+
+@pytest.mark.parametrize('stub_args', [
+    {'rejected': [EMAIL]},
+    {'broken': ['api/usage/hourly']},
+], ids=['reject', 'break'])
+def test_api_failure_falls_back_to_browser(account, stub, monkeypatch, stub_args):
+    stub(**stub_args)
+    results, handed_over = scrape('auto', monkeypatch)
+
+    assert handed_over == [account['id']]
+    assert results['accounts'][0]['backend'] == 'browser'
+    saved = db.get_account(account['id'])
+    assert saved['http_failed_at'] is not None
+    assert db.http_failed_recently(saved, 24)
+
+    # Within HTTP_RETRY_HOURS the account goes straight to the browser
+    stub()
+    _, handed_over = scrape('auto', monkeypatch)
+    assert handed_over == [account['id']]
+
+
+def test_session_cookie_round_trip(account, stub, monkeypatch):
+    stub()
+    scrape('http', monkeypatch)
+
+    state = db.get_session_state(db.get_account(account['id']), 24)
+    assert [c['name'] for c in state['cookies']] == ['session']
+
+    jar = httpx.Cookies()
+    cookies_from_state(jar, state)
+    assert state_from_cookies(jar) == state
+
+    # The next run resumes the saved session instead of logging in again
+    async def run():
+        http = HttpScraper()
+        await http.start()
+        try:
+            timings = {}
+            await http.scrape_usage_data(db.get_account(account['id']), timings)
+            return timings
+        finally:
+            await http.stop()
+
+    timings = asyncio.run(run())
+    assert 'login' not in timings
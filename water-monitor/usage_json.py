@@ -0,0 +1,189 @@
+"""
+Usage data from the mywateradvisor2 JSON API
+
+The dashboard SPA loads its numbers from JSON endpoints. UsageCapture
+collects those payloads (intercepted from the page's XHRs, or fetched directly)
+and pulls out the same fields scrape_usage_data used to regex out of the page
+text - plus full-resolution hourly data.
+
+The payload layout isn't documented, so parsing is by shape: any list of
+records that each carry a timestamp and a numeric usage is a series, and its
+spacing says whether it's hourly, daily or monthly. Billing-cycle totals,
+forecasts and leak flags are picked up by key name anywhere in the payload.
+"""
+
+import asyncio
+import re
+from datetime import date, datetime
+from statistics import mean
+from typing import Optional
+
+TIME_KEYS = ('timestamp', 'datetime', 'readdatetime', 'readdate', 'readingdate', 'intervalstart',
+             'startdate', 'date', 'time', 'period', 'day', 'month')
+VALUE_KEYS = ('usage', 'consumption', 'gallons', 'value', 'quantity', 'volume', 'amount', 'total')
+CYCLE_TOTAL_KEYS = ('currentbillingcycle', 'billingcycleusage', 'cycletodate', 'currentcycleusage')
+FORECAST_KEYS = ('forecast', 'projected')
+LEAK_FLAG_KEYS = ('leak', 'leakdetected', 'hasleak', 'isleak', 'leakactive', 'leakalert')
+LEAK_MESSAGE_KEYS = ('leakmessage', 'leakdescription', 'leaktext', 'leakalertmessage')
+
+_DATE_FORMATS = ('%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M',
+                 '%Y-%m-%d', '%m/%d/%Y %H:%M', '%m/%d/%Y', '%Y-%m')
+
+
+def _norm(key: str) -> str:
+    return re.sub(r'[^a-z0-9]', '', key.lower())
+
+
+def parse_when(value) -> Optional[datetime]:
+    """Timestamp from an ISO/US date string or epoch seconds/milliseconds."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        if value > 1e11:
+            value /= 1000
+        return datetime.fromtimestamp(value) if value > 1e8 else None
+    if not isinstance(value, str):
+        return None
+    text = value.strip().replace('Z', '')
+    text = re.sub(r'\.\d+$', '', text)           # fractional seconds
+    text = re.sub(r'[+-]\d{2}:?\d{2}$', '', text)  # UTC offset
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def _number(value) -> Optional[float]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        match = re.fullmatch(r'\s*(-?[\d,]*\.?\d+)\s*(gal\w*)?\s*', value, re.IGNORECASE)
+        if match:
+            return float(match.group(1).replace(',', ''))
+    return None
+
+
+def _point(record: dict) -> Optional[tuple]:
+    """(datetime, usage) from one series record, or None."""
+    keys = {_norm(k): k for k in record}
+    when = next((parse_when(record[keys[k]]) for k in TIME_KEYS if k in keys
+                 and parse_when(record[keys[k]]) is not None), None)
+    if when is None:
+        return None
+    usage = next((_number(record[keys[k]]) for k in VALUE_KEYS if k in keys
+                  and _number(record[keys[k]]) is not None), None)
+    return (when, usage) if usage is not None else None
+
+
+def _resolution(points: list, url: str) -> str:
+    hint = url.lower()
+    for name in ('hourly', 'daily', 'monthly'):
+        if name in hint:
+            return name
+    if 'billing' in hint:
+        return 'monthly'
+    times = sorted(p[0] for p in points)
+    gaps = sorted((b - a).total_seconds() for a, b in zip(times, times[1:]))
+    median = gaps[len(gaps) // 2] if gaps else 0
+    if median <= 1.5 * 3600:
+        return 'hourly'
+    if median <= 1.5 * 86400:
+        return 'daily'
+    return 'monthly'
+
+
+class UsageCapture:
+    """Usage JSON payloads seen during one account's scrape."""
+
+    def __init__(self):
+        self.payloads = []
+        self.series = {'hourly': {}, 'daily': {}, 'monthly': {}}
+        self.scalars = {}
+        self._pending = []
+
+    def add(self, url: str, data):
+        """Fold one JSON payload in; later payloads win for the same timestamp."""
+        self.payloads.append(url)
+        self._walk(url, data)
+
+    def track(self, task: asyncio.Future):
+        """Remember a response body read that will call add() when it completes."""
+        self._pending.append(task)
+
+    async def settle(self):
+        """Wait for the body reads still in flight."""
+        while self._pending:
+            pending, self._pending = self._pending, []
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    def _walk(self, url: str, node):
+        if isinstance(node, list):
+            points = [p for p in (_point(r) for r in node if isinstance(r, dict)) if p]
+            if len(points) >= 2 and len(points) >= 0.8 * len(node):
+                self.series[_resolution(points, url)].update(points)
+                return
+            for item in node:
+                self._walk(url, item)
+        elif isinstance(node, dict):
+            for key, value in node.items():
+                self._scalar(_norm(key), value)
+                if isinstance(value, (dict, list)):
+                    self._walk(url, value)
+
+    def _scalar(self, key: str, value):
+        # {"currentBillingCycle": {"usage": 1234, ...}} counts the same as a bare number
+        number = _number(value)
+        if number is None and isinstance(value, dict):
+            values = {_norm(k): v for k, v in value.items()}
+            number = next((_number(values[k]) for k in VALUE_KEYS
+                           if k in values and _number(values[k]) is not None), None)
+        if number is not None:
+            if any(k in key for k in CYCLE_TOTAL_KEYS):
+                self.scalars['monthly_total'] = number
+            elif any(k in key for k in FORECAST_KEYS):
+                self.scalars['monthly_forecast'] = number
+        if key in LEAK_FLAG_KEYS and isinstance(value, (bool, int, float)):
+            self.scalars['leak_detected'] = self.scalars.get('leak_detected', False) or bool(value)
+        elif key in LEAK_MESSAGE_KEYS and isinstance(value, str) and value.strip():
+            self.scalars['leak_message'] = value.strip()[:200]
+
+    def result(self, today: date = None) -> dict:
+        """scrape_usage_data fields found in the payloads (None/[] where not found)."""
+        today = today or date.today()
+        found = {
+            'hourly_data': [],
+            'daily_total': None,
+            'monthly_total': self.scalars.get('monthly_total'),
+            'monthly_forecast': self.scalars.get('monthly_forecast'),
+            'monthly_avg_12mo': None,
+            'daily_min': None,
+            'daily_max': None,
+            'daily_avg': None,
+            'leak_detected': self.scalars.get('leak_detected', False),
+            'leak_message': self.scalars.get('leak_message'),
+        }
+        if found['leak_message'] and not found['leak_detected']:
+            found['leak_detected'] = True
+
+        # Every hour the API returned, not just today's - earlier days backfill
+        found['hourly_data'] = [{'date': when.date(), 'hour': when.hour, 'usage': usage}
+                                for when, usage in sorted(self.series['hourly'].items())]
+
+        daily = [usage for _, usage in sorted(self.series['daily'].items())]
+        if daily:
+            found['daily_avg'] = round(mean(daily), 1)
+            found['daily_total'] = found['daily_avg']  # Same meaning as the Daily tab's "Average"
+            found['daily_min'] = min(daily)
+            found['daily_max'] = max(daily)
+
+        # 12-month average over completed months (the current one is partial)
+        months = [(when, usage) for when, usage in sorted(self.series['monthly'].items())
+                  if (when.year, when.month) != (today.year, today.month)]
+        if months:
+            found['monthly_avg_12mo'] = round(mean(usage for _, usage in months[-12:]), 1)
+
+        return found